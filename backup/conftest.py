@@ -0,0 +1,202 @@
+"""Configuración compartida de pytest: permite importar `imd_desktop_main` desde la raíz."""
+
+import importlib
+import os
+import socket
+import sqlite3
+import sys
+from datetime import datetime
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+FEEDER_ROWS = [
+    ("ABC123", "10K 1/4W", "AXIAL", "12", "+", "PANA_A"),
+    ("XYZ999", "100uF", "RADIAL", "3", None, "PANA_B"),
+]
+
+
+@pytest.fixture
+def imd():
+    """Módulo de la aplicación; omite la prueba si faltan las dependencias que se cargan al importarlo"""
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    return importlib.import_module("imd_desktop_main")
+
+
+@pytest.fixture
+def mysql_connector():
+    """El conector real; lo necesitan las pruebas que producen o capturan sus excepciones"""
+    return pytest.importorskip("mysql.connector")
+
+
+@pytest.fixture
+def free_port():
+    """Puerto TCP libre en 127.0.0.1 para levantar un servidor real"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeConnection:
+    """Conexión del pool simulada: registra en `db.released` si se devolvió o se descartó"""
+
+    def __init__(self, db, cursor_class):
+        self.db = db
+        self._cursor_class = cursor_class
+        self._released = False
+
+    def cursor(self, buffered=False):
+        return self._cursor_class(self.db)
+
+    def _release(self, outcome):
+        # Igual que PooledConnection: solo cuenta la primera devolución
+        if not self._released:
+            self._released = True
+            self.db.released.append(outcome)
+
+    def close(self):
+        self._release("closed")
+
+    def invalidate(self):
+        self._release("invalidated")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.invalidate()
+        else:
+            self.close()
+
+
+class FeederCursor:
+    """Responde CHECKSUM TABLE, la carga completa y la búsqueda por (parte, máquina, línea)"""
+
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if self.db.error is not None:
+            raise self.db.error
+        if query.startswith("CHECKSUM TABLE"):
+            self._result = [("imd_feeders_location_data", self.db.checksum)]
+        elif params:
+            part, machine, line = params
+            self._result = [
+                row for row in self.db.rows
+                if (row[0].upper(), row[2].upper(), row[5].upper()) == (part.upper(), machine, line)
+            ][:1]
+        else:
+            self._result = list(self.db.rows)
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+    def close(self):
+        pass
+
+
+class FeederDatabase:
+    """imd_feeders_location_data en memoria; `available = False` simula la base caída y `error` falla las consultas"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.checksum = 1
+        self.queries = []
+        self.released = []
+        self.available = True
+        self.error = None
+
+    def connect(self):
+        if not self.available:
+            return None
+        return FakeConnection(self, FeederCursor)
+
+
+@pytest.fixture
+def feeder_db(imd, monkeypatch):
+    db = FeederDatabase(FEEDER_ROWS)
+    monkeypatch.setattr(imd, "get_db_connection", db.connect)
+    monkeypatch.setattr(imd, "feeder_cache", imd.FeederLocationCache(refresh_interval=60))
+    return db
+
+
+class SqliteCursor:
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, query, params=()):
+        self.db.queries.append(query)
+        self.db.params.append(params)
+        if self.db.error is not None:
+            raise self.db.error
+        params = tuple(value.isoformat(sep=" ") if isinstance(value, datetime) else value for value in params)
+        self._rows = [
+            tuple(
+                datetime.fromisoformat(value) if index in self.db.datetime_columns else value
+                for index, value in enumerate(row)
+            )
+            for row in self.db.sqlite.execute(query.replace("%s", "?"), params).fetchall()
+        ]
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class SqliteDatabase:
+    """Tabla en SQLite en memoria; acepta la misma consulta parametrizada que MySQL.
+
+    `datetime_columns` son los índices de las columnas del resultado que MySQL
+    devolvería como datetime. Con `available = False` la conexión falla y se
+    registra "connect" en `queries`.
+    """
+
+    def __init__(self, table, columns, key=(), datetime_columns=()):
+        self.sqlite = sqlite3.connect(":memory:", check_same_thread=False)
+        primary_key = f", PRIMARY KEY ({', '.join(key)})" if key else ""
+        self.sqlite.execute(f"CREATE TABLE {table} ({', '.join(columns)}{primary_key})")
+        self.table, self.columns = table, tuple(columns)
+        self.datetime_columns = set(datetime_columns)
+        self.queries, self.params, self.released = [], [], []
+        self.available = True
+        self.error = None
+
+    def insert(self, *values):
+        self.sqlite.execute(
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({', '.join('?' * len(values))})", values
+        )
+
+    def connect(self):
+        if not self.available:
+            self.queries.append("connect")
+            return None
+        return FakeConnection(self, SqliteCursor)
+
+
+@pytest.fixture
+def sqlite_db(imd, mysql_connector, monkeypatch):
+    """Crea una SqliteDatabase y la instala como get_db_connection.
+
+    Requiere mysql.connector: con la base caída las rutas de error evalúan mysql_connector.Error.
+    """
+
+    def create(table, columns, **options):
+        db = SqliteDatabase(table, columns, **options)
+        monkeypatch.setattr(imd, "get_db_connection", db.connect)
+        return db
+
+    return create
@@ -0,0 +1,76 @@
+"""Prueba de humo del benchmark de flujo de escaneo con el sustituto local de MySQL."""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.usefixtures("imd")
+@pytest.mark.parametrize("cache_flag", [[], ["--no-cache"]])
+def test_scan_flow_benchmark_reports_percentiles_per_endpoint(tmp_path, cache_flag):
+    output = tmp_path / "resultado.json"
+    subprocess.run(
+        [
+            sys.executable, os.path.join(ROOT_DIR, "benchmarks", "bench_scan_flow.py"),
+            "--rows", "64", "--concurrency", "2", "--scans", "3",
+            "--workdir", str(tmp_path), "--output", str(output), *cache_flag,
+        ],
+        env={**os.environ, "HOME": str(tmp_path), "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+
+    result = json.loads(output.read_text(encoding="utf-8"))
+
+    assert set(result["endpoints"]) == {"search-part", "validate-feeder", "validate-polarity", "save-history"}
+    for summary in result["endpoints"].values():
+        assert summary["requests"] == 6
+        assert summary["errors"] == 0
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+    assert result["history_unsynced"] == 0
+
+
+def test_history_export_benchmark_streams_every_row(tmp_path):
+    output = tmp_path / "exportacion.json"
+    subprocess.run(
+        [
+            sys.executable, os.path.join(ROOT_DIR, "benchmarks", "bench_history_export.py"),
+            "--rows", "500", "--chunk-size", "64", "--workdir", str(tmp_path), "--output", str(output),
+        ],
+        env={**os.environ, "HOME": str(tmp_path), "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+
+    result = json.loads(output.read_text(encoding="utf-8"))
+
+    assert result["status"] == 200
+    assert result["rows_exported"] == 500
+
+
+def test_lot_trace_benchmark_reports_latency(tmp_path):
+    output = tmp_path / "trazabilidad.json"
+    subprocess.run(
+        [
+            sys.executable, os.path.join(ROOT_DIR, "benchmarks", "bench_lot_trace.py"),
+            "--rows", "2000", "--lookups", "20", "--workdir", str(tmp_path), "--output", str(output),
+        ],
+        env={**os.environ, "HOME": str(tmp_path), "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+
+    result = json.loads(output.read_text(encoding="utf-8"))
+
+    assert result["trace"]["requests"] == 20
+    assert result["trace"]["errors"] == 0
@@ -0,0 +1,119 @@
+"""Pruebas del pool de conexiones MySQL compartido por las rutas de la API."""
+
+from __future__ import annotations
+
+import pytest
+
+
+class FakeConnection:
+    """Conexión mínima que registra pings y cierres."""
+
+    def __init__(self):
+        self.closed = False
+        self.pings = 0
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def make_pool(imd, monkeypatch):
+    def make(**overrides):
+        config = dict(imd.ProductionConfig.POOL_CONFIG, **overrides)
+        pool = imd.MySQLConnectionPool("perfil_test", {"host": "localhost"}, config)
+        created = []
+
+        def fake_connect():
+            connection = FakeConnection()
+            created.append(connection)
+            return connection
+
+        monkeypatch.setattr(pool, "_connect", fake_connect)
+        return pool, created
+
+    return make
+
+
+def test_pool_reuses_released_connection(imd, make_pool):
+    pool, created = make_pool()
+
+    first = imd.PooledConnection(pool, pool.acquire(timeout=1))
+    first.close()
+    second = imd.PooledConnection(pool, pool.acquire(timeout=1))
+
+    assert len(created) == 1
+    assert second._raw is created[0]
+    assert pool.stats()["reused"] == 1
+
+
+def test_pool_is_bounded_and_times_out(imd, make_pool):
+    pool, _ = make_pool(max_size=1)
+    pool.acquire(timeout=1)
+
+    with pytest.raises(imd.PoolExhaustedError):
+        pool.acquire(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_evicts_idle_connections(make_pool):
+    pool, created = make_pool(max_idle_time=0)
+    pool.release(pool.acquire(timeout=1))
+
+    pool.acquire(timeout=1)
+
+    assert len(created) == 2
+    assert created[0].closed
+    assert pool.stats()["evicted"] == 1
+
+
+def test_pool_pings_connection_after_idle(make_pool):
+    pool, created = make_pool(ping_after_idle=0)
+    pool.release(pool.acquire(timeout=1))
+
+    pool.acquire(timeout=1)
+
+    assert created[0].pings == 1
+
+
+def test_database_pool_fails_over_to_next_candidate(imd, mysql_connector, monkeypatch):
+    db_pool = imd.DatabasePool([{"host": "a"}, {"host": "b"}], imd.ProductionConfig.POOL_CONFIG)
+
+    def broken_connect():
+        raise mysql_connector.Error(msg="host caído")
+
+    monkeypatch.setattr(db_pool.pools[0], "_connect", broken_connect)
+    monkeypatch.setattr(db_pool.pools[1], "_connect", FakeConnection)
+
+    connection = db_pool.get_connection()
+
+    assert connection is not None
+    assert connection.profile == "perfil_2"
+    assert db_pool.pools[0].is_cooling_down()
+
+
+@pytest.mark.parametrize("migration", [
+    "create_history_table", "ensure_feeder_location_index", "ensure_history_trace_indexes", "create_feeder_state_table",
+])
+def test_failed_migration_step_discards_its_connection(imd, mysql_connector, make_pool, monkeypatch, migration):
+    pool, created = make_pool()
+
+    class DeniedCursor:
+        def execute(self, query, params=None):
+            raise mysql_connector.ProgrammingError(msg="ALTER command denied", errno=1142)
+
+    monkeypatch.setattr(FakeConnection, "database", "imd", raising=False)
+    monkeypatch.setattr(FakeConnection, "cursor", lambda self, **kwargs: DeniedCursor(), raising=False)
+    monkeypatch.setattr(imd, "get_db_connection", lambda: imd.PooledConnection(pool, pool.acquire(timeout=1)))
+
+    assert getattr(imd, migration)() is False
+    assert getattr(imd, migration)() is False
+
+    assert pool.stats()["in_use"] == 0
+    assert all(connection.closed for connection in created)
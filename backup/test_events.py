@@ -0,0 +1,133 @@
+"""Pruebas del canal de eventos en vivo `/api/events` (server-sent events)."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def broker(imd, monkeypatch):
+    broker = imd.EventBroker({
+        "max_clients": 2, "queue_size": 3, "heartbeat_interval": 0.05, "max_stream_seconds": 5, "retry_ms": 1000,
+    })
+    monkeypatch.setattr(imd, "event_broker", broker)
+    monkeypatch.setattr(imd.history_spool, "pending_count", lambda: 7)
+    monkeypatch.setattr(imd.history_spool, "status", lambda: {"pending": 7})
+    for key, value in {"db": "pending", "db_ready_ms": None}.items():
+        monkeypatch.setitem(imd.startup_state, key, value)
+    return broker
+
+
+@pytest.fixture
+def open_stream(imd):
+    def open_path(path="/api/events"):
+        response = imd.app.test_client().get(path, buffered=False)
+        return response, iter(response.response)
+
+    return open_path
+
+
+def next_event(frames):
+    """Siguiente evento (omite los comentarios keep-alive) como (tipo, datos)"""
+    while True:
+        frame = next(frames).decode("utf-8")
+        if frame.startswith("event: "):
+            event_line, data_line = frame.strip().split("\n")
+            return event_line[len("event: "):], json.loads(data_line[len("data: "):])
+
+
+def record(line, position="AXIAL_3"):
+    return {
+        "line": line, "posicion_de_feeder": position, "numero_de_parte": "ABC123",
+        "numero_de_lote_proveedor": "LOT1", "qr_almacen": "ABC123,LOT1", "polaridad": "+",
+        "persona": "op", "created_at": "2025-03-01 06:00:00",
+    }
+
+
+def test_stream_starts_with_retry_and_snapshot(broker, open_stream):
+    response, frames = open_stream()
+
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert next(frames) == b"retry: 1000\n\n"
+    event, data = next_event(frames)
+    assert event == "snapshot"
+    assert data["startup"] == {"db": "pending"} and data["spool"] == {"pending": 7}
+    response.close()
+    assert broker.stats()["clients"] == 0
+
+
+def test_history_events_only_reach_clients_watching_that_line(imd, broker, open_stream):
+    line_a, frames_a = open_stream("/api/events?line=PANA_A")
+    line_b, frames_b = open_stream("/api/events?line=PANA_B")
+    next_event(frames_a), next_event(frames_b)
+
+    imd.publish_history_events("enqueued", [("k1", record("PANA_A"), None)])
+
+    event, data = next_event(frames_a)
+    assert event == "history"
+    assert data["line"] == "PANA_A" and data["event"] == "enqueued"
+    assert data["changes"][0]["posicion_de_feeder"] == "AXIAL_3" and data["changes"][0]["synced"] is False
+    assert next_event(frames_a) == ("spool", {"pending": 7})
+    assert next_event(frames_b) == ("spool", {"pending": 7})
+    line_a.close(), line_b.close()
+
+
+def test_clients_over_limit_are_rejected(imd, broker, open_stream):
+    streams = [open_stream() for _ in range(2)]
+
+    rejected = imd.app.test_client().get("/api/events")
+
+    assert rejected.status_code == 503
+    assert "Retry-After" in rejected.headers
+    for response, _ in streams:
+        response.close()
+    assert broker.stats()["rejected_clients"] == 1
+    assert broker.stats()["clients"] == 0
+
+
+def test_slow_client_is_disconnected_instead_of_blocking_publishers(broker, open_stream):
+    response, frames = open_stream()
+    next_event(frames)
+
+    for n in range(5):
+        broker.publish("spool", {"pending": n})
+
+    received = [frame for frame in frames if frame.startswith(b"event: ")]
+    assert len(received) < 5
+    assert broker.stats()["overflowed_clients"] == 1
+    assert broker.stats()["clients"] == 0
+    response.close()
+
+
+def test_db_status_changes_are_published_once(imd, broker, open_stream):
+    response, frames = open_stream()
+    next_event(frames)
+
+    imd.note_db_reachable(False)           # Antes de terminar el arranque no cambia el estado
+    imd.set_db_status("connected")
+    imd.set_db_status("connected")
+    imd.startup_state["db_ready_ms"] = 10
+    imd.note_db_reachable(False)
+
+    assert next_event(frames) == ("db", {"db": "connected"})
+    assert next_event(frames) == ("db", {"db": "offline"})
+    broker.close()
+    assert list(frames) == []
+    response.close()
+
+
+def test_feeder_cache_notifies_when_source_or_content_changes(imd, monkeypatch):
+    class Replica:
+        def load(self):
+            return {("P1", "AXIAL", "PANA_A"): {"no_part": "P1"}}, "fp", 0
+
+    cache = imd.FeederLocationCache(refresh_interval=60, replica=Replica())
+    notified = []
+    cache.add_listener(notified.append)
+
+    assert cache.load_from_replica() is True
+
+    assert [(stats["source"], stats["entries"]) for stats in notified] == [("replica", 1)]
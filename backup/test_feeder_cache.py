@@ -0,0 +1,76 @@
+"""Pruebas de la caché en memoria de imd_feeders_location_data."""
+
+from __future__ import annotations
+
+import pytest
+
+
+def test_load_populates_cache_and_serves_hits(imd, feeder_db):
+    assert imd.feeder_cache.load()
+
+    row = imd.lookup_feeder_location(" abc123 ", "axial", "pana_a")
+
+    assert row["feeder"] == "12"
+    assert imd.feeder_cache.counters["hits"] == 1
+    assert imd.feeder_cache.counters["db_lookups"] == 0
+
+
+def test_refresh_skips_reload_when_checksum_is_unchanged(imd, feeder_db):
+    imd.feeder_cache.load()
+    version = imd.feeder_cache.version
+
+    imd.feeder_cache.load()
+    assert imd.feeder_cache.counters["refresh_skipped"] == 1
+
+    feeder_db.rows.append(("NEW001", "1nF", "AXIAL", "7", "-", "PANA_C"))
+    feeder_db.checksum = 2
+    imd.feeder_cache.load()
+    assert imd.feeder_cache.version == version + 1
+    assert imd.feeder_cache.stats()["entries"] == 3
+
+
+def test_cache_miss_falls_back_to_database(imd, feeder_db):
+    row = imd.lookup_feeder_location("XYZ999", "RADIAL", "PANA_B")
+
+    assert row["spec"] == "100uF"
+    assert imd.feeder_cache.counters["db_lookups"] == 1
+    assert imd.lookup_feeder_location("XYZ999", "RADIAL", "PANA_B") is row
+
+
+def test_outage_uses_last_snapshot_or_reports_unavailable(imd, feeder_db):
+    feeder_db.available = False
+    with pytest.raises(imd.DatabaseUnavailableError):
+        imd.lookup_feeder_location("ABC123", "AXIAL", "PANA_A")
+
+    feeder_db.available = True
+    imd.feeder_cache.load()
+    feeder_db.available = False
+    assert imd.lookup_feeder_location("ABC123", "AXIAL", "PANA_A")["polarity"] == "+"
+    assert imd.lookup_feeder_location("MISSING", "AXIAL", "PANA_A") is None
+
+
+def test_replica_serves_validations_when_database_is_down(imd, feeder_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(imd.ProductionConfig, "get_app_data_dir", staticmethod(lambda: str(tmp_path)))
+    replica = imd.FeederReplica("feeders_replica.sqlite3")
+    online = imd.FeederLocationCache(refresh_interval=60, replica=replica)
+    monkeypatch.setattr(imd, "feeder_cache", online)
+    assert online.load()
+
+    offline = imd.FeederLocationCache(refresh_interval=60, replica=replica)
+    monkeypatch.setattr(imd, "feeder_cache", offline)
+    feeder_db.available = False
+
+    assert offline.load_from_replica()
+    assert offline.stats()["source"] == "replica"
+    assert offline.stats()["age_seconds"] is not None
+    assert imd.lookup_feeder_location("abc123", "AXIAL", "PANA_A")["feeder"] == "12"
+
+
+def test_failed_queries_discard_the_connection_instead_of_returning_it(imd, feeder_db, mysql_connector):
+    feeder_db.error = mysql_connector.Error(msg="Lost connection to MySQL server during query")
+
+    assert imd.feeder_cache.load() is False
+    with pytest.raises(mysql_connector.Error):
+        imd.lookup_feeder_location("ABC123", "AXIAL", "PANA_A")
+
+    assert feeder_db.released == ["invalidated", "invalidated"]
@@ -0,0 +1,129 @@
+"""Pruebas del estado actual de feeders `/api/lines/<línea>/state`."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+T0 = datetime(2025, 3, 1, 6, 0, 0)
+
+
+def at(minutes):
+    return T0 + timedelta(minutes=minutes)
+
+
+def insert(db, position, minutes, lot, history_id, line="PANA_A"):
+    db.insert(line, position, history_id, "ABC123", lot, f"ABC123,{lot}", "+", "op", at(minutes).isoformat(sep=" "))
+
+
+@pytest.fixture
+def state_db(imd, sqlite_db, monkeypatch):
+    db = sqlite_db("imd_feeder_current_state", imd.FEEDER_STATE_COLUMNS, key=("line", "posicion_de_feeder"))
+    insert(db, "AXIAL_10", 0, "L10", 1)
+    insert(db, "AXIAL_2", 5, "L2", 2)
+    insert(db, "RADIAL_1", 10, "R1", 3)
+    insert(db, "AXIAL_1", 0, "OTRA", 4, line="PANA_B")
+    monkeypatch.setattr(imd.history_spool, "pending", lambda limit: [])
+    store = imd.FeederStateStore({"refresh_interval": 60, "pending_overlay_limit": 100})
+    monkeypatch.setattr(imd, "feeder_state", store)
+    return db
+
+
+def local_record(minutes, lot, position="AXIAL_2"):
+    return {
+        "line": "PANA_A", "posicion_de_feeder": position, "numero_de_parte": "XYZ789",
+        "numero_de_lote_proveedor": lot, "qr_almacen": f"XYZ789,{lot}", "polaridad": "-",
+        "persona": "local", "created_at": at(minutes).isoformat(sep=" "),
+    }
+
+
+def test_line_state_lists_positions_in_feeder_order(imd, state_db):
+    payload = imd.app.test_client().get("/api/lines/PANA_A/state").get_json()
+
+    assert payload["success"] is True and payload["source"] == "mysql"
+    assert [p["posicion_de_feeder"] for p in payload["positions"]] == ["AXIAL_2", "AXIAL_10", "RADIAL_1"]
+    assert payload["positions"][0] == {
+        "posicion_de_feeder": "AXIAL_2", "history_id": 2, "numero_de_parte": "ABC123",
+        "numero_de_lote_proveedor": "L2", "qr_almacen": "ABC123,L2", "polaridad": "+", "persona": "op",
+        "changed_at": "2025-03-01 06:05:00", "synced": True,
+    }
+    assert "WHERE line = %s" in state_db.queries[-1]
+
+
+def test_position_filter_and_refresh_interval(imd, state_db):
+    client = imd.app.test_client()
+    client.get("/api/lines/PANA_A/state")
+
+    payload = client.get("/api/lines/PANA_A/state?position=RADIAL_1").get_json()
+
+    assert [p["numero_de_lote_proveedor"] for p in payload["positions"]] == ["R1"]
+    assert len(state_db.queries) == 1
+
+
+def test_local_change_is_visible_before_sync_and_survives_reload(imd, state_db):
+    imd.feeder_state.line_state("PANA_A")
+    imd.feeder_state.on_history("enqueued", [
+        ("k-new", local_record(30, "NEW"), None),
+        ("k-old", local_record(1, "STALE", position="AXIAL_10"), None),
+    ])
+    imd.feeder_state.load_line("PANA_A")
+
+    positions = {p["posicion_de_feeder"]: p for p in imd.feeder_state.line_state("PANA_A")["positions"]}
+    assert positions["AXIAL_2"]["numero_de_lote_proveedor"] == "NEW"
+    assert positions["AXIAL_2"]["synced"] is False
+    assert positions["AXIAL_10"]["numero_de_lote_proveedor"] == "STALE"
+
+    imd.feeder_state.on_history("synced", [("k-new", local_record(30, "NEW"), 99)])
+    positions = {p["posicion_de_feeder"]: p for p in imd.feeder_state.line_state("PANA_A")["positions"]}
+    assert (positions["AXIAL_2"]["history_id"], positions["AXIAL_2"]["synced"]) == (99, True)
+
+
+def test_newer_change_from_another_station_wins_on_reload(imd, state_db):
+    imd.feeder_state.on_history("enqueued", [("k-1", local_record(30, "LOCAL"), None)])
+    imd.feeder_state.on_history("synced", [("k-1", local_record(30, "LOCAL"), 50)])
+    state_db.sqlite.execute(
+        "UPDATE imd_feeder_current_state SET numero_de_lote_proveedor = 'REMOTE', changed_at = ? "
+        "WHERE posicion_de_feeder = 'AXIAL_2'", (at(40).isoformat(sep=" "),)
+    )
+
+    imd.feeder_state.load_line("PANA_A")
+
+    positions = {p["posicion_de_feeder"]: p for p in imd.feeder_state.line_state("PANA_A")["positions"]}
+    assert positions["AXIAL_2"]["numero_de_lote_proveedor"] == "REMOTE"
+
+
+def test_pending_spool_records_are_overlaid_after_restart(imd, state_db, monkeypatch):
+    monkeypatch.setattr(
+        imd.history_spool, "pending",
+        lambda limit: [(1, "k-spool", local_record(20, "SPOOL")), (2, "k-other", {**local_record(20, "X"), "line": "PANA_B"})]
+    )
+
+    payload = imd.feeder_state.line_state("PANA_A")
+
+    positions = {p["posicion_de_feeder"]: p for p in payload["positions"]}
+    assert positions["AXIAL_2"]["numero_de_lote_proveedor"] == "SPOOL"
+    assert positions["AXIAL_2"]["synced"] is False
+    assert len(payload["positions"]) == 3
+
+
+def test_database_down_serves_local_state_without_retrying_each_request(imd, state_db):
+    state_db.available = False
+    imd.feeder_state.on_history("enqueued", [("k-1", local_record(30, "NEW"), None)])
+
+    first = imd.feeder_state.line_state("PANA_A")
+    second = imd.feeder_state.line_state("PANA_A")
+
+    assert first["source"] == second["source"] == "local"
+    assert first["loaded_at"] is None
+    assert [p["numero_de_lote_proveedor"] for p in first["positions"]] == ["NEW"]
+    assert state_db.queries == ["connect"]
+
+
+def test_failed_state_query_discards_the_connection(imd, state_db, mysql_connector):
+    state_db.error = mysql_connector.Error(msg="Lost connection to MySQL server during query")
+
+    payload = imd.feeder_state.line_state("PANA_A")
+
+    assert payload["source"] == "local"
+    assert state_db.released == ["invalidated"]
@@ -0,0 +1,72 @@
+"""Pruebas del modo servidor sin ventana (--headless / --serve)."""
+
+from __future__ import annotations
+
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arranca el modo servidor con el sustituto SQLite de los benchmarks en lugar de los perfiles
+# MySQL reales: la prueba no debe migrar ni vaciar la cola contra la base de producción
+RUN_HEADLESS_WITH_STANDIN = """
+import sys
+sys.path.insert(0, {benchmarks!r})
+import imd_desktop_main as imd
+from standin_db import StandInDatabase
+StandInDatabase({database!r}, rows=16).install(imd)
+# El sustituto ya tiene el esquema completo; las migraciones son DDL propio de MySQL
+imd.schema_state.update(ready=True, applied={{name: "standin" for name, _ in imd.SCHEMA_MIGRATIONS}})
+imd.main(sys.argv[1:])
+"""
+
+
+def test_parse_args_accepts_serve_alias_and_bind_address(imd):
+    args = imd.parse_args(["--serve", "--host", "127.0.0.1", "--port", "8080"])
+
+    assert args.headless is True
+    assert (args.host, args.port) == ("127.0.0.1", 8080)
+    assert imd.parse_args([]).headless is False
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGTERM no se puede enviar a un proceso en Windows")
+def test_headless_server_answers_and_stops_on_sigterm(free_port, tmp_path):
+    script = RUN_HEADLESS_WITH_STANDIN.format(
+        benchmarks=os.path.join(ROOT_DIR, "benchmarks"), database=str(tmp_path / "standin.sqlite3")
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-c", script, "--headless", "--host", "127.0.0.1", "--port", str(free_port)],
+        # Registros y cola local (~/IMD_Logs, ~/IMD_MaterialControl) dentro de tmp_path
+        env={**os.environ, "HOME": str(tmp_path), "USERPROFILE": str(tmp_path),
+             "PYTHONPATH": os.pathsep.join(sys.path)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        status = None
+        deadline = time.time() + 20
+        while status is None and time.time() < deadline:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", free_port, timeout=2)
+                connection.request("GET", "/api/health")
+                status = connection.getresponse().status
+                connection.close()
+            except OSError:
+                time.sleep(0.2)
+
+        process.send_signal(signal.SIGTERM)
+        exit_code = process.wait(20)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    assert status == 200
+    assert exit_code == 0
+    log = (tmp_path / "IMD_Logs" / "app.log").read_text(encoding="utf-8")
+    assert "seenode" not in log
@@ -0,0 +1,133 @@
+"""Pruebas de la exportación en streaming `/api/history/export`."""
+
+from __future__ import annotations
+
+import csv
+import io
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2025, 3, 1, 6, 0, 0)
+
+
+class StreamingCursor:
+    """Cursor sin búfer sobre SQLite: las filas se leen solo con fetchmany"""
+
+    def __init__(self, db, buffered):
+        self.db = db
+        self.buffered = buffered
+        self._cursor = None
+
+    def execute(self, query, params=()):
+        self.db.queries.append(query)
+        if query.startswith("SET SESSION"):
+            return
+        params = tuple(value.isoformat(sep=" ") if isinstance(value, datetime) else value for value in params)
+        self._cursor = self.db.sqlite.execute(query.replace("%s", "?"), params)
+
+    def fetchmany(self, size):
+        self.db.fetches.append(size)
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self.db.closed.append("cursor")
+
+
+class StreamingDatabase:
+    def __init__(self, columns, rows):
+        self.sqlite = sqlite3.connect(":memory:", check_same_thread=False)
+        self.sqlite.execute(f"CREATE TABLE historial_cambio_material_imd ({', '.join(columns)})")
+        for index in range(1, rows + 1):
+            created_at = START + timedelta(minutes=index)
+            self.sqlite.execute(
+                "INSERT INTO historial_cambio_material_imd VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (index, created_at.date().isoformat(), created_at.time().isoformat(),
+                 "PANA_A" if index % 2 else "PANA_B", "AXIAL_1", "ABC123,L1", "ABC123", "10K", "QRP",
+                 f"L{index}", "+", "josé", created_at.isoformat(sep=" ")),
+            )
+        self.queries, self.fetches, self.closed = [], [], []
+
+    def connect(self):
+        db = self
+
+        class _Connection:
+            def cursor(self, buffered=True):
+                return StreamingCursor(db, buffered)
+
+            def close(self):
+                db.closed.append("connection")
+
+            def invalidate(self):
+                db.closed.append("invalidated")
+
+        return _Connection()
+
+
+@pytest.fixture
+def export_db(imd, monkeypatch):
+    db = StreamingDatabase(imd.HISTORY_SELECT_COLUMNS, 10)
+    monkeypatch.setattr(imd, "get_db_connection", db.connect)
+    monkeypatch.setitem(imd.ProductionConfig.HISTORY_QUERY_CONFIG, "export_chunk_size", 3)
+    return db
+
+
+def test_csv_export_streams_filtered_rows_in_chunks(imd, export_db):
+    response = imd.app.test_client().get("/api/history/export", query_string={"line": "PANA_A"})
+    text = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/csv"
+    assert "attachment" in response.headers["Content-Disposition"]
+    assert text.startswith("\ufeff")
+    rows = list(csv.reader(io.StringIO(text.lstrip("\ufeff"))))
+    assert rows[0] == list(imd.HISTORY_SELECT_COLUMNS)
+    assert [int(row[0]) for row in rows[1:]] == [1, 3, 5, 7, 9]
+    assert rows[1][11] == "josé"
+    assert export_db.fetches == [3, 3, 3]  # La última lectura vacía cierra el recorrido
+    assert "MAX_EXECUTION_TIME" not in export_db.queries[1]
+    # net_write_timeout vuelve al valor global antes de regresar la conexión al pool
+    assert export_db.queries[-1] == "SET SESSION net_write_timeout = DEFAULT"
+    assert export_db.closed == ["cursor", "cursor", "connection"]
+
+
+def test_interrupted_export_discards_connection_and_frees_slot(imd, export_db):
+    client = imd.app.test_client()
+    response = client.get("/api/history/export", buffered=False)
+    next(response.response)
+    response.close()
+
+    assert export_db.closed == ["invalidated"]
+    with client.get("/api/history/export") as retry:
+        assert retry.status_code == 200
+
+
+def test_only_one_export_runs_at_a_time(imd, export_db):
+    client = imd.app.test_client()
+    first = client.get("/api/history/export", buffered=False)
+
+    payload = client.get("/api/history/export").get_json()
+    first.close()
+
+    assert payload["success"] is False
+    assert "en curso" in payload["error"]
+
+
+def test_invalid_filters_and_formats_are_rejected(imd, export_db):
+    client = imd.app.test_client()
+
+    assert client.get("/api/history/export", query_string={"format": "pdf"}).get_json()["success"] is False
+    assert client.get("/api/history/export", query_string={"date_to": "ayer"}).get_json()["success"] is False
+    assert export_db.queries == []
+    with client.get("/api/history/export") as response:
+        assert response.status_code == 200
+
+
+def test_xlsx_export_writes_every_row(imd, export_db):
+    openpyxl = pytest.importorskip("openpyxl")
+
+    response = imd.app.test_client().get("/api/history/export", query_string={"format": "xlsx"})
+    sheet = openpyxl.load_workbook(io.BytesIO(response.get_data())).active
+
+    assert sheet.max_row == 11
+    assert export_db.closed == ["cursor", "cursor", "connection"]
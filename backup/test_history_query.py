@@ -0,0 +1,93 @@
+"""Pruebas de la consulta de historial `/api/history` con paginación por llave."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2025, 3, 1, 6, 0, 0)
+
+
+def insert(db, index, created_at, line="PANA_A", part="ABC123", lot="L1"):
+    db.insert(
+        index, created_at.date().isoformat(), created_at.time().isoformat(), line, "AXIAL_1",
+        f"{part},{lot}", part, "10K", "QRP", lot, "+", "ana", created_at.isoformat(sep=" "),
+    )
+
+
+@pytest.fixture
+def history_db(imd, sqlite_db):
+    # created_at (columna 12) llega como datetime, igual que desde MySQL
+    db = sqlite_db("historial_cambio_material_imd", imd.HISTORY_SELECT_COLUMNS, datetime_columns=(12,))
+    for index in range(1, 31):
+        # Registros en pares con el mismo created_at para probar el desempate por id
+        insert(db, index, START + timedelta(hours=(index - 1) // 2), line="PANA_A" if index % 3 else "PANA_B")
+    return db
+
+
+def fetch_all_pages(client, **params):
+    records, cursor, pages = [], None, 0
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        payload = client.get("/api/history", query_string=query).get_json()
+        assert payload["success"] is True
+        records.extend(payload["records"])
+        pages += 1
+        cursor = payload["next_cursor"]
+        if cursor is None:
+            return records, pages
+
+
+def test_keyset_pages_cover_every_record_once_newest_first(imd, history_db):
+    records, pages = fetch_all_pages(imd.app.test_client(), limit=7)
+
+    ids = [record["id"] for record in records]
+    assert sorted(ids) == list(range(1, 31))
+    assert ids == sorted(ids, reverse=True)
+    assert pages == 5
+    query, params = history_db.queries[-1], history_db.params[-1]
+    assert "MAX_EXECUTION_TIME" in query and "OFFSET" not in query
+    assert query.endswith("ORDER BY created_at DESC, id DESC LIMIT %s")
+    assert params[-1] == 8
+
+
+def test_filters_and_date_range_are_applied(imd, history_db):
+    records, _ = fetch_all_pages(
+        imd.app.test_client(), line="PANA_B", date_from="2025-03-01", date_to="2025-03-01"
+    )
+
+    assert records and all(record["line"] == "PANA_B" for record in records)
+    assert all(record["created_at"].startswith("2025-03-01") for record in records)
+
+
+def test_page_size_is_capped(imd, history_db, monkeypatch):
+    monkeypatch.setitem(imd.ProductionConfig.HISTORY_QUERY_CONFIG, "max_page_size", 10)
+
+    payload = imd.app.test_client().get("/api/history", query_string={"limit": 10000}).get_json()
+
+    assert payload["page_size"] == 10
+    assert len(payload["records"]) == 10
+
+
+@pytest.mark.parametrize("params", [
+    {"cursor": "no-es-base64"},
+    {"date_from": "01/03/2025"},
+    {"date_from": "2025-03-02", "date_to": "2025-03-01"},
+    {"limit": "muchos"},
+])
+def test_invalid_parameters_are_rejected_without_querying(imd, history_db, params):
+    payload = imd.app.test_client().get("/api/history", query_string=params).get_json()
+
+    assert payload["success"] is False
+    assert history_db.queries == []
+
+
+def test_query_budget_timeout_is_reported(imd, history_db, mysql_connector):
+    history_db.error = mysql_connector.Error(msg="Query execution was interrupted", errno=imd.ER_QUERY_TIMEOUT)
+
+    payload = imd.app.test_client().get("/api/history", query_string={"lot": "L1"}).get_json()
+
+    assert payload["success"] is False
+    assert "excedió" in payload["error"]
+    assert history_db.released == ["invalidated"]
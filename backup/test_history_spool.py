@@ -0,0 +1,270 @@
+"""Pruebas de la cola local (SQLite) de escritura diferida del historial."""
+
+from __future__ import annotations
+
+import pytest
+
+
+def _record(**overrides):
+    record = {
+        "line": "PANA_A",
+        "posicion_de_feeder": "AXIAL_12",
+        "qr_almacen": "ABC123,LOT55",
+        "numero_de_parte": "ABC123",
+        "spec": "10K",
+        "qr_de_proveedor": "PROV-QR-01",
+        "numero_de_lote_proveedor": "LOTE-XYZ",
+        "polaridad": "+",
+        "persona": "TEST_USER",
+        "created_at": "2026-01-15 08:30:00.123456",
+    }
+    record.update(overrides)
+    return record
+
+
+class FakeRemote:
+    """Simula historial_cambio_material_imd con llave única de idempotencia e imd_feeder_current_state."""
+
+    def __init__(self, mysql_connector, state_upsert_query):
+        self.errors = mysql_connector
+        self.state_upsert_query = state_upsert_query
+        self.rows = {}
+        self.state = {}
+        self.commits = 0
+        self.bad_state_positions = set()
+        self._snapshot = None  # Copia al iniciar una transacción; sin ella cada sentencia se confirma sola
+        self.fail_with = None
+        self.bad_keys = set()
+        self.invalidated = 0
+        self.executemany_calls = []
+        self.queries = []
+        self.table_exists = True
+
+    def _insert(self, params):
+        key = params[-1]
+        if key in self.bad_keys:
+            raise self.errors.DataError(msg="Data too long")
+        self.rows.setdefault(key, len(self.rows) + 1)
+        return self.rows[key]
+
+    def _upsert_state(self, params):
+        if params[1] in self.bad_state_positions:
+            raise self.errors.DataError(msg="Data too long for column 'posicion_de_feeder'")
+        current = self.state.get(params[:2])
+        if current is None or params[-1] >= current[-1]:
+            self.state[params[:2]] = params
+
+    def connect(self):
+        remote = self
+
+        class _Cursor:
+            lastrowid = None
+
+            def execute(self, query, params=None):
+                remote.queries.append(query)
+                if remote.fail_with:
+                    raise remote.fail_with
+                if query.startswith("SELECT idempotency_key"):
+                    self._result = [(key, remote.rows[key]) for key in params if key in remote.rows]
+                    return
+                if query == remote.state_upsert_query:
+                    remote._upsert_state(params)
+                    return
+                self.lastrowid = remote._insert(params)
+
+            def executemany(self, query, seq_params):
+                remote.queries.append(query)
+                if not remote.table_exists:
+                    raise remote.errors.ProgrammingError(msg="Table doesn't exist", errno=1146)
+                if remote.fail_with:
+                    raise remote.fail_with
+                seq_params = list(seq_params)
+                if query == remote.state_upsert_query:
+                    for params in seq_params:
+                        remote._upsert_state(params)
+                    return
+                if any(params[-1] in remote.bad_keys for params in seq_params):
+                    raise remote.errors.DataError(msg="Data too long")
+                remote.executemany_calls.append(len(seq_params))
+                for params in seq_params:
+                    remote._insert(params)
+
+            def fetchone(self):
+                return self._result[0]
+
+            def fetchall(self):
+                return self._result
+
+            def close(self):
+                pass
+
+        class _Connection:
+            database = "test"
+
+            def cursor(self, buffered=False):
+                return _Cursor()
+
+            def start_transaction(self):
+                remote._snapshot = (dict(remote.rows), dict(remote.state))
+
+            def commit(self):
+                remote.commits += 1
+                remote._snapshot = None
+
+            def rollback(self):
+                if remote._snapshot is not None:
+                    remote.rows, remote.state = remote._snapshot
+                remote._snapshot = None
+
+            def invalidate(self):
+                remote.invalidated += 1
+
+            def close(self):
+                pass
+
+        return _Connection()
+
+
+@pytest.fixture
+def spool(imd, mysql_connector, tmp_path, monkeypatch):
+    monkeypatch.setattr(imd.ProductionConfig, "get_app_data_dir", staticmethod(lambda: str(tmp_path)))
+    remote = FakeRemote(mysql_connector, imd.FEEDER_STATE_UPSERT_QUERY)
+    monkeypatch.setattr(imd, "get_db_connection", remote.connect)
+    spool = imd.HistorySpool(imd.ProductionConfig.HISTORY_SPOOL_CONFIG)
+    spool.remote = remote
+    return spool
+
+
+def test_enqueue_is_durable_and_idempotent(imd, spool, tmp_path):
+    local_id, key, duplicate = spool.enqueue(_record(), "key-1")
+    again_id, _, again_duplicate = spool.enqueue(_record(), "key-1")
+
+    assert (duplicate, again_duplicate) == (False, True)
+    assert again_id == local_id
+
+    reopened = imd.HistorySpool(imd.ProductionConfig.HISTORY_SPOOL_CONFIG)
+    assert reopened.status()["pending"] == 1
+
+
+def test_drain_syncs_pending_records(spool):
+    local_id, _, _ = spool.enqueue(_record())
+
+    assert spool.drain() is True
+    record = spool.record_status(local_id)
+    assert record["status"] == "synced"
+    assert record["remote_id"] == 1
+    assert spool.status()["pending"] == 0
+
+
+def test_transient_failure_keeps_records_pending(spool, mysql_connector):
+    local_id, _, _ = spool.enqueue(_record())
+    spool.remote.fail_with = mysql_connector.OperationalError(msg="conexión perdida")
+
+    assert spool.drain() is False
+    assert spool.record_status(local_id)["status"] == "pending"
+    assert spool.record_status(local_id)["attempts"] == 1
+    assert spool.remote.invalidated == 1
+
+    spool.remote.fail_with = None
+    assert spool.drain() is True
+    assert spool.record_status(local_id)["status"] == "synced"
+
+
+def test_pending_records_are_sent_as_one_multi_row_insert(spool):
+    ids = [local_id for local_id, _, _ in spool.enqueue_many([(_record(), None) for _ in range(5)])]
+
+    assert spool.drain() is True
+    assert spool.remote.executemany_calls == [5]
+    assert [spool.record_status(local_id)["remote_id"] for local_id in ids] == [1, 2, 3, 4, 5]
+    metrics = spool.batch_stats()
+    assert metrics["batches"] == 1
+    assert metrics["avg_batch_size"] == 5
+
+
+def test_data_error_rejects_record_without_blocking_queue(spool):
+    good_id, _, _ = spool.enqueue(_record(), "good")
+    bad_id, _, _ = spool.enqueue(_record(), "bad")
+    spool.remote.bad_keys.add("bad")
+
+    assert spool.drain() is True
+    assert spool.record_status(good_id)["status"] == "synced"
+    assert spool.record_status(bad_id)["status"] == "rejected"
+    assert spool.status()["rejected"] == 1
+
+
+def test_drain_hot_path_does_not_probe_information_schema(spool):
+    spool.enqueue(_record())
+
+    assert spool.drain() is True
+    assert not any("information_schema" in query for query in spool.remote.queries)
+
+
+def test_missing_table_is_recreated_lazily(imd, spool, monkeypatch):
+    created = []
+
+    def fake_create_history_table():
+        created.append(True)
+        spool.remote.table_exists = True
+        return True
+
+    monkeypatch.setattr(imd, "SCHEMA_MIGRATIONS", [("historial_cambio_material_imd", fake_create_history_table)])
+    monkeypatch.setattr(imd, "schema_state", {"ready": True, "applied": {"historial_cambio_material_imd": "x"}, "failed": []})
+    spool.remote.table_exists = False
+    local_id, _, _ = spool.enqueue(_record())
+
+    assert spool.drain() is True
+    assert created == [True]
+    assert spool.record_status(local_id)["status"] == "synced"
+    assert imd.schema_state["ready"] is True
+
+
+def test_drain_updates_current_feeder_state_in_same_transaction(spool):
+    spool.enqueue_many([
+        (_record(numero_de_lote_proveedor="OLD", created_at="2026-01-15 08:00:00"), "k-old"),
+        (_record(numero_de_lote_proveedor="NEW", created_at="2026-01-15 09:00:00"), "k-new"),
+        (_record(posicion_de_feeder="AXIAL_3", created_at="2026-01-15 08:30:00"), "k-3"),
+    ])
+
+    assert spool.drain() is True
+    assert spool.remote.commits == 1
+    state = spool.remote.state
+    assert set(state) == {("PANA_A", "AXIAL_12"), ("PANA_A", "AXIAL_3")}
+    assert state[("PANA_A", "AXIAL_12")][2] == spool.remote.rows["k-new"]
+    assert state[("PANA_A", "AXIAL_12")][4] == "NEW"
+
+
+def test_rejected_state_upsert_rolls_back_its_history_row(spool):
+    good_id, _, _ = spool.enqueue(_record(), "good")
+    bad_id, _, _ = spool.enqueue(_record(posicion_de_feeder="AXIAL_BAD"), "bad")
+    spool.remote.bad_state_positions.add("AXIAL_BAD")
+
+    assert spool.drain() is True
+    assert spool.record_status(good_id)["status"] == "synced"
+    assert spool.record_status(bad_id)["status"] == "rejected"
+    assert "bad" not in spool.remote.rows
+    assert set(spool.remote.state) == {("PANA_A", "AXIAL_12")}
+
+
+@pytest.mark.parametrize("key", ["k" * 65, "llave con espacios", 12345])
+def test_invalid_idempotency_key_is_rejected_before_spooling(imd, monkeypatch, key):
+    monkeypatch.setattr(imd.history_spool, "enqueue_many", lambda items: pytest.fail("no debe encolarse"))
+    client = imd.app.test_client()
+    payload = {**_record(), "idempotency_key": key}
+
+    single = client.post("/api/save-history", json=payload)
+    batch = client.post("/api/save-history/batch", json={"records": [_record(), payload]})
+
+    assert single.status_code == 400 and single.get_json()["success"] is False
+    assert batch.status_code == 400 and "Registro 1" in batch.get_json()["error"]
+
+
+def test_valid_idempotency_key_is_spooled(imd, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(
+        imd.history_spool, "enqueue_many", lambda items: enqueued.extend(items) or [(1, items[0][1], False)]
+    )
+
+    response = imd.app.test_client().post("/api/save-history", json={**_record(), "idempotency_key": "a" * 64})
+
+    assert response.status_code == 200 and response.get_json()["idempotency_key"] == "a" * 64
+    assert enqueued[0][1] == "a" * 64
@@ -0,0 +1,28 @@
+"""Regresión de importaciones diferidas (python -X importtime)."""
+
+from __future__ import annotations
+
+import pytest
+
+import check_import_time
+
+
+@pytest.mark.usefixtures("imd")
+def test_heavy_modules_are_not_imported_with_the_app():
+    timings = check_import_time.measure_imports()
+
+    assert "imd_desktop_main" in timings
+    assert check_import_time.deferred_violations(timings) == []
+
+
+def test_parse_importtime_reads_self_and_cumulative_columns():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   mysql.connector.errors\n"
+        "import time:      3000 |       3120 | mysql.connector\n"
+    )
+
+    timings = check_import_time.parse_importtime(output)
+
+    assert timings == {"mysql.connector.errors": (120, 120), "mysql.connector": (3000, 3120)}
+    assert check_import_time.deferred_violations(timings) == ["mysql.connector", "mysql.connector.errors"]
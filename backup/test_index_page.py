@@ -0,0 +1,53 @@
+"""Pruebas de la página principal precalculada y de los recursos estáticos versionados."""
+
+from __future__ import annotations
+
+import gzip
+
+
+def test_index_is_served_with_etag_and_revalidates_with_304(imd):
+    client = imd.app.test_client()
+
+    first = client.get("/")
+    etag = first.headers["ETag"]
+    second = client.get("/", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert second.status_code == 304
+
+
+def test_index_serves_precompressed_gzip_variant(imd):
+    response = imd.app.test_client().get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == imd.render_index_html().encode("utf-8")
+
+
+def test_logo_is_served_from_a_hashed_immutable_url(imd):
+    url = imd.static_url("img/logo.png")
+    response = imd.app.test_client().get(url)
+
+    assert url in imd.render_index_html()
+    assert response.status_code == 200
+    assert response.data.startswith(b"\x89PNG")
+    assert "immutable" in response.headers["Cache-Control"]
+    assert "data:image/png;base64" not in imd.INDEX_HTML
+
+
+def test_unhashed_asset_url_is_revalidated_and_traversal_is_rejected(imd):
+    client = imd.app.test_client()
+
+    assert client.get("/assets/js/app.js").headers["Cache-Control"] == "no-cache"
+    assert client.get("/assets/../imd_desktop_main.py").status_code == 404
+    assert client.get("/assets/js/missing.js").status_code == 404
+
+
+def test_missing_vendor_file_falls_back_to_pinned_cdn(imd, monkeypatch):
+    logical = "vendor/bootstrap/bootstrap.min.css"
+    monkeypatch.setattr(imd, "static_url", lambda logical: None)
+
+    tag = imd.render_asset_tag("stylesheet", logical)
+
+    url, sri = imd.VENDOR_CDN_FALLBACKS[logical]
+    assert url in tag and sri in tag
@@ -0,0 +1,66 @@
+"""Pruebas del logging estructurado y no bloqueante."""
+
+from __future__ import annotations
+
+import ast
+import json
+import logging
+import os
+import queue
+import sys
+
+
+def make_record(level=logging.INFO, msg="hola %s", args=("mundo",), lineno=10, **extra):
+    record = logging.LogRecord("imd", level, "imd_desktop_main.py", lineno, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_extra_fields(imd):
+    entry = json.loads(imd.JsonLogFormatter().format(make_record(line="PANA_A", record_id=7)))
+
+    assert entry["msg"] == "hola mundo"
+    assert entry["level"] == "INFO"
+    assert entry["line"] == "PANA_A"
+    assert entry["record_id"] == 7
+
+
+def test_queue_handler_formats_exception_before_enqueueing(imd):
+    records = queue.SimpleQueue()
+    handler = imd.NonBlockingQueueHandler(records)
+    try:
+        raise ValueError("dato inválido")
+    except ValueError:
+        record = logging.LogRecord("imd", logging.ERROR, __file__, 1, "fallo %s", ("x",), sys.exc_info())
+
+    handler.handle(record)
+    queued = records.get_nowait()
+    entry = json.loads(imd.JsonLogFormatter().format(queued))
+
+    assert queued.exc_info is None and queued.args is None
+    assert entry["msg"] == "fallo x"
+    assert "ValueError: dato inválido" in entry["exc"]
+
+
+def test_debug_events_are_sampled_per_call_site(imd):
+    sampler = imd.DebugSamplingFilter(rate=10)
+
+    debug_kept = sum(sampler.filter(make_record(level=logging.DEBUG)) for _ in range(100))
+    other_site = sampler.filter(make_record(level=logging.DEBUG, lineno=99))
+    info_kept = sum(sampler.filter(make_record(level=logging.INFO)) for _ in range(100))
+
+    assert debug_kept == 10
+    assert other_site is True
+    assert info_kept == 100
+
+
+def test_application_does_not_call_print():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imd_desktop_main.py")
+    with open(path, encoding="utf-8") as handle:
+        tree = ast.parse(handle.read())
+
+    calls = [
+        node.lineno for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "print"
+    ]
+    assert calls == []
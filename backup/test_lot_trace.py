@@ -0,0 +1,138 @@
+"""Pruebas de la trazabilidad de lotes `/api/trace/lot/<lote>`."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+T0 = datetime(2025, 3, 1, 6, 0, 0)
+
+
+def at(minutes):
+    return T0 + timedelta(minutes=minutes)
+
+
+def insert(db, record_id, minutes, lot, position="AXIAL_1", line="PANA_A", key=None):
+    created_at = at(minutes).isoformat(sep=" ")
+    db.insert(
+        record_id, created_at[:10], created_at[11:], line, position, f"ABC123,{lot}", "ABC123", "10K",
+        "QRP", lot, "+", f"op{record_id}", created_at, key,
+    )
+
+
+@pytest.fixture
+def trace_db(imd, sqlite_db, monkeypatch):
+    db = sqlite_db("historial_cambio_material_imd", imd.HISTORY_SELECT_COLUMNS + ("idempotency_key",))
+    insert(db, 1, 0, "L1")                       # L1 en PANA_A AXIAL_1 ...
+    insert(db, 2, 30, "L1")                      # ... recargado (mismo lote, el intervalo continúa) ...
+    insert(db, 3, 60, "L2")                      # ... hasta que se cambia por L2
+    insert(db, 4, 45, "L1", position="AXIAL_7")  # L1 sigue cargado en AXIAL_7
+    insert(db, 5, 10, "L9", position="AXIAL_7")
+    monkeypatch.setattr(imd, "lot_trace_index", imd.LotTraceIndex(max_events=100))
+    return db
+
+
+def local_record(minutes, lot, position="AXIAL_1"):
+    return {
+        "line": "PANA_A", "posicion_de_feeder": position, "numero_de_parte": "ABC123",
+        "numero_de_lote_proveedor": lot, "persona": "local", "created_at": at(minutes).isoformat(sep=" "),
+    }
+
+
+def test_trace_returns_placement_intervals_per_line_and_feeder(imd, trace_db):
+    payload = imd.app.test_client().get("/api/trace/lot/L1").get_json()
+
+    assert payload["success"] is True and payload["complete"] is True
+    assert [(p["posicion_de_feeder"], p["loaded_at"], p["removed_at"], p["changes"]) for p in payload["placements"]] == [
+        ("AXIAL_1", "2025-03-01 06:00:00", "2025-03-01 07:00:00", 2),
+        ("AXIAL_7", "2025-03-01 06:45:00", None, 1),
+    ]
+    assert "numero_de_lote_proveedor = %s" in trace_db.queries[-1]
+
+
+def test_unsynced_local_changes_are_merged(imd, trace_db):
+    imd.lot_trace_index.on_history("enqueued", [
+        ("k-new", local_record(90, "L1", position="AXIAL_9"), None),
+        ("k-swap", local_record(120, "L5", position="AXIAL_7"), None),
+    ])
+
+    payload = imd.trace_lot("L1")
+
+    placements = {p["posicion_de_feeder"]: p for p in payload["placements"]}
+    assert payload["unsynced_events"] == 1
+    assert placements["AXIAL_9"]["removed_at"] is None
+    assert placements["AXIAL_7"]["removed_at"] == "2025-03-01 08:00:00"
+
+
+def test_synced_local_change_is_not_counted_twice(imd, trace_db):
+    imd.lot_trace_index.on_history("synced", [("k-6", local_record(200.5, "L1", position="AXIAL_3"), 6)])
+    insert(trace_db, 6, 200, "L1", position="AXIAL_3", key="k-6")
+
+    payload = imd.trace_lot("L1")
+
+    assert payload["unsynced_events"] == 0
+    axial_3 = [p for p in payload["placements"] if p["posicion_de_feeder"] == "AXIAL_3"]
+    assert len(axial_3) == 1 and axial_3[0]["removed_at"] is None
+
+
+def test_trace_uses_local_index_while_database_is_down(imd, trace_db):
+    trace_db.available = False
+    imd.lot_trace_index.on_history("enqueued", [("k-1", local_record(5, "L1"), None)])
+
+    payload = imd.trace_lot("L1")
+
+    assert payload["complete"] is False
+    assert payload["events"] == 1
+
+
+def test_failed_trace_query_discards_the_connection(imd, trace_db, mysql_connector):
+    trace_db.error = mysql_connector.Error(msg="Query execution was interrupted", errno=imd.ER_QUERY_TIMEOUT)
+
+    payload = imd.trace_lot("L1")
+
+    assert payload["complete"] is False
+    assert trace_db.released == ["invalidated"]
+
+
+def test_memory_index_is_bounded(imd):
+    index = imd.LotTraceIndex(max_events=3)
+    index.on_history("enqueued", [(f"k{n}", local_record(n, f"L{n}"), None) for n in range(5)])
+
+    assert index.stats() == {"events": 3, "lots": 3}
+    assert index.events_for_lot("L0") == []
+
+
+def test_trace_index_migration_adds_only_missing_indexes(imd, monkeypatch):
+    statements = []
+
+    class FakeCursor:
+        def execute(self, query, params=None):
+            statements.append(query)
+
+        def fetchall(self):
+            return [("PRIMARY", "id"), ("idx_lote_proveedor", "numero_de_lote_proveedor")]
+
+        def close(self):
+            pass
+
+    class FakeConnection:
+        database = "imd"
+
+        def cursor(self, buffered=False):
+            return FakeCursor()
+
+        def commit(self):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+    monkeypatch.setattr(imd, "get_db_connection", FakeConnection)
+
+    assert imd.ensure_history_trace_indexes() is True
+    assert "ADD INDEX idx_line_position_created (line, posicion_de_feeder, created_at)" in statements[-1]
+    assert "idx_lote_proveedor" not in statements[-1]
@@ -0,0 +1,92 @@
+"""Pruebas de los histogramas por ruta/fase y del endpoint /api/metrics."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture
+def registry(imd, monkeypatch):
+    fresh = imd.MetricsRegistry(imd.ProductionConfig.METRICS_CONFIG["buckets"])
+    fresh.register_collector(imd.collect_component_metrics)
+    monkeypatch.setattr(imd, "metrics", fresh)
+    return fresh
+
+
+class FakeCursor:
+    def __init__(self, error=None):
+        self.error = error
+
+    def execute(self, query, params=None):
+        if self.error:
+            raise self.error
+
+    def fetchone(self):
+        return ("ok",)
+
+
+class FakeConnection:
+    def __init__(self, error=None):
+        self.error = error
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.error)
+
+
+def test_histogram_quantile_returns_bucket_upper_bound(imd):
+    histogram = imd.Histogram((0.01, 0.1, 1.0))
+    for value in (0.005, 0.05, 0.05, 0.5):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.0) == 1.0
+    assert histogram.count == 4
+
+
+def test_request_and_serialize_phases_are_exported(imd, registry):
+    client = imd.app.test_client()
+    client.get("/api/health")
+
+    body = client.get("/api/metrics").get_data(as_text=True)
+
+    assert 'imd_request_duration_seconds_count{route="/api/health",method="GET",status="200"} 1' in body
+    assert 'imd_phase_duration_seconds_count{route="/api/health",phase="serialize"} 1' in body
+    assert "# TYPE imd_feeder_cache_hit_ratio gauge" in body
+    assert 'imd_history_spool_records{status="pending"}' in body
+
+
+def test_pooled_cursor_times_queries_and_counts_errors_per_profile(imd, mysql_connector, registry):
+    pool = imd.MySQLConnectionPool("perfil_x", {"host": "localhost"}, imd.ProductionConfig.POOL_CONFIG)
+    ok = imd.PooledConnection(pool, FakeConnection())
+    failing = imd.PooledConnection(pool, FakeConnection(mysql_connector.OperationalError(msg="perdida")))
+
+    cursor = ok.cursor(buffered=True)
+    cursor.execute("SELECT 1")
+    with pytest.raises(mysql_connector.OperationalError):
+        failing.cursor().execute("SELECT 1")
+
+    body = registry.render_prometheus()
+    assert cursor.fetchone() == ("ok",)
+    assert 'imd_phase_duration_seconds_count{route="background",phase="query"} 2' in body
+    assert 'imd_db_errors_total{profile="perfil_x",error="OperationalError"} 1' in body
+
+
+def test_failed_acquire_counts_error_for_each_candidate(imd, mysql_connector, registry, monkeypatch):
+    db_pool = imd.DatabasePool([{"host": "a"}, {"host": "b"}], imd.ProductionConfig.POOL_CONFIG)
+
+    def broken_connect():
+        raise mysql_connector.InterfaceError(msg="sin red")
+
+    for pool in db_pool.pools:
+        monkeypatch.setattr(pool, "_connect", broken_connect)
+
+    assert db_pool.get_connection() is None
+
+    body = registry.render_prometheus()
+    assert 'imd_db_errors_total{profile="perfil_1",error="InterfaceError"} 1' in body
+    assert 'imd_db_errors_total{profile="perfil_2",error="InterfaceError"} 1' in body
+    assert 'imd_phase_duration_seconds_count{route="background",phase="acquire"} 1' in body
+
+
+def test_label_values_are_escaped(imd):
+    assert imd.prometheus_labels((("route", 'a"b\\c'),)) == '{route="a\\"b\\\\c"}'
@@ -0,0 +1,72 @@
+"""Pruebas de la consulta cacheable `/api/parts` con ETag/304."""
+
+from __future__ import annotations
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def database_reachable(imd, monkeypatch):
+    monkeypatch.setattr(imd.db_pool, "is_unavailable", lambda: False)
+
+
+def test_part_lookup_matches_validate_change_and_sets_etag(imd, feeder_db):
+    imd.feeder_cache.load()
+    client = imd.app.test_client()
+
+    response = client.get("/api/parts/AXIAL/PANA_A/ABC123?feeder=12&polarity=-")
+    payload = response.get_json()
+
+    assert payload["success"] is True
+    assert payload["feeder"]["is_valid"] is True
+    assert payload["polarity"]["is_valid"] is False
+    assert response.headers["ETag"] == f'"{imd.feeder_cache.etag()}"'
+    assert "max-age=" in response.headers["Cache-Control"]
+
+
+def test_matching_etag_returns_304_without_lookup(imd, feeder_db, monkeypatch):
+    imd.feeder_cache.load()
+    client = imd.app.test_client()
+    etag = client.get("/api/parts/AXIAL/PANA_A/ABC123").headers["ETag"]
+
+    def unexpected_lookup(*args):
+        raise AssertionError("no debería consultarse la caché")
+
+    monkeypatch.setattr(imd, "lookup_feeder_location", unexpected_lookup)
+    response = client.get("/api/parts/AXIAL/PANA_A/ABC123", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_etag_changes_when_feeder_table_changes(imd, feeder_db):
+    imd.feeder_cache.load()
+    client = imd.app.test_client()
+    missing = client.get("/api/parts/RADIAL/PANA_B/NEW001")
+    assert missing.get_json()["success"] is False
+
+    feeder_db.rows.append(("NEW001", "1nF", "RADIAL", "7", None, "PANA_B"))
+    feeder_db.checksum = 2
+    imd.feeder_cache.load()
+    response = client.get("/api/parts/RADIAL/PANA_B/NEW001", headers={"If-None-Match": missing.headers["ETag"]})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+
+
+def test_database_fallback_hit_invalidates_cached_not_found(imd, feeder_db):
+    imd.feeder_cache.load()
+    before = imd.feeder_cache.etag()
+
+    feeder_db.rows.append(("LATE01", "2nF", "AXIAL", "9", None, "PANA_A"))
+    assert imd.lookup_feeder_location("LATE01", "AXIAL", "PANA_A") is not None
+
+    assert imd.feeder_cache.etag() != before
+
+
+def test_no_etag_until_cache_is_loaded(imd, feeder_db):
+    response = imd.app.test_client().get("/api/parts/AXIAL/PANA_A/ABC123")
+
+    assert response.get_json()["success"] is True
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "no-store"
@@ -0,0 +1,85 @@
+"""Pruebas de las gramáticas QR compartidas entre el servidor y la interfaz."""
+
+from __future__ import annotations
+
+import re
+
+import pytest
+
+CORPUS = [
+    "0CE104123J,L12345678,4000",
+    "EAF220031'L2024'500",
+    "RC0603_FR-07_5000",
+    "1RS-LOT9-2000",
+    "A-B,C",
+    " ABC123 ",
+    "SOLO",
+    "",
+]
+
+
+def legacy_extract_part_number(qr_almacen):
+    separators = [",", "'", "_", "-"]
+    part_number = qr_almacen
+    for sep in separators:
+        if sep in qr_almacen:
+            part_number = qr_almacen.split(sep)[0]
+            break
+    return part_number.strip()
+
+
+@pytest.fixture
+def restore_grammars(imd):
+    saved = list(imd.qr_grammars)
+    yield
+    imd.qr_grammars[:] = saved
+    imd._parse_qr_cached.cache_clear()
+
+
+@pytest.mark.parametrize("qr", CORPUS)
+def test_part_number_matches_legacy_separator_loop(imd, qr):
+    assert imd.extract_part_number(qr) == legacy_extract_part_number(qr)
+
+
+def test_lot_and_quantity_are_extracted_in_one_pass(imd):
+    parsed = imd.parse_qr("0CE104123J,L12345678,4000")
+
+    assert parsed == imd.QRParse("coma", "0CE104123J", "L12345678", 4000)
+    assert imd.parse_qr("SOLO") == imd.QRParse("simple", "SOLO", None, None)
+
+
+def test_registered_grammar_takes_priority_and_clears_cache(imd, restore_grammars):
+    assert imd.parse_qr("SUP|P001|L77|300").grammar == "simple"
+
+    imd.register_qr_grammar(
+        "proveedor_barra", r"SUP\|(?P<part>[^|]+)\|(?P<lot>[^|]+)\|(?P<qty>\d+)", "SUP|PARTE|LOTE|CANT", "|", position=0
+    )
+
+    assert imd.parse_qr("SUP|P001|L77|300") == imd.QRParse("proveedor_barra", "P001", "L77", 300)
+
+
+def test_grammar_without_part_group_is_rejected(imd):
+    with pytest.raises(ValueError):
+        imd.compile_qr_grammar("mala", r"(?P<lot>.*)")
+
+
+def test_grammars_are_served_with_javascript_group_syntax(imd):
+    data = imd.app.test_client().get("/api/qr-grammars").get_json()
+
+    names = [grammar["name"] for grammar in data["grammars"]]
+    assert names == [grammar.name for grammar in imd.qr_grammars]
+    for grammar in data["grammars"]:
+        assert "(?P<" not in grammar["pattern"]
+        assert re.compile(grammar["pattern"].replace("(?<", "(?P<"))
+
+
+def test_search_part_reports_parsed_lot(imd, monkeypatch):
+    row = {"no_part": "ABC123", "spec": "10K", "machine": "AXIAL", "feeder": "12", "polarity": "+", "line": "PANA_A"}
+    monkeypatch.setattr(imd, "lookup_feeder_location", lambda part, machine, line: row if part == "ABC123" else None)
+
+    data = imd.app.test_client().post(
+        "/api/search-part", json={"qr_almacen": "ABC123,L555,100", "machine": "AXIAL", "line": "PANA_A"}
+    ).get_json()
+
+    assert data["part_number"] == "ABC123"
+    assert data["qr"] == {"grammar": "coma", "lot": "L555", "qty": 100}
@@ -0,0 +1,88 @@
+"""Pruebas del arranque por etapas (servidor inmediato, base de datos en segundo plano)."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+
+class FakeConnection:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def startup(imd, monkeypatch):
+    for key, value in {"db": "pending", "db_ready_ms": None, "first_paint_ms": None, "error": None}.items():
+        monkeypatch.setitem(imd.startup_state, key, value)
+    monkeypatch.setattr(imd, "server_ready", threading.Event())
+    monkeypatch.setattr(imd, "_startup_stop", threading.Event())
+    monkeypatch.setitem(imd.ProductionConfig.STARTUP_CONFIG, "db_retry_interval", 0)
+    calls = {"migrations": 0, "loads": 0, "replica": 0, "refresher": 0}
+
+    def run_schema_migrations(names=None):
+        calls["migrations"] += 1
+        return True
+
+    monkeypatch.setattr(imd, "run_schema_migrations", run_schema_migrations)
+    monkeypatch.setattr(imd.feeder_cache, "load", lambda: calls.__setitem__("loads", calls["loads"] + 1) or True)
+    monkeypatch.setattr(
+        imd.feeder_cache, "load_from_replica", lambda: calls.__setitem__("replica", calls["replica"] + 1) or True
+    )
+    monkeypatch.setattr(
+        imd.feeder_cache, "start_refresher", lambda: calls.__setitem__("refresher", calls["refresher"] + 1)
+    )
+    return calls
+
+
+def test_background_startup_retries_until_database_returns(imd, startup, monkeypatch):
+    attempts = iter([None, None, FakeConnection()])
+    seen_states = []
+
+    def get_db_connection():
+        seen_states.append(imd.startup_state["db"])
+        return next(attempts)
+
+    monkeypatch.setattr(imd, "get_db_connection", get_db_connection)
+
+    imd.background_startup()
+
+    assert seen_states == ["pending", "offline", "offline"]
+    assert imd.startup_state["db"] == "connected"
+    assert startup == {"migrations": 1, "loads": 1, "replica": 1, "refresher": 1}
+
+
+def test_background_startup_stops_while_offline(imd, startup, monkeypatch):
+    monkeypatch.setattr(imd, "get_db_connection", lambda: imd._startup_stop.set())
+
+    imd.background_startup()
+
+    assert imd.startup_state["db"] == "offline"
+    assert startup["migrations"] == 0 and startup["refresher"] == 0
+
+
+def test_wait_for_flask_server_uses_ready_event(imd, startup):
+    assert imd.wait_for_flask_server(timeout=0.01) is False
+
+    threading.Timer(0.05, imd.server_ready.set).start()
+    assert imd.wait_for_flask_server(timeout=5) is True
+
+
+def test_wait_for_flask_server_reports_startup_error(imd, startup):
+    imd.startup_state["error"] = "puerto ocupado"
+    imd.server_ready.set()
+
+    assert imd.wait_for_flask_server(timeout=1) is False
+
+
+def test_first_paint_is_recorded_once_and_exposed_in_health(imd, startup):
+    client = imd.app.test_client()
+
+    first = client.post("/api/startup/first-paint", json={"page_ms": 120}).get_json()
+    client.post("/api/startup/first-paint", json={"page_ms": 999})
+    health = client.get("/api/health").get_json()
+
+    assert first["startup"]["first_paint_ms"] is not None
+    assert health["startup"]["first_paint_ms"] == first["startup"]["first_paint_ms"]
+    assert health["startup"]["db"] == "pending"
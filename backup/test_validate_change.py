@@ -0,0 +1,68 @@
+"""Pruebas del endpoint combinado `/api/validate-change`."""
+
+from __future__ import annotations
+
+import pytest
+
+ROW = {
+    "no_part": "ABC123",
+    "spec": "10K 1/4W",
+    "machine": "AXIAL",
+    "feeder": "12",
+    "polarity": "+",
+    "line": "PANA_A",
+}
+
+
+@pytest.fixture
+def client(imd, monkeypatch):
+    lookups = []
+
+    def fake_lookup(part_number, machine, line):
+        lookups.append((part_number, machine, line))
+        return ROW if part_number.upper() == "ABC123" else None
+
+    monkeypatch.setattr(imd, "lookup_feeder_location", fake_lookup)
+    client = imd.app.test_client()
+    client.lookups = lookups
+    return client
+
+
+def test_validate_change_returns_part_and_both_verdicts_with_one_lookup(client):
+    response = client.post("/api/validate-change", json={
+        "qr_almacen": "ABC123,LOT55,1000",
+        "feeder_scanned": "12",
+        "polarity_scanned": "-",
+        "machine": "AXIAL",
+        "line": "PANA_A",
+    })
+
+    payload = response.get_json()
+    assert payload["success"] is True
+    assert payload["data"]["posicion_de_feeder"] == "AXIAL_12"
+    assert payload["feeder"]["is_valid"] is True
+    assert payload["polarity"]["is_valid"] is False
+    assert len(client.lookups) == 1
+
+
+def test_validate_change_omits_verdicts_for_missing_scans(client):
+    payload = client.post("/api/validate-change", json={
+        "qr_almacen": "ABC123",
+        "machine": "AXIAL",
+        "line": "PANA_A",
+    }).get_json()
+
+    assert payload["success"] is True
+    assert payload["feeder"] is None
+    assert payload["polarity"] is None
+
+
+def test_validate_change_reports_unknown_part(client):
+    payload = client.post("/api/validate-change", json={
+        "qr_almacen": "NOPE-1",
+        "machine": "AXIAL",
+        "line": "PANA_A",
+    }).get_json()
+
+    assert payload["success"] is False
+    assert payload["part_number"] == "NOPE"
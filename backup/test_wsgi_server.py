@@ -0,0 +1,44 @@
+"""Pruebas de los servidores WSGI seleccionables (waitress / werkzeug)."""
+
+from __future__ import annotations
+
+import http.client
+import threading
+
+import pytest
+
+
+@pytest.mark.parametrize("backend", ["waitress", "werkzeug"])
+def test_backend_serves_keep_alive_requests_and_shuts_down(imd, free_port, backend):
+    if backend == "waitress":
+        pytest.importorskip("waitress")
+    server = imd.create_wsgi_server("127.0.0.1", free_port, {**imd.ProductionConfig.SERVER_CONFIG, "backend": backend})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    connection = http.client.HTTPConnection("127.0.0.1", free_port, timeout=5)
+    statuses = []
+    for _ in range(3):
+        connection.request("GET", "/api/health")
+        response = connection.getresponse()
+        response.read()
+        statuses.append((response.status, response.version))
+    connection.close()
+    server.shutdown()
+    thread.join(10)
+
+    assert server.name == backend
+    assert statuses == [(200, 11)] * 3
+    assert not thread.is_alive()
+
+
+def test_missing_waitress_falls_back_to_werkzeug(imd, free_port, monkeypatch):
+    def missing(*args, **kwargs):
+        raise ImportError("No module named 'waitress'")
+
+    monkeypatch.setattr(imd, "WaitressServer", missing)
+
+    server = imd.create_wsgi_server("127.0.0.1", free_port, {**imd.ProductionConfig.SERVER_CONFIG, "backend": "waitress"})
+    server._server.server_close()
+
+    assert server.name == "werkzeug"
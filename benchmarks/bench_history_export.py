@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de /api/history/export: throughput y memoria de la exportación en
+streaming contra el sustituto local de MySQL con N registros de historial.
+
+Uso:
+    python benchmarks/bench_history_export.py --rows 100000
+    python benchmarks/bench_history_export.py --rows 1000000 --format xlsx --output resultado.json
+
+La memoria se reporta como RSS del proceso (servidor y cliente) al iniciar y
+como máximo durante la exportación; debe mantenerse plana al crecer --rows.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import resource
+import tempfile
+import threading
+import time
+
+from common import free_port  # Agrega la raíz del proyecto a sys.path
+from standin_db import StandInDatabase, seed_history_rows
+
+import imd_desktop_main as imd
+
+
+def current_rss_mb():
+    """RSS actual en MB (Linux); en otros sistemas, el máximo histórico del proceso"""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True, name='RssSampler')
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def download(port, export_format, block_size=64 * 1024):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=600)
+    started = time.perf_counter()
+    connection.request('GET', f'/api/history/export?format={export_format}')
+    response = connection.getresponse()
+    first_byte = None
+    size = newlines = 0
+    while True:
+        block = response.read1(block_size) if hasattr(response, 'read1') else response.read(block_size)
+        if not block:
+            break
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(block)
+        newlines += block.count(b'\n')
+    connection.close()
+    return response, time.perf_counter() - started, first_byte, size, newlines
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='imd_bench_')
+    imd.ProductionConfig.get_app_data_dir = staticmethod(lambda: workdir)
+    imd.ProductionConfig.HISTORY_QUERY_CONFIG['export_chunk_size'] = args.chunk_size
+    logging.getLogger().setLevel(logging.WARNING)
+
+    path = os.path.join(workdir, f'standin_history_{args.rows}.sqlite3')
+    seed_started = time.perf_counter()
+    standin = StandInDatabase(path, 0)
+    seed_history_rows(path, args.rows)
+    seed_seconds = time.perf_counter() - seed_started
+    standin.install(imd)
+
+    port = free_port()
+    server = imd.create_wsgi_server('127.0.0.1', port)
+    threading.Thread(target=server.serve_forever, daemon=True, name='BenchServer').start()
+
+    rss_start = current_rss_mb()
+    sampler = RssSampler()
+    sampler.start()
+    response, duration, first_byte, size, newlines = download(port, args.format)
+    rss_peak = sampler.stop()
+    server.shutdown()
+
+    result = {
+        'config': {
+            'rows': args.rows,
+            'format': args.format,
+            'chunk_size': args.chunk_size,
+            'server_backend': server.name,
+        },
+        'status': response.status,
+        'content_type': response.getheader('Content-Type'),
+        'seed_seconds': round(seed_seconds, 2),
+        'duration_seconds': round(duration, 2),
+        'time_to_first_byte_ms': round(first_byte * 1000, 1) if first_byte is not None else None,
+        'bytes': size,
+        'megabytes_per_second': round(size / 2 ** 20 / duration, 1) if duration else None,
+        'rss_start_mb': round(rss_start, 1),
+        'rss_peak_mb': round(rss_peak, 1),
+        'rss_growth_mb': round(rss_peak - rss_start, 1),
+    }
+    if args.format == 'csv':
+        # Encabezado + una línea por registro
+        result['rows_exported'] = newlines - 1
+        result['rows_per_second'] = round((newlines - 1) / duration) if duration else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='Registros sintéticos de historial')
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+    parser.add_argument('--chunk-size', type=int, default=imd.ProductionConfig.HISTORY_QUERY_CONFIG['export_chunk_size'],
+                        help='Filas por fetchmany')
+    parser.add_argument('--workdir', help='Directorio para la BD sustituta (por defecto, temporal)')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto, stdout)')
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
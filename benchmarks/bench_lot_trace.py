@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de /api/trace/lot/<lote> sobre el sustituto local de MySQL con N
+registros de historial sintéticos (con idx_lote_proveedor e
+idx_line_position_created, igual que la migración).
+
+Uso:
+    python benchmarks/bench_lot_trace.py --rows 1000000 --lookups 500
+    python benchmarks/bench_lot_trace.py --rows 3000000 --db-latency-ms 2 --output resultado.json
+
+La salida es JSON con p50/p95/p99 por consulta y si el p99 queda bajo --target-ms.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import free_port, latency_summary  # Agrega la raíz del proyecto a sys.path
+from standin_db import StandInDatabase, seed_history_rows
+
+import imd_desktop_main as imd
+
+
+def sample_lots(path, count, seed=1):
+    """Lotes existentes elegidos al azar (más algunos inexistentes, como un retiro sin cargas)"""
+    db = sqlite3.connect(path)
+    try:
+        total = db.execute("SELECT MAX(id) FROM historial_cambio_material_imd").fetchone()[0] or 0
+        rng = random.Random(seed)
+        lots = []
+        for _ in range(count):
+            row = db.execute(
+                "SELECT numero_de_lote_proveedor FROM historial_cambio_material_imd WHERE id = ?",
+                (rng.randint(1, total),)
+            ).fetchone()
+            lots.append(row[0] if row and rng.random() > 0.05 else f"NOLOT{rng.randrange(10 ** 6):06d}")
+        return lots
+    finally:
+        db.close()
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='imd_bench_')
+    imd.ProductionConfig.get_app_data_dir = staticmethod(lambda: workdir)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    path = os.path.join(workdir, f'standin_history_{args.rows}.sqlite3')
+    seed_started = time.perf_counter()
+    standin = StandInDatabase(path, 0, args.db_latency_ms)
+    seed_history_rows(path, args.rows)
+    seed_seconds = time.perf_counter() - seed_started
+    standin.install(imd)
+    lots = sample_lots(path, args.lookups)
+
+    port = free_port()
+    server = imd.create_wsgi_server('127.0.0.1', port)
+    threading.Thread(target=server.serve_forever, daemon=True, name='BenchServer').start()
+
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    latencies, placements, errors = [], 0, 0
+    started = time.perf_counter()
+    for lot in lots:
+        request_started = time.perf_counter()
+        connection.request('GET', f'/api/trace/lot/{lot}')
+        body = json.loads(connection.getresponse().read())
+        latencies.append(time.perf_counter() - request_started)
+        if not body.get('success') or not body.get('complete'):
+            errors += 1
+        placements += len(body.get('placements', ()))
+    duration = time.perf_counter() - started
+    connection.close()
+    server.shutdown()
+
+    summary = latency_summary(latencies, duration)
+    return {
+        'config': {
+            'rows': args.rows,
+            'lookups': args.lookups,
+            'db_latency_ms': args.db_latency_ms,
+            'server_backend': server.name,
+        },
+        'seed_seconds': round(seed_seconds, 2),
+        'trace': {**summary, 'max_ms': round(max(latencies) * 1000, 2), 'errors': errors},
+        'placements_per_lot': round(placements / len(lots), 2),
+        'target_ms': args.target_ms,
+        'p99_under_target': summary['p99_ms'] < args.target_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='Registros sintéticos de historial')
+    parser.add_argument('--lookups', type=int, default=500, help='Consultas de lotes a medir')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Latencia simulada por consulta')
+    parser.add_argument('--target-ms', type=float, default=100.0)
+    parser.add_argument('--workdir', help='Directorio para la BD sustituta (por defecto, temporal)')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto, stdout)')
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
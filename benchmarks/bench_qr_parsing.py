@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark de extracción de número de parte: recorrido heredado de
+separadores vs. gramáticas QR precompiladas (sin caché y con la LRU).
+Sin --corpus usa un corpus sintético con los formatos de proveedor/almacén;
+con --corpus lee un QR por línea (p. ej. exportado de historial.qr_almacen).
+
+Uso: python benchmarks/bench_qr_parsing.py [--corpus qrs.txt] [--size 20000]
+"""
+
+import argparse
+import json
+import random
+import timeit
+
+from common import ROOT_DIR  # noqa: F401  Agrega la raíz del proyecto a sys.path
+
+import imd_desktop_main as imd
+
+
+def legacy_extract_part_number(qr_almacen):
+    """Implementación anterior (bucle de separadores con `in` y `split`)"""
+    separators = [',', "'", '_', '-']
+    part_number = qr_almacen
+    for sep in separators:
+        if sep in qr_almacen:
+            part_number = qr_almacen.split(sep)[0]
+            break
+    return part_number.strip()
+
+
+def synthetic_corpus(size, distinct, seed=7):
+    rng = random.Random(seed)
+    formats = (
+        lambda p, l, q: f"{p},{l},{q}",
+        lambda p, l, q: f"{p}'{l}'{q}",
+        lambda p, l, q: f"{p}_{l}_{q}",
+        lambda p, l, q: f"{p}-{l}-{q}",
+        lambda p, l, q: p,
+    )
+    pool = [
+        rng.choice(formats)(
+            f"{rng.choice(('0CE', 'EAF', '1RS', 'RC0603'))}{rng.randint(1000, 999999)}{rng.choice(('', 'J', 'FR'))}",
+            f"L{rng.randint(10**7, 10**8 - 1)}",
+            rng.choice((500, 1000, 2000, 4000, 5000)),
+        )
+        for _ in range(distinct)
+    ]
+    return [rng.choice(pool) for _ in range(size)]
+
+
+def bench(function, corpus, repeat):
+    best = min(timeit.repeat(lambda: [function(qr) for qr in corpus], number=1, repeat=repeat))
+    return round(best / len(corpus) * 1e9, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', help='Archivo con un QR por línea')
+    parser.add_argument('--size', type=int, default=20000, help='QRs del corpus sintético')
+    parser.add_argument('--distinct', type=int, default=2000, help='QRs distintos del corpus sintético')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as handle:
+            corpus = [line.rstrip('\n') for line in handle if line.strip()]
+    else:
+        corpus = synthetic_corpus(args.size, args.distinct)
+
+    mismatches = [qr for qr in corpus if imd.extract_part_number(qr) != legacy_extract_part_number(qr)]
+    uncached = imd._parse_qr_cached.__wrapped__
+
+    imd._parse_qr_cached.cache_clear()
+    results = {
+        'corpus_size': len(corpus),
+        'distinct': len(set(corpus)),
+        'legacy_ns_per_qr': bench(legacy_extract_part_number, corpus, args.repeat),
+        'grammar_uncached_ns_per_qr': bench(uncached, corpus, args.repeat),
+        'grammar_lru_ns_per_qr': bench(imd.parse_qr, corpus, args.repeat),
+        'lru': imd._parse_qr_cached.cache_info()._asdict(),
+        'part_number_mismatches_vs_legacy': len(mismatches),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
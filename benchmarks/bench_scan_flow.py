@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extremo a extremo del flujo de escaneo (search -> feeder ->
+polarity -> save) contra la aplicación en proceso y un sustituto local de
+MySQL con una tabla imd_feeders_location_data sintética de tamaño configurable.
+
+Uso:
+    python benchmarks/bench_scan_flow.py --rows 483 --concurrency 4 --scans 200
+    python benchmarks/bench_scan_flow.py --rows 1000000 --no-cache --db-latency-ms 20 --output resultado.json
+
+La salida es JSON con p50/p95/p99 y throughput por endpoint.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from common import free_port, latency_summary  # Agrega la raíz del proyecto a sys.path
+from standin_db import StandInDatabase, feeder_keys
+
+import imd_desktop_main as imd
+
+FLOW = ('search-part', 'validate-feeder', 'validate-polarity', 'save-history')
+
+
+def scan_sequence(key, operator, rng):
+    """Peticiones de un cambio de material completo para una llave existente"""
+    part, machine, line, feeder, polarity = key
+    lot = f"LOT{rng.randint(1, 99999):05d}"
+    qr_almacen = f"{part},{lot},{rng.randint(100, 5000)}"
+    polarity_scanned = polarity or '+'
+    return [
+        ('search-part', {'qr_almacen': qr_almacen, 'machine': machine, 'line': line}),
+        ('validate-feeder', {'part_number': part, 'feeder_scanned': feeder, 'machine': machine, 'line': line}),
+        ('validate-polarity', {'part_number': part, 'polarity_scanned': polarity_scanned, 'machine': machine, 'line': line}),
+        ('save-history', {
+            'line': line, 'posicion_de_feeder': feeder, 'qr_almacen': qr_almacen, 'numero_de_parte': part,
+            'spec': '', 'qr_de_proveedor': f"SUP-{part}-{lot}", 'numero_de_lote_proveedor': lot,
+            'polaridad': polarity_scanned, 'persona': operator,
+        }),
+    ]
+
+
+def station(port, keys, scans, station_id, latencies, errors):
+    rng = random.Random(station_id)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    for _ in range(scans):
+        for endpoint, payload in scan_sequence(rng.choice(keys), f"OP{station_id:02d}", rng):
+            started = time.perf_counter()
+            try:
+                connection.request('POST', f'/api/{endpoint}', json.dumps(payload), {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                body = json.loads(response.read())
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                errors[endpoint].append(str(e))
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies[endpoint].append(time.perf_counter() - started)
+            if response.status != 200 or not body.get('success'):
+                errors[endpoint].append(body.get('error') or response.status)
+    connection.close()
+
+
+def wait_for_spool(timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline and imd.history_spool.pending_count():
+        time.sleep(0.05)
+    return imd.history_spool.pending_count()
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='imd_bench_')
+    imd.ProductionConfig.get_app_data_dir = staticmethod(lambda: workdir)
+    imd.ProductionConfig.FEEDER_CACHE_CONFIG['enabled'] = args.cache
+    logging.getLogger().setLevel(logging.WARNING)
+
+    seed_started = time.perf_counter()
+    standin = StandInDatabase(os.path.join(workdir, f'standin_{args.rows}.sqlite3'), args.rows, args.db_latency_ms)
+    seed_seconds = time.perf_counter() - seed_started
+    standin.install(imd)
+    imd.feeder_lookup_state['indexed'] = True  # El sustituto tiene idx_feeder_lookup con NOCASE
+    if args.cache:
+        imd.feeder_cache.load()
+    imd.history_spool.start()
+
+    port = free_port()
+    server = imd.create_wsgi_server('127.0.0.1', port)
+    threading.Thread(target=server.serve_forever, daemon=True, name='BenchServer').start()
+
+    keys = feeder_keys(standin.path, limit=args.key_sample)
+    latencies = {endpoint: [] for endpoint in FLOW}
+    errors = {endpoint: [] for endpoint in FLOW}
+    stations = [
+        threading.Thread(target=station, args=(port, keys, args.scans, n + 1, latencies, errors))
+        for n in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in stations:
+        thread.start()
+    for thread in stations:
+        thread.join()
+    duration = time.perf_counter() - started
+    unsynced = wait_for_spool(args.drain_timeout)
+
+    server.shutdown()
+    imd.history_spool.stop(5)
+
+    return {
+        'config': {
+            'rows': args.rows,
+            'concurrency': args.concurrency,
+            'scans_per_station': args.scans,
+            'feeder_cache': args.cache,
+            'db_latency_ms': args.db_latency_ms,
+            'server_backend': server.name,
+        },
+        'seed_seconds': round(seed_seconds, 2),
+        'duration_seconds': round(duration, 2),
+        'scans_per_second': round(args.concurrency * args.scans / duration, 1),
+        'endpoints': {
+            endpoint: {**latency_summary(latencies[endpoint], duration), 'errors': len(errors[endpoint])}
+            for endpoint in FLOW
+        },
+        'history_unsynced': unsynced,
+        'history_batches': imd.history_spool.batch_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=483, help='Registros sintéticos de imd_feeders_location_data')
+    parser.add_argument('--concurrency', type=int, default=4, help='Estaciones de escaneo simultáneas')
+    parser.add_argument('--scans', type=int, default=100, help='Cambios de material por estación')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help='Consultar la BD en cada validación')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='Latencia simulada por consulta')
+    parser.add_argument('--key-sample', type=int, default=50000, help='Llaves distintas usadas en los escaneos')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='Segundos de espera para sincronizar el historial')
+    parser.add_argument('--workdir', help='Directorio para la BD sustituta y la cola (por defecto, temporal)')
+    parser.add_argument('--output', help='Archivo JSON de salida (por defecto, stdout)')
+    args = parser.parse_args()
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
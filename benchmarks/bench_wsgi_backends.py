@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compara peticiones por segundo de /api/search-part con cada servidor WSGI
+(waitress y werkzeug). La caché de feeders se llena con datos sintéticos, así
+que la prueba no necesita MySQL y mide solo el servidor y la aplicación.
+
+Uso: python benchmarks/bench_wsgi_backends.py [--clients 16] [--duration 10]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+
+from common import free_port, latency_summary  # Agrega la raíz del proyecto a sys.path
+
+import imd_desktop_main as imd
+
+LINES = ('PANA_A', 'PANA_B', 'PANA_C', 'PANA_D')
+MACHINES = ('AXIAL', 'RADIAL')
+
+
+def seed_feeder_cache(parts_per_line):
+    for line in LINES:
+        for machine in MACHINES:
+            for idx in range(parts_per_line):
+                part = f"P{idx:05d}"
+                imd.feeder_cache.put(imd.normalize_feeder_key(part, machine, line), {
+                    'no_part': part, 'spec': '10K 1/4W', 'machine': machine,
+                    'feeder': str(idx % 60), 'polarity': '+', 'line': line,
+                })
+    imd.feeder_cache.loaded_at = time.time()
+
+
+def client_loop(port, parts_per_line, deadline, latencies, errors, seed):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    idx = seed
+    while time.perf_counter() < deadline:
+        idx += 1
+        body = json.dumps({
+            'qr_almacen': f"P{idx % parts_per_line:05d},LOT{idx},100",
+            'machine': MACHINES[idx % len(MACHINES)],
+            'line': LINES[idx % len(LINES)],
+        })
+        started = time.perf_counter()
+        try:
+            connection.request('POST', '/api/search-part', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def run_backend(backend, args):
+    config = {**imd.ProductionConfig.SERVER_CONFIG, 'backend': backend}
+    port = free_port()
+    server = imd.create_wsgi_server('127.0.0.1', port, config)
+    if server.name != backend:
+        server.shutdown()
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    clients = [
+        threading.Thread(target=client_loop, args=(port, args.parts, deadline, latencies, errors, n * 7919))
+        for n in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    server.shutdown()
+
+    return {
+        'backend': backend,
+        'clients': args.clients,
+        'errors': len(errors),
+        **latency_summary(latencies, args.duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backends', default='waitress,werkzeug')
+    parser.add_argument('--clients', type=int, default=16, help='Clientes concurrentes (keep-alive)')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos por servidor')
+    parser.add_argument('--parts', type=int, default=2000, help='Números de parte por línea y máquina')
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    seed_feeder_cache(args.parts)
+    results = []
+    for backend in args.backends.split(','):
+        result = run_backend(backend.strip(), args)
+        if result is None:
+            print(f"[WARNING] {backend} no está disponible; se omite")
+            continue
+        results.append(result)
+        print(f"{result['backend']:>10}: {result['requests_per_second']:>8} req/s  "
+              f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  errores {result['errors']}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
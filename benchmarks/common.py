@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Utilidades compartidas por los benchmarks."""
+
+import os
+import socket
+import statistics
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def latency_summary(latencies, duration):
+    """Throughput y percentiles (ms) de una lista de latencias en segundos"""
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0] if latencies else 0] * 99
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / duration, 1) if duration else None,
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+    }
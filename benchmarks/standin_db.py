@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Sustituto local de MySQL para benchmarks: un archivo SQLite con las mismas
+tablas y una conexión que imita la parte de mysql.connector que usa la
+aplicación (cursor con %s, executemany, transacciones, CHECKSUM TABLE e
+INSERT ... ON DUPLICATE KEY UPDATE). Permite agregar latencia de red simulada
+por consulta.
+"""
+
+import datetime
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+
+LINES = ('PANA_A', 'PANA_B', 'PANA_C', 'PANA_D')
+MACHINES = ('AXIAL', 'RADIAL')
+POLARITIES = ('+', '-', None)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS imd_feeders_location_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    no_part TEXT COLLATE NOCASE,
+    spec TEXT,
+    machine TEXT COLLATE NOCASE,
+    feeder TEXT,
+    polarity TEXT,
+    line TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS idx_feeder_lookup ON imd_feeders_location_data (no_part, machine, line);
+CREATE TABLE IF NOT EXISTS historial_cambio_material_imd (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT, hora TEXT, line TEXT, posicion_de_feeder TEXT, qr_almacen TEXT,
+    numero_de_parte TEXT, spec TEXT, qr_de_proveedor TEXT, numero_de_lote_proveedor TEXT,
+    polaridad TEXT, persona TEXT, created_at TEXT, idempotency_key TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_created_at ON historial_cambio_material_imd (created_at);
+CREATE INDEX IF NOT EXISTS idx_lote_proveedor ON historial_cambio_material_imd (numero_de_lote_proveedor);
+CREATE INDEX IF NOT EXISTS idx_line_position_created ON historial_cambio_material_imd (line, posicion_de_feeder, created_at);
+CREATE TABLE IF NOT EXISTS imd_feeder_current_state (
+    line TEXT NOT NULL, posicion_de_feeder TEXT NOT NULL, history_id INTEGER, numero_de_parte TEXT,
+    numero_de_lote_proveedor TEXT, qr_almacen TEXT, polaridad TEXT, persona TEXT, changed_at TEXT,
+    PRIMARY KEY (line, posicion_de_feeder)
+);
+"""
+
+SESSION_SET = re.compile(r"^\s*SET\s+SESSION\b", re.IGNORECASE)
+ON_DUPLICATE_KEY = re.compile(r"\s*ON DUPLICATE KEY UPDATE\s+id\s*=\s*LAST_INSERT_ID\(id\)\s*$", re.IGNORECASE)
+UPSERT_UPDATE = re.compile(r"\s*ON DUPLICATE KEY UPDATE\s+", re.IGNORECASE)
+UPSERT_VALUES = re.compile(r"\bVALUES\((\w+)\)")
+CHECKSUM_TABLE = re.compile(r"^\s*CHECKSUM TABLE\s+(\w+)", re.IGNORECASE)
+
+
+def synthetic_part(index):
+    return f"P{index:07d}"
+
+
+def seed_feeder_rows(path, rows, seed=1):
+    """Crea (o reutiliza si ya tiene `rows` registros) la tabla sintética de feeders"""
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(SCHEMA)
+        existing = db.execute("SELECT COUNT(*) FROM imd_feeders_location_data").fetchone()[0]
+        if existing == rows:
+            return
+        db.execute("DELETE FROM imd_feeders_location_data")
+        rng = random.Random(seed)
+        slots = len(LINES) * len(MACHINES)
+        db.executemany(
+            "INSERT INTO imd_feeders_location_data (no_part, spec, machine, feeder, polarity, line) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    synthetic_part(idx // slots),
+                    f"{rng.choice(('10K', '4.7uF', '100nF', '1M'))} {rng.choice(('1/4W', '50V', '0603'))}",
+                    MACHINES[idx % len(MACHINES)],
+                    str(rng.randint(1, 60)),
+                    rng.choice(POLARITIES),
+                    LINES[(idx // len(MACHINES)) % len(LINES)],
+                )
+                for idx in range(rows)
+            ),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def seed_history_rows(path, rows, seed=1, start=datetime.datetime(2024, 1, 1)):
+    """Agrega registros sintéticos de historial hasta tener `rows` (un cambio cada ~30 s)"""
+    db = sqlite3.connect(path)
+    try:
+        db.executescript(SCHEMA)
+        existing = db.execute("SELECT COUNT(*) FROM historial_cambio_material_imd").fetchone()[0]
+        rng = random.Random(seed + existing)
+
+        def record(index):
+            created_at = start + datetime.timedelta(seconds=30 * index + rng.randint(0, 29))
+            part = synthetic_part(rng.randrange(50000))
+            lot = f"LOT{rng.randrange(200000):06d}"
+            return (
+                created_at.date().isoformat(), created_at.time().isoformat(), rng.choice(LINES),
+                f"{rng.choice(MACHINES)}_{rng.randint(1, 60)}", f"{part},{lot},{rng.randint(100, 5000)}", part,
+                '10K 1/4W', f"SUP-{part}-{lot}", lot, rng.choice(('+', '-', '')), f"OP{rng.randint(1, 40):02d}",
+                created_at.isoformat(sep=' '), None,
+            )
+
+        db.executemany(
+            "INSERT INTO historial_cambio_material_imd (fecha, hora, line, posicion_de_feeder, qr_almacen, "
+            "numero_de_parte, spec, qr_de_proveedor, numero_de_lote_proveedor, polaridad, persona, created_at, "
+            "idempotency_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record(index) for index in range(existing, rows)),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def feeder_keys(path, limit=None):
+    """Llaves (parte, máquina, línea) existentes, para armar secuencias de escaneo"""
+    db = sqlite3.connect(path)
+    try:
+        query = "SELECT no_part, machine, line, feeder, polarity FROM imd_feeders_location_data"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        return db.execute(query).fetchall()
+    finally:
+        db.close()
+
+
+def sqlite_params(params):
+    """Fechas y horas como texto ISO, igual que las devuelve MySQL al leerlas como cadena"""
+    return tuple(
+        value.isoformat(sep=' ') if isinstance(value, datetime.datetime)
+        else value.isoformat() if isinstance(value, (datetime.date, datetime.time))
+        else value
+        for value in (params or ())
+    )
+
+
+class StandInCursor:
+    def __init__(self, connection, buffered=True):
+        self._connection = connection
+        self._buffered = buffered
+        self._stream = None  # Cursor SQLite pendiente de leer (cursor sin búfer)
+        self._rows = []
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def _translate(self, query):
+        query = ON_DUPLICATE_KEY.sub('', query)
+        if UPSERT_UPDATE.search(query):
+            # ON DUPLICATE KEY UPDATE genérico -> UPSERT de SQLite (llave primaria de la tabla)
+            head, update = UPSERT_UPDATE.split(query, 1)
+            update = UPSERT_VALUES.sub(r'excluded.\1', update)
+            update = update.replace('IF(', 'IIF(').replace('GREATEST(', 'MAX(')
+            query = f"{head} ON CONFLICT DO UPDATE SET {update}"
+        if query.lstrip().upper().startswith('INSERT') and 'ON CONFLICT' not in query.upper():
+            query = query.replace('INSERT INTO', 'INSERT OR IGNORE INTO', 1)
+        return query.replace('%s', '?')
+
+    def execute(self, query, params=None):
+        self._connection.simulate_latency()
+        checksum = CHECKSUM_TABLE.match(query)
+        if checksum:
+            self._rows = [(checksum.group(1), self._connection.standin.checksum())]
+            return
+        if SESSION_SET.match(query):
+            self._rows = []
+            return
+        with self._connection.standin.lock:
+            cursor = self._connection.db.execute(self._translate(query), sqlite_params(params))
+            if not self._buffered and query.lstrip().upper().startswith('SELECT'):
+                self._stream, self._rows = cursor, []
+                return
+            self._rows = cursor.fetchall()
+            self.rowcount = cursor.rowcount
+            self.lastrowid = cursor.lastrowid
+            if cursor.rowcount == 0 and query.lstrip().upper().startswith('INSERT'):
+                # ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id): lastrowid es el registro existente
+                self.lastrowid = self._existing_id(params)
+
+    def _existing_id(self, params):
+        row = self._connection.db.execute(
+            "SELECT id FROM historial_cambio_material_imd WHERE idempotency_key = ?", (params[-1],)
+        ).fetchone()
+        return row[0] if row else None
+
+    def executemany(self, query, seq_params):
+        self._connection.simulate_latency()
+        with self._connection.standin.lock:
+            cursor = self._connection.db.executemany(self._translate(query), [sqlite_params(p) for p in seq_params])
+            self.rowcount = cursor.rowcount
+            self._rows = []
+
+    def fetchone(self):
+        if self._stream is not None:
+            return self._stream.fetchone()
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        if self._stream is not None:
+            return self._stream.fetchall()
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size=1):
+        if self._stream is not None:
+            return self._stream.fetchmany(size)
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._rows = []
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class StandInConnection:
+    def __init__(self, standin):
+        self.standin = standin
+        self.db = sqlite3.connect(standin.path, check_same_thread=False, isolation_level=None)
+        self.in_transaction = False
+        self._open = True
+
+    def simulate_latency(self):
+        if self.standin.latency:
+            time.sleep(self.standin.latency)
+
+    def cursor(self, buffered=False, dictionary=False, **kwargs):
+        return StandInCursor(self, buffered)
+
+    def start_transaction(self, **kwargs):
+        with self.standin.lock:
+            self.db.execute("BEGIN")
+        self.in_transaction = True
+
+    def commit(self):
+        if self.in_transaction:
+            with self.standin.lock:
+                self.db.execute("COMMIT")
+            self.in_transaction = False
+
+    def rollback(self):
+        if self.in_transaction:
+            with self.standin.lock:
+                self.db.execute("ROLLBACK")
+            self.in_transaction = False
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, **kwargs):
+        self.simulate_latency()
+
+    def close(self):
+        self._open = False
+        self.db.close()
+
+
+class StandInDatabase:
+    """Archivo SQLite compartido por las conexiones simuladas"""
+
+    def __init__(self, path, rows, latency_ms=0.0):
+        self.path = path
+        self.latency = latency_ms / 1000
+        self.lock = threading.RLock()  # SQLite serializa escrituras; se evita "database is locked"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        seed_feeder_rows(path, rows)
+
+    def checksum(self):
+        # La tabla de feeders no cambia durante el benchmark: huella constante
+        return 1
+
+    def connect(self):
+        return StandInConnection(self)
+
+    def install(self, imd):
+        """Reemplaza los perfiles MySQL del pool de la aplicación por este sustituto"""
+        for pool in imd.db_pool.pools:
+            pool.close_all()
+        pool = imd.MySQLConnectionPool('standin', {'host': 'sqlite', 'port': 0}, imd.ProductionConfig.POOL_CONFIG)
+        pool._connect = self.connect
+        imd.db_pool.pools = [pool]
+        return pool
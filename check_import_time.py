@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verifica el presupuesto de tiempo de importación de imd_desktop_main usando
+`python -X importtime`. Falla si se importa alguno de los módulos pesados que
+deben cargarse de forma diferida o si la importación supera el presupuesto.
+
+Uso: python check_import_time.py [--budget-ms 1500] [--top 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que no deben cargarse al importar la aplicación
+DEFERRED_MODULES = ('webview', 'mysql.connector', 'openpyxl', 'requests', 'multiprocessing')
+DEFAULT_BUDGET_MS = 1500
+
+
+def measure_imports(module='imd_desktop_main'):
+    """Ejecuta un intérprete limpio y devuelve {módulo: (propio_us, acumulado_us)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR,
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {module}:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def deferred_violations(timings):
+    return sorted(
+        name for name in timings
+        if any(name == module or name.startswith(module + '.') for module in DEFERRED_MODULES)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    timings = measure_imports()
+    total_ms = timings.get('imd_desktop_main', (0, 0))[1] / 1000
+
+    print(f"Importación de imd_desktop_main: {total_ms:.0f} ms (presupuesto {args.budget_ms} ms)")
+    for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms propio  {cumulative_us / 1000:8.1f} ms acumulado  {name}")
+
+    failed = False
+    violations = deferred_violations(timings)
+    if violations:
+        failed = True
+        print(f"❌ Módulos que deberían cargarse de forma diferida: {', '.join(violations)}")
+    if total_ms > args.budget_ms:
+        failed = True
+        print(f"❌ Se excedió el presupuesto de importación ({total_ms:.0f} ms > {args.budget_ms} ms)")
+    if not failed:
+        print("✓ Presupuesto de importación OK")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,9 @@
 @echo off
 REM Script de compilación para IMD Material Control Desktop App
+REM Uso: compile_app.bat [--allow-cdn]
+REM   --allow-cdn  compila aunque falten los recursos de static\vendor (el exe usará el CDN)
+set ALLOW_CDN=0
+if /i "%~1"=="--allow-cdn" set ALLOW_CDN=1
 echo ==========================================
 echo    IMD MATERIAL CONTROL - COMPILACION
 echo ==========================================
@@ -14,14 +18,34 @@ if errorlevel 1 (
 )
 
 echo [2/5] Verificando dependencias...
-python -c "import flask, flask_cors, webview, mysql.connector, requests; print('✓ Dependencias OK')"
+python -c "import flask, flask_cors, webview, mysql.connector; print('✓ Dependencias OK')"
 if errorlevel 1 (
-    echo Error: Faltan dependencias. Ejecute: pip install flask flask-cors pywebview mysql-connector-python requests
+    echo Error: Faltan dependencias. Ejecute: pip install flask flask-cors pywebview mysql-connector-python
     pause
     exit /b 1
 )
 
-echo [3/5] Limpiando compilaciones anteriores...
+echo [3/5] Descargando recursos locales (Bootstrap)...
+python fetch_vendor_assets.py
+python fetch_vendor_assets.py --check
+if errorlevel 1 (
+    if "%ALLOW_CDN%"=="1" (
+        echo Aviso: Faltan recursos en static\vendor\bootstrap; se compila con el CDN como respaldo ^(--allow-cdn^)
+    ) else (
+        echo Error: Faltan recursos en static\vendor\bootstrap. Sin ellos la aplicacion depende del CDN.
+        echo Revise la conexion y vuelva a ejecutar, o use: compile_app.bat --allow-cdn
+        pause
+        exit /b 1
+    )
+)
+
+echo Verificando presupuesto de importacion...
+python check_import_time.py
+if errorlevel 1 (
+    echo Aviso: La importacion de la aplicacion excede el presupuesto o carga modulos pesados
+)
+
+echo Limpiando compilaciones anteriores...
 if exist "dist" rmdir /s /q "dist"
 if exist "build" rmdir /s /q "build"
 
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Descarga los recursos de terceros (Bootstrap) a static/vendor/ para que la
+aplicación funcione sin acceso a internet. Cada archivo se verifica contra el
+hash SRI fijado en VENDOR_CDN_FALLBACKS antes de guardarse.
+
+Uso: python fetch_vendor_assets.py [--check]
+
+Con --check no se descarga nada: solo se comprueba que los archivos ya estén en
+static/vendor/ con el hash correcto (lo usa compile_app.bat antes de compilar).
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import re
+import sys
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_FILE = os.path.join(ROOT_DIR, 'imd_desktop_main.py')
+STATIC_DIR = os.path.join(ROOT_DIR, 'static')
+
+# Se lee la tabla directamente del código para no importar Flask/MySQL
+VENDOR_ENTRY = re.compile(
+    r"'(?P<logical>vendor/[^']+)':\s*\(\s*'(?P<url>https://[^']+)',\s*'(?P<sri>sha384-[^']+)'"
+)
+
+
+def load_vendor_table():
+    with open(MAIN_FILE, encoding='utf-8') as handle:
+        source = handle.read()
+    return [match.groupdict() for match in VENDOR_ENTRY.finditer(source)]
+
+
+def sri_of(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode('ascii')
+
+
+def target_of(entry):
+    return os.path.join(STATIC_DIR, *entry['logical'].split('/'))
+
+
+def check(entry):
+    target = target_of(entry)
+    if not os.path.isfile(target):
+        raise FileNotFoundError(f"No existe {target}")
+    with open(target, 'rb') as handle:
+        data = handle.read()
+    if sri_of(data) != entry['sri']:
+        raise ValueError(f"El hash de {target} no coincide con {entry['sri']}")
+    return target, len(data)
+
+
+def fetch(entry):
+    with urllib.request.urlopen(entry['url'], timeout=30) as response:
+        data = response.read()
+    if sri_of(data) != entry['sri']:
+        raise ValueError(f"El hash de {entry['url']} no coincide con {entry['sri']}")
+    target = target_of(entry)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as handle:
+        handle.write(data)
+    return target, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--check', action='store_true',
+                        help='solo verificar los archivos existentes, sin descargar')
+    args = parser.parse_args()
+
+    entries = load_vendor_table()
+    if not entries:
+        print("No se encontraron recursos en VENDOR_CDN_FALLBACKS")
+        return 1
+    failed = 0
+    for entry in entries:
+        try:
+            target, size = check(entry) if args.check else fetch(entry)
+            print(f"✓ {entry['logical']} ({size} bytes) -> {target}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {entry['logical']}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
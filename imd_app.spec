@@ -13,31 +13,22 @@ a = Analysis(
     binaries=[],
     datas=[
         # Incluir archivos de datos necesarios
-        ('imd_desktop_app.html', '.'),
-        ('config.py', '.'),
+        ('static', 'static'),
         ('icono_app.png', '.'),
     ],
     hiddenimports=[
-        # Módulos que PyInstaller podría no detectar automáticamente
+        # Importados de forma diferida (importlib / dentro de main): PyInstaller no los detecta
         'mysql.connector',
-        'flask',
-        'flask_cors',
-        'requests',
+        'mysql.connector.locales.eng.client_error',
         'webview',
-        'threading',
-        'socket',
-        'logging',
-        'datetime',
-        'json',
-        'sys',
-        'os',
-        'time'
+        'waitress',
+        'openpyxl',  # Opcional: exportación de historial en XLSX
     ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
     excludes=[
-        # Excluir módulos innecesarios para reducir tamaño
+        # Excluir módulos innecesarios para reducir tamaño y el desempaquetado al iniciar
         'tkinter',
         'matplotlib',
         'numpy',
@@ -45,7 +36,15 @@ a = Analysis(
         'scipy',
         'PIL',
         'pygame',
-        'wx'
+        'wx',
+        'requests',
+        'urllib3',
+        'charset_normalizer',
+        'certifi',
+        'unittest',
+        'pydoc',
+        'lib2to3',
+        'xmlrpc'
     ],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
@@ -10,16 +10,55 @@ import os
 import sys
 import threading
 import time
-import webview
 import socket
 import logging
-import signal
-import multiprocessing
+import logging.handlers
+import queue
+import atexit
 import base64
-from flask import Flask, jsonify, request
+import signal
+import argparse
+import collections
+import csv
+import functools
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import mimetypes
+import re
+import sqlite3
+import tempfile
+import uuid
+from flask import Flask, Response, g, has_request_context, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import mysql.connector
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# Referencia para medir el tiempo de arranque (no incluye el arranque del intérprete)
+PROCESS_STARTED_AT = time.time()
+
+
+class LazyModule:
+    """Importa el módulo la primera vez que se usa uno de sus atributos"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+# El conector MySQL (y webview, dentro de main) se importan fuera del camino al primer pintado
+mysql_connector = LazyModule('mysql.connector')
+openpyxl = LazyModule('openpyxl')  # Opcional: solo para exportar historial en XLSX
 
 # =====================================================================================
 # CONFIGURACIÓN INTEGRADA (anteriormente config.py)
@@ -92,7 +131,98 @@ class ProductionConfig:
         'level': 'INFO',
         'file_path': os.path.join(os.path.expanduser('~'), 'IMD_Logs', 'app.log'),
         'max_size': 10 * 1024 * 1024,  # 10MB
-        'backup_count': 5
+        'backup_count': 5,
+        'debug_sample_rate': 100,  # Se escribe 1 de cada N eventos DEBUG por línea de código
+        'console': True            # Copia legible en la consola (si existe)
+    }
+    
+    # Pool de conexiones MySQL (por perfil candidato)
+    POOL_CONFIG = {
+        'max_size': 5,             # Conexiones máximas por perfil
+        'max_idle_time': 300,      # Segundos antes de descartar una conexión ociosa
+        'ping_after_idle': 1.0,    # Segundos de inactividad tras los cuales se hace ping al prestar
+        'borrow_timeout': 5,       # Segundos máximos esperando una conexión libre
+        'connection_timeout': 10,
+        'failure_cooldown': 30     # Segundos que un perfil fallido pasa al final de la lista
+    }
+    
+    # Caché local de imd_feeders_location_data
+    FEEDER_CACHE_CONFIG = {
+        'enabled': True,
+        'refresh_interval': 120,   # Segundos entre refrescos en segundo plano
+        'replica_file': 'feeders_replica.sqlite3',  # Réplica local para operar sin conexión
+        'client_max_age': 10       # Segundos que la interfaz reutiliza /api/parts sin revalidar
+    }
+    
+    # Cola local de escritura diferida para el historial
+    HISTORY_SPOOL_CONFIG = {
+        'file_name': 'history_spool.sqlite3',  # Dentro de get_app_data_dir()
+        'drain_interval': 2,       # Segundos entre envíos a la base de datos
+        'max_batch_size': 100,     # Registros máximos por INSERT multi-fila
+        'max_linger': 0.5,         # Segundos que se espera para juntar registros en un lote
+        'max_request_records': 500,  # Registros máximos por petición a /api/save-history/batch
+        'max_backoff': 300,        # Segundos máximos de espera tras fallas consecutivas
+        'retention_days': 7        # Días que se conservan los registros ya sincronizados
+    }
+
+    # Consulta de historial (/api/history)
+    HISTORY_QUERY_CONFIG = {
+        'default_page_size': 50,
+        'max_page_size': 500,
+        'max_execution_ms': 3000,  # Presupuesto por consulta (MAX_EXECUTION_TIME de MySQL)
+        'export_chunk_size': 2000, # Filas por fetchmany al exportar
+        'export_net_write_timeout': 600,  # Segundos que MySQL espera a un cliente lento durante la exportación
+        'max_concurrent_exports': 1  # Cada exportación retiene una conexión del pool mientras transmite
+    }
+
+    # Trazabilidad de lotes de proveedor (/api/trace/lot/<lote>)
+    TRACE_CONFIG = {
+        'memory_events': 50000,    # Cambios recientes de esta estación indexados en memoria
+        'max_events': 5000,        # Cambios máximos por lote leídos de MySQL
+        'max_execution_ms': 2000
+    }
+
+    # Estado actual de feeders por línea (/api/lines/<línea>/state)
+    FEEDER_STATE_CONFIG = {
+        'refresh_interval': 15,        # Segundos antes de releer de MySQL los cambios de otras estaciones
+        'pending_overlay_limit': 5000  # Registros de la cola local revisados al releer una línea
+    }
+
+    # Canal de eventos en vivo (/api/events, server-sent events)
+    EVENTS_CONFIG = {
+        'max_clients': 4,          # Cada flujo abierto ocupa un hilo de SERVER_CONFIG['threads']
+        'queue_size': 100,         # Eventos en espera por cliente; si se llena, el cliente se reconecta
+        'heartbeat_interval': 15,  # Segundos entre comentarios keep-alive (detecta clientes desconectados)
+        'max_stream_seconds': 300, # El flujo se cierra y el navegador se reconecta (libera el hilo)
+        'retry_ms': 3000           # Espera sugerida al navegador antes de reconectarse
+    }
+    
+    # Arranque por etapas: la ventana no espera a la base de datos
+    STARTUP_CONFIG = {
+        'server_timeout': 15,      # Segundos máximos esperando a que el servidor escuche
+        'db_retry_interval': 15    # Segundos entre reintentos si la base de datos no respondió al iniciar
+    }
+    
+    # Servidor WSGI: 'waitress' (producción, dependencia opcional) o 'werkzeug' (respaldo)
+    SERVER_CONFIG = {
+        'backend': 'waitress',
+        'threads': 8,              # Hilos de trabajo que atienden peticiones (waitress)
+        'connection_limit': 100,   # Conexiones simultáneas máximas (waitress)
+        'channel_timeout': 120,    # Segundos que se conserva una conexión keep-alive ociosa
+        'backlog': 128             # Conexiones en espera de ser aceptadas (waitress)
+    }
+    
+    # Métricas de latencia por ruta y fase (/api/metrics)
+    METRICS_CONFIG = {
+        'buckets': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),  # Segundos
+        'log_interval': 300        # Segundos entre resúmenes en el log (0 = desactivado)
+    }
+    
+    # Modo servidor (--headless / --serve): un PC atiende a todas las estaciones de las líneas
+    HEADLESS_CONFIG = {
+        'host': '0.0.0.0',         # Dirección de escucha para los clientes de la red
+        'port': 5000,
+        'shutdown_timeout': 10     # Segundos máximos esperando a que el servidor se detenga
     }
     
     # URLs y puertos
@@ -110,19 +240,95 @@ class ProductionConfig:
 # APLICACIÓN PRINCIPAL
 # =====================================================================================
 
-# Configurar logging
+# Atributos propios de LogRecord; el resto proviene de extra={...} y se escribe como campo JSON
+_LOG_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de extra={...} como llaves propias"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _LOG_RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Deja pasar 1 de cada N eventos DEBUG por línea de código; los demás niveles pasan siempre"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, int(rate))
+        self._seen = collections.Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        with self._lock:
+            seen = self._seen[(record.pathname, record.lineno)]
+            self._seen[(record.pathname, record.lineno)] = seen + 1
+        if seen % self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Solo encola: el formateo y la escritura a disco ocurren en el hilo del QueueListener"""
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
 def setup_logging():
-    """Configura el sistema de logging"""
-    log_dir = os.path.dirname(ProductionConfig.LOG_CONFIG['file_path'])
+    """Configura el logging: la petición solo encola, un hilo aparte rota y escribe el archivo"""
+    config = ProductionConfig.LOG_CONFIG
+    log_dir = os.path.dirname(config['file_path'])
     os.makedirs(log_dir, exist_ok=True)
     
+    file_handler = logging.handlers.RotatingFileHandler(
+        config['file_path'],
+        maxBytes=config['max_size'],
+        backupCount=config['backup_count'],
+        encoding='utf-8',
+        delay=True
+    )
+    file_handler.setFormatter(JsonLogFormatter())
+    handlers = [file_handler]
+    # En el ejecutable sin consola sys.stdout es None
+    if config.get('console', True) and sys.stdout is not None:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        handlers.append(console_handler)
+    
+    listener = logging.handlers.QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+    queue_handler = NonBlockingQueueHandler(listener.queue)
+    queue_handler.addFilter(DebugSamplingFilter(config.get('debug_sample_rate', 1)))
+    listener.start()
+    atexit.register(listener.stop)  # Vacía la cola al terminar el proceso
+    
     logging.basicConfig(
-        level=getattr(logging, ProductionConfig.LOG_CONFIG['level']),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(ProductionConfig.LOG_CONFIG['file_path']),
-            logging.StreamHandler(sys.stdout)
-        ]
+        level=getattr(logging, config['level']),
+        handlers=[queue_handler]
     )
     return logging.getLogger(__name__)
 
@@ -137,412 +343,2274 @@ CORS(app)
 # Usar configuración de base de datos de ProductionConfig y soportar candidatos
 db_config = ProductionConfig.get_db_config()
 
-# Función para obtener conexión a la base de datos
-def get_db_connection():
-    """Obtiene conexión a la base de datos con manejo de errores mejorado y candidatos"""
-    # Preparar lista de credenciales a probar: candidatos + principal
+# =====================================================================================
+# MÉTRICAS (histogramas por ruta y fase, formato Prometheus)
+# =====================================================================================
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos (compatible con Prometheus)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            idx = len(self.buckets)
+        self.counts[idx] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Límite superior del bucket que alcanza el cuantil q (None si no hay datos)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+def prometheus_labels(labels):
+    if not labels:
+        return ''
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsRegistry:
+    """Histogramas y contadores etiquetados; los valores de otros componentes se leen al exportar"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._histograms = {}  # nombre -> {etiquetas: Histogram}
+        self._counters = {}    # nombre -> {etiquetas: valor}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def observe(self, name, labels, seconds):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def register_collector(self, collector):
+        """collector() -> lista de (nombre, tipo, ayuda, [(etiquetas, valor)])"""
+        self._collectors.append(collector)
+
+    def histograms(self, name):
+        with self._lock:
+            return {
+                labels: (histogram.count, histogram.total, histogram.quantile(0.5), histogram.quantile(0.95))
+                for labels, histogram in self._histograms.get(name, {}).items()
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f"{name}_bucket{prometheus_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{prometheus_labels(labels)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{prometheus_labels(labels)} {histogram.count}")
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{prometheus_labels(labels)} {value}")
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.error(f"Error leyendo métricas: {e}")
+                continue
+            for name, kind, help_text, values in samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    lines.append(f"{name}{prometheus_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(ProductionConfig.METRICS_CONFIG['buckets'])
+metrics.describe('imd_request_duration_seconds', 'Duración total de la petición por ruta')
+metrics.describe('imd_phase_duration_seconds', 'Duración por fase (acquire, query, serialize) y ruta')
+metrics.describe('imd_db_errors_total', 'Errores de base de datos por perfil candidato y tipo')
+metrics.describe('imd_not_modified_total', 'Respuestas 304 por ETag vigente por ruta')
+
+
+def current_route():
+    """Regla de la ruta en curso (o 'background' fuera de una petición)"""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'background'
+
+
+def observe_phase(phase, seconds):
+    metrics.observe('imd_phase_duration_seconds', (('route', current_route()), ('phase', phase)), seconds)
+
+
+def count_db_error(profile, error):
+    metrics.inc('imd_db_errors_total', (('profile', profile), ('error', type(error).__name__)))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Mide la serialización de jsonify como fase 'serialize'"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            observe_phase('serialize', time.perf_counter() - started)
+
+
+def summarize_metrics():
+    """Resumen de una línea por ruta para el log periódico"""
+    phases = {}
+    for labels, (count, total, _, _) in sorted(metrics.histograms('imd_phase_duration_seconds').items()):
+        label = dict(labels)
+        phases.setdefault(label['route'], []).append(f"{label['phase']} {total / count * 1000:.1f} ms")
+    lines = []
+    for labels, (count, total, p50, p95) in sorted(metrics.histograms('imd_request_duration_seconds').items()):
+        label = dict(labels)
+        line = (f"{label['method']} {label['route']} {label['status']}: {count} pet., "
+                f"prom {total / count * 1000:.1f} ms, p50<={p50 * 1000:g} ms, p95<={p95 * 1000:g} ms")
+        if label['route'] in phases:
+            line += f" [{', '.join(phases[label['route']])}]"
+        lines.append(line)
+    return lines
+
+
+class MetricsLogger:
+    """Escribe en el log un resumen de las métricas cada log_interval segundos"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop_event.wait(self.interval):
+            for line in summarize_metrics():
+                logger.info(f"Métricas: {line}")
+
+    def start(self):
+        if self.interval and (self._thread is None or not self._thread.is_alive()):
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="MetricsLogger")
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+metrics_logger = MetricsLogger(ProductionConfig.METRICS_CONFIG['log_interval'])
+
+app.json = TimedJSONProvider(app)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe(
+            'imd_request_duration_seconds',
+            (('route', rule), ('method', request.method), ('status', str(response.status_code))),
+            time.perf_counter() - started
+        )
+    return response
+
+# =====================================================================================
+# POOL DE CONEXIONES MYSQL
+# =====================================================================================
+
+class PoolExhaustedError(Exception):
+    """No hay conexiones libres en el pool dentro del tiempo de espera"""
+
+
+class PooledConnection:
+    """Envoltura de una conexión MySQL que regresa al pool en lugar de cerrarse"""
+
+    def __init__(self, pool, raw_connection):
+        self._pool = pool
+        self._raw = raw_connection
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def profile(self):
+        """Nombre del perfil candidato al que pertenece la conexión"""
+        return self._pool.name
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._raw.cursor(*args, **kwargs), self._pool.name)
+
+    def invalidate(self):
+        """Descarta la conexión (p. ej. tras un error de red) en lugar de reutilizarla"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw, broken=True)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Si el bloque falló la conexión puede quedar con una transacción o sesión a medias: se descarta
+        if exc_type is not None:
+            self.invalidate()
+        else:
+            self.close()
+
+
+class TimedCursor:
+    """Cursor que mide execute/executemany como fase 'query' y cuenta errores por perfil"""
+
+    def __init__(self, raw_cursor, profile):
+        self._raw = raw_cursor
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except mysql_connector.Error as db_error:
+            count_db_error(self._profile, db_error)
+            raise
+        finally:
+            observe_phase('query', time.perf_counter() - started)
+
+    def execute(self, *args, **kwargs):
+        return self._timed(self._raw.execute, *args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self._timed(self._raw.executemany, *args, **kwargs)
+
+
+class MySQLConnectionPool:
+    """Pool acotado de conexiones para un perfil candidato, con expiración por inactividad y ping al prestar"""
+
+    def __init__(self, name, creds, config):
+        self.name = name
+        self.creds = creds
+        self.max_size = config.get('max_size', 5)
+        self.max_idle_time = config.get('max_idle_time', 300)
+        self.ping_after_idle = config.get('ping_after_idle', 1.0)
+        self.connection_timeout = config.get('connection_timeout', 10)
+        self.failure_cooldown = config.get('failure_cooldown', 30)
+        self._idle = collections.deque()  # (conexión, último uso)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._failed_until = 0.0
+        self.counters = {
+            'created': 0,
+            'reused': 0,
+            'pinged': 0,
+            'discarded': 0,
+            'evicted': 0,
+            'connect_errors': 0,
+            'timeouts': 0,
+        }
+
+    def _connect(self):
+        connection = mysql_connector.connect(
+            host=self.creds['host'],
+            port=self.creds.get('port', 11550),
+            user=self.creds['user'],
+            password=self.creds['password'],
+            database=self.creds['database'],
+            charset='utf8mb4',
+            autocommit=True,
+            connection_timeout=self.connection_timeout,
+            use_pure=True,
+        )
+        if not connection.is_connected():
+            raise mysql_connector.Error(msg="Conexión no activa")
+        return connection
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _evict_expired(self, now):
+        """Retira (bajo el lock) las conexiones ociosas que superaron max_idle_time"""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.max_idle_time:
+            expired.append(self._idle.popleft()[0])
+        self.counters['evicted'] += len(expired)
+        return expired
+
+    def is_cooling_down(self):
+        return time.monotonic() < self._failed_until
+
+    def acquire(self, timeout):
+        """Presta una conexión: reutiliza una ociosa o crea una nueva si hay cupo"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                expired = self._evict_expired(now)
+                if self._idle:
+                    connection, last_used = self._idle.pop()  # LIFO: la más recientemente usada
+                    self._in_use += 1
+                    break
+                if self._in_use + len(self._idle) < self.max_size:
+                    connection, last_used = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise PoolExhaustedError(f"Pool '{self.name}' agotado ({self.max_size} conexiones en uso)")
+                self._cond.wait(remaining)
+
+        for stale in expired:
+            self._close_quietly(stale)
+
+        try:
+            if connection is not None and time.monotonic() - last_used > self.ping_after_idle:
+                try:
+                    connection.ping(reconnect=False)
+                    self.counters['pinged'] += 1
+                except Exception:
+                    self.counters['discarded'] += 1
+                    self._close_quietly(connection)
+                    connection = None
+            if connection is None:
+                connection = self._connect()
+                self.counters['created'] += 1
+                self._failed_until = 0.0
+            else:
+                self.counters['reused'] += 1
+            return connection
+        except Exception:
+            self.counters['connect_errors'] += 1
+            self._failed_until = time.monotonic() + self.failure_cooldown
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        """Devuelve una conexión al pool; las rotas o con transacción abierta se descartan"""
+        if not broken:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            self._in_use -= 1
+            if not broken:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self.counters['discarded'] += 1
+            self._cond.notify()
+        if broken:
+            self._close_quietly(connection)
+
+    def close_all(self):
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'profile': self.name,
+                'host': f"{self.creds['host']}:{self.creds.get('port', 11550)}",
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'cooling_down': self.is_cooling_down(),
+                **self.counters,
+            }
+
+
+class DatabasePool:
+    """Conjunto de pools por perfil candidato con conmutación por falla entre ellos"""
+
+    def __init__(self, candidates, config):
+        self.borrow_timeout = config.get('borrow_timeout', 5)
+        self.pools = [
+            MySQLConnectionPool(f"perfil_{idx}", creds, config)
+            for idx, creds in enumerate(candidates, start=1)
+        ]
+
+    def get_connection(self):
+        # Los perfiles en enfriamiento por fallas recientes se intentan al final
+        ordered = sorted(self.pools, key=lambda pool: pool.is_cooling_down())
+        last_error = None
+        started = time.perf_counter()
+        try:
+            for pool in ordered:
+                try:
+                    raw_connection = pool.acquire(self.borrow_timeout)
+                    return PooledConnection(pool, raw_connection)
+                except PoolExhaustedError as err:
+                    logger.warning(str(err))
+                    last_error = err
+                except mysql_connector.Error as err:
+                    logger.error(f"Error de MySQL con {pool.name}: {err}")
+                    last_error = err
+                except Exception as e:
+                    logger.error(f"Error de conexión con {pool.name}: {e}")
+                    last_error = e
+                count_db_error(pool.name, last_error)
+        finally:
+            observe_phase('acquire', time.perf_counter() - started)
+
+        logger.error(f"No se pudo establecer conexión a la base de datos. Último error: {last_error}")
+        return None
+
+    def is_unavailable(self):
+        """True si todos los perfiles fallaron recientemente (evita esperar timeouts sin conexión)"""
+        return all(pool.is_cooling_down() for pool in self.pools)
+
+    def close_all(self):
+        for pool in self.pools:
+            pool.close_all()
+
+    def stats(self):
+        return [pool.stats() for pool in self.pools]
+
+
+def build_db_candidates(config):
+    """Prepara la lista de credenciales a probar: candidatos + principal"""
     candidates = []
-    if isinstance(db_config, dict) and 'candidates' in db_config:
-        candidates.extend(db_config['candidates'])
+    if isinstance(config, dict) and 'candidates' in config:
+        candidates.extend(config['candidates'])
     # Añadir credencial principal al final si no está
     primary = {
-        'host': db_config.get('host'),
-        'port': db_config.get('port', 11550),
-        'user': db_config.get('user'),
-        'password': db_config.get('password'),
-        'database': db_config.get('database')
+        'host': config.get('host'),
+        'port': config.get('port', 11550),
+        'user': config.get('user'),
+        'password': config.get('password'),
+        'database': config.get('database')
     }
     if primary['host'] and primary not in candidates:
         candidates.append(primary)
+    return candidates
 
-    last_error = None
-    for idx, creds in enumerate(candidates, start=1):
-        try:
-            print(f"[INFO] Intentando conexión a MySQL (perfil {idx}/{len(candidates)}) en {creds['host']}:{creds.get('port', 11550)} como {creds.get('user')}")
-            connection = mysql.connector.connect(
-                host=creds['host'],
-                port=creds.get('port', 11550),
-                user=creds['user'],
-                password=creds['password'],
-                database=creds['database'],
-                charset='utf8mb4',
-                autocommit=True,
-                connection_timeout=10,
-                use_pure=True,
-            )
 
-            if connection.is_connected():
-                print("[SUCCESS] Conexión a base de datos establecida exitosamente")
-                return connection
-            else:
-                print("[ERROR] Conexión a base de datos no activa")
-                last_error = "Conexión no activa"
-        except mysql.connector.Error as err:
-            print(f"[ERROR] Error de MySQL con perfil {idx}: {err}")
-            logger.error(f"Error de MySQL con perfil {idx}: {err}")
-            last_error = err
-        except Exception as e:
-            print(f"[ERROR] Error de conexión con perfil {idx}: {e}")
-            logger.error(f"Error de conexión con perfil {idx}: {e}")
-            last_error = e
+# Pool compartido por todas las rutas de la API
+db_pool = DatabasePool(build_db_candidates(db_config), ProductionConfig.POOL_CONFIG)
 
-    # Si todos fallan
-    print(f"[ERROR] No se pudo establecer conexión a la base de datos. Último error: {last_error}")
-    logger.error(f"No se pudo establecer conexión a la base de datos. Último error: {last_error}")
-    return None
+# Función para obtener conexión a la base de datos
+def get_db_connection():
+    """Presta una conexión del pool compartido; al cerrarla regresa al pool"""
+    connection = db_pool.get_connection()
+    if connection is not None:
+        note_db_reachable(True)
+    elif db_pool.is_unavailable():
+        # Todos los perfiles fallaron (no solo un pool agotado): sin conexión
+        note_db_reachable(False)
+    return connection
 
 # Función para crear tabla de historial si no existe
 def create_history_table():
     try:
         connection = get_db_connection()
         if connection:
-            cursor = connection.cursor()
-            print("[INFO] Creando/verificando tabla historial_cambio_material_imd...")
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS historial_cambio_material_imd (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                fecha DATE NOT NULL,
-                hora TIME NOT NULL,
-                line VARCHAR(10) NOT NULL,
-                posicion_de_feeder VARCHAR(50) NOT NULL,
-                qr_almacen VARCHAR(200) NOT NULL,
-                numero_de_parte VARCHAR(100) NOT NULL,
-                spec VARCHAR(100),
-                qr_de_proveedor VARCHAR(200),
-                numero_de_lote_proveedor VARCHAR(100),
-                polaridad VARCHAR(10),
-                persona VARCHAR(100),
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_part_number (numero_de_parte),
-                INDEX idx_fecha (fecha),
-                INDEX idx_line (line),
-                INDEX idx_created_at (created_at)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-            """
-            cursor.execute(create_table_query)
-            connection.commit()
-
-            # Verificar columna 'line' en tablas existentes y agregarla si hace falta
-            column_check_query = """
-            SELECT COUNT(*)
-            FROM information_schema.columns
-            WHERE table_schema = %s
-              AND table_name = 'historial_cambio_material_imd'
-              AND column_name = 'line'
-            """
-            cursor.execute(column_check_query, (connection.database,))
-            has_line_column = cursor.fetchone()[0] > 0
-
-            if not has_line_column:
-                print("[INFO] Agregando columna 'line' a historial_cambio_material_imd existente")
-                cursor.execute(
-                    "ALTER TABLE historial_cambio_material_imd "
-                    "ADD COLUMN line VARCHAR(10) DEFAULT NULL AFTER hora"
-                )
-                cursor.execute(
-                    "ALTER TABLE historial_cambio_material_imd "
-                    "ADD INDEX idx_line (line)"
-                )
+            with connection:
+                cursor = connection.cursor()
+                logger.info("Creando/verificando tabla historial_cambio_material_imd...")
+                create_table_query = """
+                CREATE TABLE IF NOT EXISTS historial_cambio_material_imd (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    fecha DATE NOT NULL,
+                    hora TIME NOT NULL,
+                    line VARCHAR(10) NOT NULL,
+                    posicion_de_feeder VARCHAR(50) NOT NULL,
+                    qr_almacen VARCHAR(200) NOT NULL,
+                    numero_de_parte VARCHAR(100) NOT NULL,
+                    spec VARCHAR(100),
+                    qr_de_proveedor VARCHAR(200),
+                    numero_de_lote_proveedor VARCHAR(100),
+                    polaridad VARCHAR(10),
+                    persona VARCHAR(100),
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    idempotency_key VARCHAR(64) DEFAULT NULL,
+                    INDEX idx_part_number (numero_de_parte),
+                    INDEX idx_fecha (fecha),
+                    INDEX idx_line (line),
+                    INDEX idx_created_at (created_at),
+                    INDEX idx_lote_proveedor (numero_de_lote_proveedor),
+                    INDEX idx_line_position_created (line, posicion_de_feeder, created_at),
+                    UNIQUE INDEX uq_idempotency_key (idempotency_key)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+                """
+                cursor.execute(create_table_query)
                 connection.commit()
 
-            # Verificar que la tabla se creó correctamente
-            verify_query = """
-            SELECT COUNT(*) FROM information_schema.tables
-            WHERE table_schema = %s AND table_name = 'historial_cambio_material_imd'
-            """
-            cursor.execute(verify_query, (connection.database,))
-            table_exists = cursor.fetchone()[0] > 0
+                # Verificar columna 'line' en tablas existentes y agregarla si hace falta
+                column_check_query = """
+                SELECT COUNT(*)
+                FROM information_schema.columns
+                WHERE table_schema = %s
+                  AND table_name = 'historial_cambio_material_imd'
+                  AND column_name = 'line'
+                """
+                cursor.execute(column_check_query, (connection.database,))
+                has_line_column = cursor.fetchone()[0] > 0
+
+                if not has_line_column:
+                    logger.info("Agregando columna 'line' a historial_cambio_material_imd existente")
+                    cursor.execute(
+                        "ALTER TABLE historial_cambio_material_imd "
+                        "ADD COLUMN line VARCHAR(10) DEFAULT NULL AFTER hora"
+                    )
+                    cursor.execute(
+                        "ALTER TABLE historial_cambio_material_imd "
+                        "ADD INDEX idx_line (line)"
+                    )
+                    connection.commit()
+
+                # Verificar columna 'idempotency_key' (evita duplicados al reenviar desde la cola local)
+                column_check_query = """
+                SELECT COUNT(*)
+                FROM information_schema.columns
+                WHERE table_schema = %s
+                  AND table_name = 'historial_cambio_material_imd'
+                  AND column_name = 'idempotency_key'
+                """
+                cursor.execute(column_check_query, (connection.database,))
+                has_idempotency_column = cursor.fetchone()[0] > 0
+
+                if not has_idempotency_column:
+                    logger.info("Agregando columna 'idempotency_key' a historial_cambio_material_imd existente")
+                    cursor.execute(
+                        "ALTER TABLE historial_cambio_material_imd "
+                        "ADD COLUMN idempotency_key VARCHAR(64) DEFAULT NULL"
+                    )
+                    cursor.execute(
+                        "ALTER TABLE historial_cambio_material_imd "
+                        "ADD UNIQUE INDEX uq_idempotency_key (idempotency_key)"
+                    )
+                    connection.commit()
+
+                # Verificar que la tabla se creó correctamente
+                verify_query = """
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = %s AND table_name = 'historial_cambio_material_imd'
+                """
+                cursor.execute(verify_query, (connection.database,))
+                table_exists = cursor.fetchone()[0] > 0
             
-            if table_exists:
-                print("[SUCCESS] Tabla historial_cambio_material_imd verificada exitosamente")
-                logger.info("Tabla de historial creada/verificada exitosamente")
-            else:
-                print("[ERROR] No se pudo verificar la creación de la tabla")
-                logger.error("No se pudo verificar la creación de la tabla")
+                if table_exists:
+                    logger.info("Tabla de historial creada/verificada exitosamente")
+                else:
+                    logger.error("No se pudo verificar la creación de la tabla")
                 
-            cursor.close()
-            connection.close()
-    except mysql.connector.Error as db_error:
-        print(f"[ERROR] Error MySQL creando tabla: {db_error}")
+                cursor.close()
+                return table_exists
+    except mysql_connector.Error as db_error:
         logger.error(f"Error MySQL creando tabla de historial: {db_error}")
     except Exception as e:
-        print(f"[ERROR] Error general creando tabla: {e}")
         logger.error(f"Error creando tabla de historial: {e}")
+    return False
 
-# Ruta principal que sirve la aplicación
-@app.route('/')
-def index():
-    try:
-        # HTML embebido con diseño original restaurado
-        html_content = """<!DOCTYPE html>
-<html lang="es">
-<head>
-  <meta charset="UTF-8" />
-  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
-  <title>IMD Material Control - Desktop App</title>
-  <!-- Bootstrap 5 -->
-  <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH" crossorigin="anonymous">
-  
-  <!-- CSS Embebido -->
-  <style>
-/* Versión Bootstrap de los estilos personalizados (ReferenciaCSS_bootstrap.css)
-   Mantiene la identidad de colores y un tema oscuro ligero sobre Bootstrap 5 */
-
-:root {
-  --axial-primary: #3b82f6;
-  --axial-primary-hover: #2563eb;
-  --radial-primary: #f97316;
-  --radial-primary-hover: #ea580c;
-  --bg-dark: #32323E;
-  --card-dark: #2d2d2d;
-  --border-dark: #404040;
-  /* Tipografía base */
-  --font-base: 'LG EI', 'LG Regular', system-ui,-apple-system,'Segoe UI',Roboto,'Helvetica Neue',Arial,'Noto Sans',sans-serif;
-  /* Escala tipográfica (1rem = 25px) */
-  --fs-2xs: 0.52rem; /* ~13px */
-  --fs-xs: 0.6rem;   /* 15px */
-  --fs-sm: 0.68rem;  /* 17px */
-  --fs-base: 0.75rem;/* 18.75px */
-  --fs-md: 0.85rem;  /* 21.25px */
-  --fs-lg: 0.95rem;  /* 23.75px */
-  --fs-xl: 1.1rem;   /* 27.5px */
-  --fs-2xl: 1.25rem; /* 31.25px */
-}
+# =====================================================================================
+# CACHÉ DE UBICACIONES DE FEEDERS (imd_feeders_location_data)
+# =====================================================================================
 
-html { font-size: 25px; }
-body.app-bg {
-  background: var(--bg-dark);
-  color: #d7d7d7;
-  min-height: 100vh;
-  font-family: var(--font-base);
-  line-height:1.35;
-  padding-top: 6rem;
-}
+class DatabaseUnavailableError(Exception):
+    """No fue posible obtener una conexión a la base de datos"""
 
-.navbar-modern {
-  background: linear-gradient(90deg, rgba(15, 23, 42, 0.95), rgba(30, 41, 59, 0.95));
-  box-shadow: 0 22px 45px rgba(15, 23, 42, 0.45);
-  border-bottom: 1px solid rgba(148, 163, 184, 0.2);
-  backdrop-filter: blur(12px);
-}
 
-.nav-container {
-  display: flex;
-  align-items: center;
-  gap: 1.5rem;
-  flex-wrap: wrap;
-}
+FEEDER_LOCATION_SELECT = """
+SELECT no_part, spec, machine, feeder, polarity, line
+FROM imd_feeders_location_data
+"""
 
-.nav-start {
-  display: flex;
-  align-items: center;
-  gap: 1.25rem;
-  min-width: 0;
-}
+# Consulta heredada: UPPER() sobre las columnas impide usar índices (recorrido completo)
+FEEDER_LOCATION_LEGACY_QUERY = FEEDER_LOCATION_SELECT + """
+WHERE UPPER(no_part) = UPPER(%s) AND UPPER(machine) = %s AND UPPER(line) = %s
+LIMIT 1
+"""
 
-.nav-logo {
-  height: 3.1rem;
-  width: auto;
-  object-fit: contain;
-  filter: drop-shadow(0 6px 12px rgba(15, 23, 42, 0.45));
-}
+# Con collation *_ci la igualdad directa ya es insensible a mayúsculas y usa idx_feeder_lookup
+FEEDER_LOCATION_INDEXED_QUERY = FEEDER_LOCATION_SELECT + """
+WHERE no_part = %s AND machine = %s AND line = %s
+LIMIT 1
+"""
 
-.line-selector-group .form-select {
-  min-width: 11rem;
-  background: rgba(15, 23, 42, 0.85);
-  border: 1px solid rgba(148, 163, 184, 0.35);
-  color: #f8fafc;
-  font-size: var(--fs-sm);
-  font-weight: 600;
-  border-radius: 999px;
-  padding: 0.35rem 2.25rem 0.35rem 1rem;
-  box-shadow: inset 0 1px 0 rgba(255, 255, 255, 0.08);
-}
+FEEDER_LOOKUP_COLUMNS = ('no_part', 'machine', 'line')
+FEEDER_LOOKUP_INDEX = 'idx_feeder_lookup'
 
-.line-selector-group .form-select:focus {
-  border-color: var(--axial-primary);
-  box-shadow: 0 0 0 0.2rem rgba(59, 130, 246, 0.25);
+# Estado de la migración de índices; hasta verificarla se usa la consulta heredada
+feeder_lookup_state = {
+    'indexed': False,
+    'collations': {},
+    'plan': None,
 }
 
-.nav-title h1 {
-  font-size: 1.45rem;
-  letter-spacing: 0.03em;
-  color: #f1f5f9;
-  text-transform: uppercase;
-}
 
-.nav-clock {
-  min-width: 13rem;
-}
+def get_feeder_lookup_query():
+    """Consulta de búsqueda según el resultado de ensure_feeder_location_index()"""
+    if feeder_lookup_state['indexed']:
+        return FEEDER_LOCATION_INDEXED_QUERY
+    return FEEDER_LOCATION_LEGACY_QUERY
 
-.nav-datetime {
-  font-size: var(--fs-sm);
-  font-weight: 600;
-  letter-spacing: 0.08em;
-  color: #e2e8f0;
-  display: inline-block;
-  padding: 0.35rem 1.25rem;
-  border-radius: 999px;
-  border: 1px solid rgba(148, 163, 184, 0.25);
-  background: rgba(15, 23, 42, 0.6);
-  box-shadow: inset 0 1px 0 rgba(255, 255, 255, 0.05);
-}
 
-@media (max-width: 1200px) {
-  .nav-title {
-    order: 3;
-    width: 100%;
-    margin-top: 0.75rem;
-  }
-
-  .nav-clock {
-    order: 2;
-    flex-grow: 1;
-    text-align: right;
-  }
-}
+def explain_feeder_lookup(cursor, key):
+    """Ejecuta EXPLAIN sobre la búsqueda actual y devuelve el plan de la tabla"""
+    cursor.execute("EXPLAIN " + get_feeder_lookup_query(), key)
+    columns = [column[0].lower() for column in cursor.description]
+    row = cursor.fetchone()
+    plan = dict(zip(columns, row)) if row else {}
+    return {
+        'type': plan.get('type'),
+        'key': plan.get('key'),
+        'rows': plan.get('rows'),
+    }
 
-@media (max-width: 768px) {
-  .nav-container {
-    gap: 1rem;
-  }
 
-  .nav-clock {
-    width: 100%;
-    text-align: left;
-  }
+# Función para crear el índice de búsqueda de feeders si no existe
+def ensure_feeder_location_index():
+    try:
+        connection = get_db_connection()
+        if connection:
+            with connection:
+                cursor = connection.cursor(buffered=True)
+                logger.info("Verificando índice de búsqueda en imd_feeders_location_data...")
 
-  .nav-datetime {
-    width: 100%;
-    text-align: center;
-  }
-}
+                index_check_query = """
+                SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index)
+                FROM information_schema.statistics
+                WHERE table_schema = %s AND table_name = 'imd_feeders_location_data'
+                GROUP BY index_name
+                """
+                cursor.execute(index_check_query, (connection.database,))
+                wanted = ','.join(FEEDER_LOOKUP_COLUMNS)
+                has_index = any(
+                    (columns or '').lower().startswith(wanted) for _, columns in cursor.fetchall()
+                )
 
-h1,h2,h3,h4,h5,h6 { color: #fff; font-family: var(--font-base); font-weight:600; }
-
-/* Tarjetas oscuras */
-.card-dark { background: var(--card-dark); border: 1px solid var(--border-dark); }
-.card-dark .card-header { border-bottom: 1px solid var(--border-dark); }
-
-/* Encabezados de máquina */
-.axial-primary { background: var(--axial-primary) !important; color:#fff; }
-.axial-primary.hover-able:hover { background: var(--axial-primary-hover)!important; }
-.radial-primary { background: var(--radial-primary)!important; color:#fff; }
-.radial-primary.hover-able:hover { background: var(--radial-primary-hover)!important; }
-
-/* Etiquetas laterales de los campos de escaneo */
-.scan-pair { display:flex; gap:.5rem; }
-.scan-label { width:7.6rem; min-width:7.6rem; background:#475569; color:#f3f4f6; font-size:var(--fs-xs); border-radius:.45rem; display:flex; align-items:center; padding:0 .9rem; font-weight:600; font-family: var(--font-base); }
-.scan-input { flex:1; height: 1.8rem; }
-.scan-input .form-control { background:#111827; border:1px solid var(--border-dark); color:#fff; font-size: var(--fs-xs); height:1.8rem; padding:.55rem .9rem; font-family: var(--font-base); }
-.scan-input .form-control:focus { border-color: var(--axial-primary); box-shadow:0 0 0 .2rem rgba(59,130,246,.25); }
-.machine-radial .scan-input .form-control:focus { border-color: var(--radial-primary); box-shadow:0 0 0 .2rem rgba(249,115,22,.25); }
-
-/* Bloques de visualización (Polaridad / Resultado) */
-.display-block-title { background:#4b5563; color:#d1d5db; text-align:center; padding: .25rem .45rem .25rem .45rem; border-radius:.375rem .375rem 0 0 ; font-size:var(--fs-xl); font-weight:600; font-family: var(--font-base); }
-.display-block { background:#111827; height: 6.56rem; border-radius: 0 0 .65rem .65rem; display:flex; align-items:center; justify-content:center; position:relative; }
-.display-block .result-ok { position:absolute; right:.75rem; bottom:.55rem; color:#22c55e; font-size:var(--fs-xl); font-weight:700; }
-
-/* Botón CAMBIAR (ampliado) */
-.btn-change { background:#3B7D23; color:#d1d5db; border:1px solid #6b7280; font-weight:600; font-size:var(--fs-xl); padding: .25rem 1.1rem 0.25rem 1.1rem; letter-spacing:.5px; border-radius:.65rem; transition:background .18s ease, transform .15s ease; font-family: var(--font-base); }
-.btn-change:hover { background:#499C2C; color:#fff; transform:translateY(-2px); }
-.btn-change:active { transform:translateY(0); }
-
-/* Utilidades pequeñas */
-.small-title { font-size: var(--fs-xl); font-weight:600; margin-bottom:1rem; font-family: var(--font-base); }
-.spacing-y > * + * { margin-top:.75rem; }
-
-/* Aumento de tamaño de fuente dentro del bloque de datos escaneados */
-.card .row.flex-grow-1 { font-size: var(--fs-xl); }
-/* Ajuste específico de etiquetas e inputs dentro del aumento general */
-.card .row.flex-grow-1 .scan-label { font-size: var(--fs-xs); }
-.card .row.flex-grow-1 .scan-input .form-control { font-size:var(--fs-sm); }
-
-/* Cards de máquina */
-.card-body.d-flex.flex-column { min-height: 20rem;}
-
-/* Responsivo */
-@media (max-width: 576px) {
-  html { font-size:25px; }
-  .scan-label { width:5.6rem; min-width:5.6rem; font-size:var(--fs-2xs); padding:0 .65rem; }
-  .scan-input .form-control { height:1.76rem; font-size:var(--fs-md); }
-  .display-block { height:5.2rem; }
-  .btn-change { font-size:var(--fs-lg); padding:.85rem 1.5rem; }
-}
-::placeholder {
-  color: #9ca3af !important;
-  opacity: .55 !important; /* Mejor legibilidad */
-  font-size: var(--fs-xs);
-  font-family: var(--font-base);
-}
-.font-lg-ei { font-family: var(--font-base) !important; }
-.instructions { font-size: var(--fs-base); font-weight:500; margin: .5rem 0 1rem; color:#e2e8f0; }
+                if not has_index:
+                    logger.info(f"Creando índice {FEEDER_LOOKUP_INDEX} (no_part, machine, line)")
+                    cursor.execute(
+                        "ALTER TABLE imd_feeders_location_data "
+                        f"ADD INDEX {FEEDER_LOOKUP_INDEX} (no_part, machine, line)"
+                    )
+                    connection.commit()
 
-/* Enlace de salto (skip link) */
-.skip-link { position:absolute; left:-999px; top:auto; width:1px; height:1px; overflow:hidden; }
-.skip-link:focus { position:static; width:auto; height:auto; padding:.5rem 1rem; background:#111827; color:#fff; z-index:1000; border:2px solid var(--axial-primary); border-radius:.5rem; }
+                # La igualdad directa solo equivale a UPPER() = UPPER() con collations insensibles a mayúsculas
+                collation_query = """
+                SELECT column_name, collation_name
+                FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = 'imd_feeders_location_data'
+                  AND column_name IN ('no_part', 'machine', 'line')
+                """
+                cursor.execute(collation_query, (connection.database,))
+                collations = {name.lower(): collation for name, collation in cursor.fetchall()}
+                case_insensitive = (
+                    len(collations) == len(FEEDER_LOOKUP_COLUMNS)
+                    and all((collation or '').endswith('_ci') for collation in collations.values())
+                )
+                feeder_lookup_state['collations'] = collations
+                feeder_lookup_state['indexed'] = case_insensitive
 
-/* Focus visible accesible */
-:focus-visible { outline:2px solid var(--radial-primary); outline-offset:2px; }
+                if not case_insensitive:
+                    logger.warning(
+                        f"imd_feeders_location_data sin collation *_ci en {collations}; "
+                        "la búsqueda con UPPER() no puede usar índices"
+                    )
 
-/* Estados ARIA utilitarios */
-[role="status"], [aria-live] { font-family: var(--font-base); }
-.visually-hidden { position:absolute !important; width:1px !important; height:1px !important; padding:0 !important; margin:-1px !important; overflow:hidden !important; clip:rect(0 0 0 0) !important; white-space:nowrap !important; border:0 !important; }
+                # Autoverificación: el plan no debe ser un recorrido completo de la tabla
+                cursor.execute("SELECT no_part, machine, line FROM imd_feeders_location_data LIMIT 1")
+                sample = cursor.fetchone()
+                if sample:
+                    plan = explain_feeder_lookup(cursor, normalize_feeder_key(*sample))
+                    feeder_lookup_state['plan'] = plan
+                    if plan['type'] == 'ALL':
+                        logger.warning(f"La búsqueda en imd_feeders_location_data hace recorrido completo: {plan}")
+                    else:
+                        logger.info(f"Búsqueda de feeders usa índice {plan['key']} ({plan['type']})")
 
-/* Validación de errores - hover rojo para inputs con errores */
-.validation-error:hover {
-  border-color: #ef4444 !important;
-  box-shadow: 0 0 0 .2rem rgba(239, 68, 68, .25) !important;
-}
+                cursor.close()
+                return True
+    except mysql_connector.Error as db_error:
+        logger.error(f"Error MySQL verificando índice de imd_feeders_location_data: {db_error}")
+    except Exception as e:
+        logger.error(f"Error verificando índice de imd_feeders_location_data: {e}")
+    return False
 
-/* Estilos del modal */
-.modal-body {
-  font-size: var(--fs-sm) !important; /* Reducir tamaño de fuente */
-  line-height: 1.4 !important;
-}
 
-.modal-title {
-  font-size: var(--fs-md) !important; /* Reducir tamaño del título */
+# Índices de trazabilidad: lote -> cambios y (línea, posición) -> siguiente cambio
+HISTORY_TRACE_INDEXES = {
+    'idx_lote_proveedor': ('numero_de_lote_proveedor',),
+    'idx_line_position_created': ('line', 'posicion_de_feeder', 'created_at'),
 }
 
-.card-header.axial-primary.text-center.py-3 {margin-bottom: 0; font-weight: 600; max-height: 3rem;}
-.card-header.radial-primary.text-center.py-3 {margin-bottom: 0; font-weight: 600; max-height: 3rem;}
-  </style>
-</head>
-<body class="app-bg">
-  <!-- Navbar Principal -->
-  <header class="mb-4">
-    <div class="container-fluid">
-    <nav class="navbar navbar-expand-lg navbar-dark bg-dark py-3 fixed-top">
-        <div class="container-fluid d-flex align-items-center">
-          <!-- Logo -->
-          <div class="navbar-brand me-4">
-            <img src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAPsAAADJCAYAAADlwEQAAAAAAXNSR0IArs4c6QAAIABJREFUeF7svQm8XVV1P/4983znN2UOhDFMihWntrFSmWRQmzoVRaU4VBEtP2v7q5pqW+vQqqCiaJUKFDWtCigoWOSnIlqbgoEwZs5L3nznc898zv+/9rk3776Xl5eX5AVeIocPn5t37zn77LPP+u619trrfReH547nRuC5EfidGAHud+Ipn3vI50bguRHAc2B/ZoWAw7p16ZivW5fQx5p1a4SeTT3s393H2Ooxdt796+6PDrOL+7Td3d6adWvE2dq/f9394QHu35GhWe8zSxt0/aFee5hD87t1+XNgn6f3TaDRJjShKpp8rIkZRVB6x+r1vFI0X9Zo2TleU0p1x+4NuCQXIFFERRKSIE6EJPL5ZF9hZwhIwImiQGDsvKe9n1wKDy5JEKb/5riEZ7Bp/0mXA4IoigmXth93P2sCjk5HwoGPuXa7U86guyaiKEppT9pzDtduvt3nhEvSa+lSarDrk+PBRUEY0RlcgiSmduKEGmMXJQkSVVAetmR1KGi6T6i88ojiOINK1miNbbLjntVj8Rwmm3l6g8d+M8+B/RDe8Elvu8RCqQQ7aISGLqyOESwXJenMKI6fH3HcKXW7sTjmoXiIEfMcZF1F07WhmDr8OEKUxIjjCAgjyKLURufUjnRwI/IMkvscBLmIAxIhQcxNBWnnCnZOFO1tn2/rz70vnWYHXpicBKa1M3nT7an3otL0r/pQT/kUeWHK34iTvX/TbKJJFurlGiRegus4yGpm1VC1jQon/lbkuG3w3e/qkmJb25Xm/Tfd5D1nBRyCwLYveQ7scxy7c977pkyD83O+xp1iLeq5aKxZu3S4MrosjD2gUYfa0wtO5KFpOgRJQK3RgGGZCOMIsq6hXC4DEg03jyTyAVGGIHCI/GCKETsd2qQHu4+2Rk+VKR+nKGMg5UG6c8onwZgTwbe/5xCDZ+o/BpkBBE5BUWcFexiSFT9N4zNDoW19xyGoXSQ8OJpNqH3qT/uT5jT6m4Mw5Xv2O3hIvAy34cHMZeG6LpucBEFgt6RHC0Yn0NuzyNdj/hd6kNxuJfzdTYPfsWnden+Or+65054D+/5lYM0Va9Sa1WPFGU0OuejFtaD1svFG9TyXi5fzhqoploGQi8AJQJhE0DQFjuNBYLYqhzgJQRosDgLwkoQ4apvACV0jgZS1JCkAn8ANZpdZJvgEixlXtTyCiMCemuPprDH1U+JpFbDv952VQRDNviTn2f2n33zSVucSerapNnxq6bcnFRqkmWz88AzMURBA4CVA4MHLEnuMGAkCNyCzBJwgwpI0wAtgj5bB256nJfzWklW4O6dn7xWEZJPnSeWNn7m59ZzWn31ee06zd8Zn3Tp+De7nh1o9x/OKeOmY27hwvFY9QS9lFvmkESURgywwcEq6ijiOkZC08gkTWMQxRFVFaLcgKipZx0jCCKQZkyhGNptlWosO3/fZv6MwgGJmuszafV8W3YeBfT/vkSeN2V42z/aq93dKFCWp3t6PCS+KHf/dzD60mcC+P3B3vk/YBJFOBkkQQlVVtHwPsqYiimPmhIi8kC3q6dk4XoAuypATHrHjgw9jJH6IJOFQazi7S7nCLyxeuTWxnZ+vyFWb5PBcv3794To2jzmL4Hca7ORUGxvtUaMiTkoE4dJG4L6+EXonhCKHSCRLlGMgZ3CIYmZeEnAJrLqqIUYEDwTaMNXgjgPZMNhEQAc7n9xRHMf+p2/pt5C0KU0QBH5JnRSqjp+MgS99NRLNGvs56AyOfAChD0mSEAQBZFlm92RmfhyD53n2G/3b8zz2c91fsN8dz4UoqzuP3sGNYNvcNG1Zy6Zqr8GENmzWfgfNGvs5gP3sV7q/d9Ke9HjY6t6dF9HfjudClNX9vWKjzPQ5AOxP4xU8FhC+s6a8w2ePd9FzhHj7X/s9B4wdNOIyKz6T5sHBgzzbPZ49Hgg3x+DZa/g5rO1rnD9XM+9cxo7H9hq5nSsjPZdb++d8BI6+N44rwc8xxvb//Wd6Zj5aNcfbPRdsOx1Xvu9w1Jb5fy29vgZnz7c7tn9eNEGRYoNNPr5zLLc3mHfbP3OsF/dYO5vjWPCYfOxrfOZcwb5t8hyGFdJMN6I7a4i8A/j3OGTGdZyJzz/3rk+7jrf4+lzOsLGcwdvfY41HPF5g7+FxOdZJ6NlteDbB99xdp6w11+8aL3vTkUZGDu9x5Hv2Y5k/n81zztRrWPP8H3vsOGz85GRH74nOdRacsOYm++g5fOys2PPeM5gPd/T3Og8j3nfsPhAO+7yHXfkZPIpWuZ7qNJ8WBfAOZuKz8G7pPNSPJLQ2Pj39vR3G8Z6zw22fZsW5c56Hz/asfaOGl0bwUfuPa5RzYD9kJptJ+CjNhqFTWP6dvcN/EyaYr+w/76e1LM4d3h2fzfHu2cGsZw2zPvsb0Wdqg/4gR7c7jnKq8xnP2k9s/fNedITzg+YV4/uxzZJHN+mctbfxYL+Z7Y8N7M/ufO2ZE7wT1pUe+M2rPnTkz5n/nPtuOGPh4V73XGvnYNYPOQxo2RjMOnZnXOQMj/jP8aOeP1O2/eFmfDJdZa3k8qCL0D9B1vWLJzKZHnLcgfA7aEp5xk7l6fMuOv96w63a/r7e4d9yPG6y/qP//rn3fwY19OfBPLezHTJE/3Z/f3v6l9XJxqm/efcq9e9+bfpLJzJ2/jZy9QOv/fY3/97E79dn8vB7/mW1zQdt3fZQz/iT5/0/57I8bfaNh/V/LrzlzMdN74Uf9Y1LNJFJzWk8h3hMhxtH7cfXW5c//kMT7P65Q7uOjWKp1qhC/kOoXzLjFP/i0EYW9vU1GlP6qpLtAe+L9hse2rDPG7cf9sNyV5b4jfsOp5EgJ8LFV936r8/3vqtN8IwvPO/bm7aGf3v39VK+q5rvs96n+8W3vrrnYQe9KLjPLczd/f7HKz/43hX/rY7/0mWxoVqnB0m4Ov+pS5/d8y/58/eL9/1w3xdeLK6vRkGQFH3f+GfXbOrzXTqHlW5f6XdfdfdTtbw1u65ZN9UfP2r/8aK+efttZe3Q1u9/8WfvKxr6/7fkF98ef6JaJCf46v0HDOc8PxYi4gF/v7K3be67JvU7et9dz15wgZ/96IvbNm0y96w3+jdvP0yJZs58X4mTfW3vB7//xT/dL7fMo/8D3hPl9cuvQJcAAAAASUVORK5CYII=" 
-                 alt="IMD Logo" 
-                 height="50" 
-                 class="me-3">
-          </div>
-          
-          <!-- Título Centrado -->
-          <div class="flex-grow-1 text-center">
-            <h1 class="navbar-text mb-0 fw-bold" style="font-size: 1.5rem; color: white;">
-              Control de cambios de material IMD
-            </h1>
-          </div>
-          
-          <!-- Selector de Línea -->
-          <div class="navbar-nav ms-auto">
-            <select class="form-select bg-secondary text-white" id="line-selector" style="min-width: 150px;">
-              <option value="">Seleccione línea...</option>
-              <option value="PANA_A">PANA_A</option>
-              <option value="PANA_B">PANA_B</option>
-              <option value="PANA_C">PANA_C</option>
-              <option value="PANA_D">PANA_D</option>
-            </select>
-          </div>
-        </div>
-      </nav>
-    </div>
+
+# Función para crear los índices de trazabilidad en tablas de historial existentes
+def ensure_history_trace_indexes():
+    try:
+        connection = get_db_connection()
+        if connection:
+            with connection:
+                cursor = connection.cursor(buffered=True)
+                cursor.execute("""
+                SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index)
+                FROM information_schema.statistics
+                WHERE table_schema = %s AND table_name = 'historial_cambio_material_imd'
+                GROUP BY index_name
+                """, (connection.database,))
+                existing = [(columns or '').lower() for _, columns in cursor.fetchall()]
+                missing = [
+                    (name, columns) for name, columns in HISTORY_TRACE_INDEXES.items()
+                    if not any(found.startswith(','.join(columns)) for found in existing)
+                ]
+
+                if missing:
+                    logger.info(f"Creando índices de trazabilidad: {', '.join(name for name, _ in missing)}")
+                    # DDL en línea: la tabla sigue aceptando inserciones mientras se construyen
+                    cursor.execute(
+                        "ALTER TABLE historial_cambio_material_imd "
+                        + ', '.join(f"ADD INDEX {name} ({', '.join(columns)})" for name, columns in missing)
+                        + ", ALGORITHM=INPLACE, LOCK=NONE"
+                    )
+                    connection.commit()
+
+                cursor.close()
+                return True
+    except mysql_connector.Error as db_error:
+        logger.error(f"Error MySQL creando índices de trazabilidad: {db_error}")
+    except Exception as e:
+        logger.error(f"Error creando índices de trazabilidad: {e}")
+    return False
+
+
+FEEDER_STATE_COLUMNS = (
+    'line', 'posicion_de_feeder', 'history_id', 'numero_de_parte', 'numero_de_lote_proveedor',
+    'qr_almacen', 'polaridad', 'persona', 'changed_at'
+)
+
+# Un registro sincronizado tarde (cola local) no reemplaza a uno más reciente de la misma posición;
+# changed_at se asigna al final porque MySQL evalúa las asignaciones en orden
+FEEDER_STATE_ON_DUPLICATE = "\nON DUPLICATE KEY UPDATE\n" + ',\n'.join(
+    f"{column} = IF(VALUES(changed_at) >= changed_at, VALUES({column}), {column})"
+    for column in FEEDER_STATE_COLUMNS[2:-1]
+) + ",\nchanged_at = GREATEST(changed_at, VALUES(changed_at))"
+
+FEEDER_STATE_UPSERT_QUERY = f"""
+INSERT INTO imd_feeder_current_state ({', '.join(FEEDER_STATE_COLUMNS)})
+VALUES ({', '.join(['%s'] * len(FEEDER_STATE_COLUMNS))})""" + FEEDER_STATE_ON_DUPLICATE
+
+
+# Función para crear la tabla de estado actual de feeders (vista materializada del historial)
+def create_feeder_state_table():
+    try:
+        connection = get_db_connection()
+        if connection:
+            with connection:
+                cursor = connection.cursor(buffered=True)
+                logger.info("Creando/verificando tabla imd_feeder_current_state...")
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS imd_feeder_current_state (
+                    line VARCHAR(10) NOT NULL,
+                    posicion_de_feeder VARCHAR(50) NOT NULL,
+                    history_id INT DEFAULT NULL,
+                    numero_de_parte VARCHAR(100) NOT NULL,
+                    numero_de_lote_proveedor VARCHAR(100),
+                    qr_almacen VARCHAR(200),
+                    polaridad VARCHAR(10),
+                    persona VARCHAR(100),
+                    changed_at DATETIME NOT NULL,
+                    PRIMARY KEY (line, posicion_de_feeder)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+                """)
+                connection.commit()
+
+                cursor.execute("SELECT COUNT(*) FROM imd_feeder_current_state")
+                if cursor.fetchone()[0] == 0:
+                    # Carga inicial única: último cambio por (línea, posición) usando idx_line_position_created;
+                    # si dos cambios empatan en created_at se conserva el de mayor id
+                    logger.info("Llenando imd_feeder_current_state desde el historial...")
+                    cursor.execute(
+                        """
+                        INSERT IGNORE INTO imd_feeder_current_state
+                        (line, posicion_de_feeder, history_id, numero_de_parte, numero_de_lote_proveedor, qr_almacen,
+                         polaridad, persona, changed_at)
+                        SELECT h.line, h.posicion_de_feeder, h.id, h.numero_de_parte, h.numero_de_lote_proveedor,
+                               h.qr_almacen, h.polaridad, h.persona, h.created_at
+                        FROM historial_cambio_material_imd h
+                        JOIN (
+                            SELECT line, posicion_de_feeder, MAX(created_at) AS created_at
+                            FROM historial_cambio_material_imd
+                            WHERE line IS NOT NULL
+                            GROUP BY line, posicion_de_feeder
+                        ) latest
+                          ON latest.line = h.line AND latest.posicion_de_feeder = h.posicion_de_feeder
+                         AND latest.created_at = h.created_at
+                        ORDER BY h.id DESC
+                        """
+                    )
+                    connection.commit()
+                    logger.info(f"imd_feeder_current_state: {cursor.rowcount} posiciones iniciales")
+
+                cursor.close()
+                return True
+    except mysql_connector.Error as db_error:
+        logger.error(f"Error MySQL creando tabla de estado de feeders: {db_error}")
+    except Exception as e:
+        logger.error(f"Error creando tabla de estado de feeders: {e}")
+    return False
+
+
+def feeder_state_values(record, history_id):
+    """Tupla para FEEDER_STATE_UPSERT_QUERY a partir de un registro de la cola"""
+    return (
+        record['line'], record['posicion_de_feeder'], history_id, record['numero_de_parte'],
+        record['numero_de_lote_proveedor'], record['qr_almacen'], record['polaridad'], record['persona'],
+        datetime.fromisoformat(record['created_at']),
+    )
+
+
+def normalize_feeder_key(part_number, machine, line):
+    """Llave normalizada (parte, máquina, línea) usada por la caché"""
+    return (
+        (part_number or '').strip().upper(),
+        (machine or '').strip().upper(),
+        (line or '').strip().upper(),
+    )
+
+
+def feeder_row_to_dict(row):
+    """Convierte una fila de FEEDER_LOCATION_SELECT en diccionario"""
+    no_part, spec, machine, feeder, polarity, line = row
+    return {
+        'no_part': no_part,
+        'spec': spec,
+        'machine': machine,
+        'feeder': feeder,
+        'polarity': polarity,
+        'line': line,
+    }
+
+
+class FeederReplica:
+    """Réplica local en SQLite de imd_feeders_location_data para operar sin conexión"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.path = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self.path = os.path.join(ProductionConfig.get_app_data_dir(), self.file_name)
+        db = sqlite3.connect(self.path, isolation_level=None)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS feeders (
+                part_key TEXT NOT NULL,
+                machine_key TEXT NOT NULL,
+                line_key TEXT NOT NULL,
+                no_part TEXT,
+                spec TEXT,
+                machine TEXT,
+                feeder TEXT,
+                polarity TEXT,
+                line TEXT,
+                PRIMARY KEY (part_key, machine_key, line_key)
+            )
+        """)
+        db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        return db
+
+    def save(self, entries, fingerprint, synced_at):
+        """Reemplaza el contenido de la réplica por la copia recién leída de MySQL"""
+        with self._lock:
+            db = self._connect()
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("DELETE FROM feeders")
+                db.executemany(
+                    "INSERT INTO feeders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, row['no_part'], row['spec'], row['machine'],
+                         None if row['feeder'] is None else str(row['feeder']), row['polarity'], row['line'])
+                        for key, row in entries.items()
+                    ]
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    [('fingerprint', json.dumps(fingerprint)), ('synced_at', str(synced_at))]
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            finally:
+                db.close()
+
+    def touch(self, synced_at):
+        """Registra que la réplica sigue vigente aunque la tabla no cambió"""
+        with self._lock:
+            db = self._connect()
+            try:
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('synced_at', ?)", (str(synced_at),))
+            finally:
+                db.close()
+
+    def load(self):
+        """Devuelve (entradas, huella, synced_at) o None si no hay réplica"""
+        with self._lock:
+            db = self._connect()
+            try:
+                meta = dict(db.execute("SELECT name, value FROM meta").fetchall())
+                if 'synced_at' not in meta:
+                    return None
+                entries = {}
+                for part_key, machine_key, line_key, *row in db.execute("SELECT * FROM feeders"):
+                    entries[(part_key, machine_key, line_key)] = dict(zip(
+                        ('no_part', 'spec', 'machine', 'feeder', 'polarity', 'line'), row
+                    ))
+            finally:
+                db.close()
+        return entries, json.loads(meta.get('fingerprint', 'null')), float(meta['synced_at'])
+
+
+class FeederLocationCache:
+    """Copia en memoria de imd_feeders_location_data con refresco periódico en segundo plano"""
+
+    def __init__(self, refresh_interval, replica=None):
+        self.refresh_interval = refresh_interval
+        self.replica = replica
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.loaded_at = None
+        self.synced_at = None  # Última lectura exitosa desde MySQL
+        self.source = None     # 'database' o 'replica'
+        self.fingerprint = None
+        self.version = 0
+        self.instance = uuid.uuid4().hex[:8]  # Evita reutilizar ETags de otra ejecución
+        self._listeners = []
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'db_lookups': 0,
+            'refreshes': 0,
+            'refresh_skipped': 0,
+            'refresh_errors': 0,
+        }
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def get(self, key):
+        with self._lock:
+            row = self._entries.get(key)
+            self.counters['hits' if row is not None else 'misses'] += 1
+            return row
+
+    def put(self, key, row):
+        with self._lock:
+            if self._entries.get(key) != row:
+                # Fila nueva desde MySQL: invalida respuestas "no encontrado" ya cacheadas
+                self.version += 1
+            self._entries[key] = row
+
+    def add_listener(self, callback):
+        """callback(stats) cuando un refresco cambia el contenido o el origen ('database'/'replica')"""
+        self._listeners.append(callback)
+
+    def _notify_if_changed(self, version, source):
+        if (version, source) == (self.version, self.source):
+            return
+        stats = self.stats()
+        for callback in self._listeners:
+            try:
+                callback(stats)
+            except Exception as e:
+                logger.error(f"Error notificando refresco de la caché de feeders: {e}")
+
+    def etag(self):
+        """ETag de las consultas de solo lectura; None mientras la caché no esté en uso"""
+        if not (ProductionConfig.FEEDER_CACHE_CONFIG['enabled'] and self.is_loaded):
+            return None
+        return f"feeders-{self.instance}-{self.version}"
+
+    def _table_fingerprint(self, cursor):
+        cursor.execute("CHECKSUM TABLE imd_feeders_location_data")
+        result = cursor.fetchone()
+        return result[1] if result else None
+
+    def load(self):
+        """Carga (o refresca) la tabla completa; solo aplica cambios si la huella de la tabla cambió"""
+        connection = get_db_connection()
+        if not connection:
+            self.counters['refresh_errors'] += 1
+            return False
+        version, source = self.version, self.source
+        try:
+            cursor = connection.cursor(buffered=True)
+            fingerprint = self._table_fingerprint(cursor)
+            if self.is_loaded and fingerprint is not None and fingerprint == self.fingerprint:
+                self.counters['refresh_skipped'] += 1
+                self.loaded_at = self.synced_at = time.time()
+                self.source = 'database'
+                cursor.close()
+                self._touch_replica()
+                self._notify_if_changed(version, source)
+                return True
+
+            cursor.execute(FEEDER_LOCATION_SELECT)
+            entries = {}
+            for row in cursor.fetchall():
+                data = feeder_row_to_dict(row)
+                # Igual que LIMIT 1: se conserva la primera fila de cada llave
+                entries.setdefault(normalize_feeder_key(data['no_part'], data['machine'], data['line']), data)
+            cursor.close()
+        except mysql_connector.Error as db_error:
+            logger.error(f"Error MySQL cargando caché de feeders: {db_error}")
+            self.counters['refresh_errors'] += 1
+            connection.invalidate()
+            return False
+        finally:
+            connection.close()
+
+        with self._lock:
+            previous = self._entries
+            added = len(entries.keys() - previous.keys())
+            removed = len(previous.keys() - entries.keys())
+            changed = sum(1 for key in entries.keys() & previous.keys() if entries[key] != previous[key])
+            self._entries = entries
+            self.fingerprint = fingerprint
+            self.loaded_at = self.synced_at = time.time()
+            self.source = 'database'
+            if added or removed or changed:
+                self.version += 1
+            self.counters['refreshes'] += 1
+
+        self._save_replica(entries)
+
+        logger.info(f"Caché de feeders cargada: {len(entries)} registros (+{added} -{removed} ~{changed})")
+        self._notify_if_changed(version, source)
+        return True
+
+    def _save_replica(self, entries):
+        if self.replica is None:
+            return
+        try:
+            self.replica.save(entries, self.fingerprint, self.synced_at)
+        except Exception as e:
+            logger.error(f"Error guardando réplica local de feeders: {e}")
+
+    def _touch_replica(self):
+        if self.replica is None:
+            return
+        try:
+            self.replica.touch(self.synced_at)
+        except Exception as e:
+            logger.error(f"Error actualizando réplica local de feeders: {e}")
+
+    def load_from_replica(self):
+        """Carga la última réplica local cuando MySQL no está disponible"""
+        if self.replica is None:
+            return False
+        try:
+            snapshot = self.replica.load()
+        except Exception as e:
+            logger.error(f"Error leyendo réplica local de feeders: {e}")
+            return False
+        if snapshot is None:
+            logger.warning("No existe réplica local de feeders")
+            return False
+
+        entries, fingerprint, synced_at = snapshot
+        version, source = self.version, self.source
+        with self._lock:
+            self._entries = entries
+            self.fingerprint = fingerprint
+            self.synced_at = synced_at
+            self.loaded_at = time.time()
+            self.source = 'replica'
+            self.version += 1
+
+        age_minutes = (time.time() - synced_at) / 60
+        logger.warning(f"Usando réplica local de feeders: {len(entries)} registros de hace {age_minutes:.0f} min")
+        self._notify_if_changed(version, source)
+        return True
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.load()
+            except Exception as e:
+                self.counters['refresh_errors'] += 1
+                logger.error(f"Error refrescando caché de feeders: {e}")
+
+    def start_refresher(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._refresh_loop,
+                daemon=True,
+                name="FeederCacheRefresher"
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            'entries': size,
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).isoformat() if self.loaded_at else None,
+            'synced_at': datetime.fromtimestamp(self.synced_at).isoformat() if self.synced_at else None,
+            'age_seconds': round(time.time() - self.synced_at) if self.synced_at else None,
+            'hit_ratio': round(self.counters['hits'] / lookups, 4) if lookups else None,
+            **self.counters,
+        }
+
+
+feeder_cache = FeederLocationCache(
+    ProductionConfig.FEEDER_CACHE_CONFIG['refresh_interval'],
+    FeederReplica(ProductionConfig.FEEDER_CACHE_CONFIG['replica_file'])
+)
+
+
+def lookup_feeder_location(part_number, machine, line):
+    """Busca la configuración de feeder para (parte, máquina, línea): primero en caché y luego en BD"""
+    key = normalize_feeder_key(part_number, machine, line)
+    if ProductionConfig.FEEDER_CACHE_CONFIG['enabled']:
+        row = feeder_cache.get(key)
+        if row is not None:
+            return row
+
+    # Durante una caída la última copia completa (o la réplica local) sigue siendo la referencia
+    if feeder_cache.is_loaded and db_pool.is_unavailable():
+        return None
+
+    connection = get_db_connection()
+    if not connection:
+        if feeder_cache.is_loaded:
+            return None
+        raise DatabaseUnavailableError('Error de conexión a base de datos')
+
+    with connection:
+        cursor = connection.cursor(buffered=True)
+        cursor.execute(get_feeder_lookup_query(), key)
+        result = cursor.fetchone()
+        cursor.close()
+    feeder_cache.counters['db_lookups'] += 1
+
+    if not result:
+        return None
+    row = feeder_row_to_dict(result)
+    feeder_cache.put(key, row)
+    return row
+
+
+# =====================================================================================
+# MIGRACIONES DE ESQUEMA (una sola vez al iniciar)
+# =====================================================================================
+
+ER_NO_SUCH_TABLE = 1146
+
+# Pasos de migración en orden; cada uno devuelve True si el esquema quedó listo
+SCHEMA_MIGRATIONS = [
+    ('historial_cambio_material_imd', create_history_table),
+    ('idx_feeder_lookup', ensure_feeder_location_index),
+    ('idx_history_trace', ensure_history_trace_indexes),
+    ('imd_feeder_current_state', create_feeder_state_table),
+]
+
+# Estado en caché: la ruta de escritura no vuelve a consultar information_schema
+schema_state = {
+    'ready': False,
+    'applied': {},
+    'failed': [],
+}
+_schema_lock = threading.Lock()
+
+
+def run_schema_migrations(names=None):
+    """Ejecuta los pasos pendientes del registro (o solo los indicados) y actualiza schema_state"""
+    with _schema_lock:
+        failed = [name for name in schema_state['failed'] if names is not None and name not in names]
+        for name, migration in SCHEMA_MIGRATIONS:
+            if name in schema_state['applied'] or (names is not None and name not in names):
+                continue
+            if migration():
+                schema_state['applied'][name] = datetime.now().isoformat()
+            else:
+                failed.append(name)
+        schema_state['failed'] = failed
+        schema_state['ready'] = all(name in schema_state['applied'] for name, _ in SCHEMA_MIGRATIONS)
+        return schema_state['ready']
+
+
+def invalidate_schema_migration(name):
+    """Marca un paso para volver a ejecutarse (p. ej. la tabla fue eliminada)"""
+    with _schema_lock:
+        schema_state['applied'].pop(name, None)
+        schema_state['ready'] = False
+
+
+# =====================================================================================
+# COLA LOCAL DE ESCRITURA DIFERIDA DEL HISTORIAL
+# =====================================================================================
+
+HISTORY_FIELDS = (
+    'line', 'posicion_de_feeder', 'qr_almacen', 'numero_de_parte', 'spec',
+    'qr_de_proveedor', 'numero_de_lote_proveedor', 'polaridad', 'persona'
+)
+
+HISTORY_INSERT_QUERY = """
+INSERT INTO historial_cambio_material_imd
+(fecha, hora, line, posicion_de_feeder, qr_almacen, numero_de_parte, spec, qr_de_proveedor,
+ numero_de_lote_proveedor, polaridad, persona, created_at, idempotency_key)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+"""
+
+
+def history_insert_values(record, idempotency_key):
+    """Tupla de valores para HISTORY_INSERT_QUERY a partir de un registro de la cola"""
+    created_at = datetime.fromisoformat(record['created_at'])
+    return (
+        created_at.date(),
+        created_at.time(),
+        record['line'],
+        record['posicion_de_feeder'],
+        record['qr_almacen'],
+        record['numero_de_parte'],
+        record.get('spec', ''),
+        record['qr_de_proveedor'],
+        record['numero_de_lote_proveedor'],
+        record['polaridad'],
+        record['persona'],
+        created_at,
+        idempotency_key,
+    )
+
+
+class HistorySpool:
+    """Diario SQLite local: los cambios se confirman al guardarse aquí y un hilo los envía a MySQL"""
+
+    def __init__(self, config):
+        self.config = config
+        self.path = None
+        self._db = None
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._consecutive_failures = 0
+        self._listeners = []
+        self.last_sync_at = None
+        self.last_error = None
+        self.batch_metrics = {
+            'batches': 0,
+            'records': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'commit_ms_total': 0.0,
+            'commit_ms_last': 0.0,
+            'commit_ms_max': 0.0,
+        }
+
+    def open(self):
+        if self._db is not None:
+            return
+        self.path = os.path.join(ProductionConfig.get_app_data_dir(), self.config['file_name'])
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS history_spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                remote_id INTEGER,
+                created_at TEXT NOT NULL,
+                synced_at TEXT
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_spool_status ON history_spool (status, id)")
+        self._db = db
+
+    def add_listener(self, callback):
+        """callback(evento, [(llave, registro, id remoto)]) para 'enqueued' (id None) y 'synced'"""
+        self._listeners.append(callback)
+
+    def _notify(self, event, items):
+        for callback in self._listeners:
+            try:
+                callback(event, items)
+            except Exception as e:
+                logger.error(f"Error notificando '{event}' de historial: {e}")
+
+    def enqueue(self, record, idempotency_key=None):
+        """Guarda el registro de forma durable; devuelve (id local, llave, ya_existía)"""
+        return self.enqueue_many([(record, idempotency_key)])[0]
+
+    def enqueue_many(self, items):
+        """Guarda varios (registro, llave) en una sola transacción local"""
+        self.open()
+        results = []
+        added = []
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for record, idempotency_key in items:
+                    idempotency_key = idempotency_key or uuid.uuid4().hex
+                    existing = self._db.execute(
+                        "SELECT id FROM history_spool WHERE idempotency_key = ?", (idempotency_key,)
+                    ).fetchone()
+                    if existing:
+                        results.append((existing[0], idempotency_key, True))
+                        continue
+                    cursor = self._db.execute(
+                        "INSERT INTO history_spool (idempotency_key, payload, created_at) VALUES (?, ?, ?)",
+                        (idempotency_key, json.dumps(record, ensure_ascii=False), record['created_at'])
+                    )
+                    results.append((cursor.lastrowid, idempotency_key, False))
+                    added.append((idempotency_key, record, None))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        self._wake_event.set()
+        if added:
+            self._notify('enqueued', added)
+        return results
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM history_spool WHERE status = 'pending'").fetchone()[0]
+
+    def pending(self, limit):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, idempotency_key, payload FROM history_spool "
+                "WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(local_id, key, json.loads(payload)) for local_id, key, payload in rows]
+
+    def mark_synced(self, synced):
+        """Marca como sincronizados los pares (id local, id remoto)"""
+        synced_at = datetime.now().isoformat(sep=' ')
+        with self._lock:
+            self._db.executemany(
+                "UPDATE history_spool SET status = 'synced', remote_id = ?, synced_at = ?, last_error = NULL "
+                "WHERE id = ?", [(remote_id, synced_at, local_id) for local_id, remote_id in synced]
+            )
+
+    def mark_failed(self, local_id, error, permanent=False):
+        with self._lock:
+            self._db.execute(
+                "UPDATE history_spool SET attempts = attempts + 1, last_error = ?, status = ? WHERE id = ?",
+                (str(error), 'rejected' if permanent else 'pending', local_id)
+            )
+
+    def purge_synced(self):
+        cutoff = (datetime.now() - timedelta(days=self.config['retention_days'])).isoformat(sep=' ')
+        with self._lock:
+            self._db.execute("DELETE FROM history_spool WHERE status = 'synced' AND synced_at < ?", (cutoff,))
+
+    def record_status(self, local_id):
+        self.open()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, idempotency_key, status, attempts, last_error, remote_id, created_at, synced_at "
+                "FROM history_spool WHERE id = ?", (local_id,)
+            ).fetchone()
+        if not row:
+            return None
+        keys = ('local_record_id', 'idempotency_key', 'status', 'attempts', 'last_error',
+                'remote_id', 'created_at', 'synced_at')
+        return dict(zip(keys, row))
+
+    def status(self):
+        self.open()
+        with self._lock:
+            counts = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM history_spool GROUP BY status"
+            ).fetchall())
+            oldest = self._db.execute(
+                "SELECT MIN(created_at) FROM history_spool WHERE status = 'pending'"
+            ).fetchone()[0]
+        return {
+            'pending': counts.get('pending', 0),
+            'synced': counts.get('synced', 0),
+            'rejected': counts.get('rejected', 0),
+            'oldest_pending_at': oldest,
+            'last_sync_at': self.last_sync_at,
+            'last_error': self.last_error,
+            'consecutive_failures': self._consecutive_failures,
+            'worker_alive': self._thread is not None and self._thread.is_alive(),
+            'batches': self.batch_stats(),
+        }
+
+    def batch_stats(self):
+        metrics = dict(self.batch_metrics)
+        batches = metrics['batches']
+        metrics['avg_batch_size'] = round(metrics['records'] / batches, 2) if batches else 0
+        metrics['commit_ms_avg'] = round(metrics['commit_ms_total'] / batches, 2) if batches else 0
+        return metrics
+
+    def _record_batch(self, size, elapsed_ms):
+        metrics = self.batch_metrics
+        metrics['batches'] += 1
+        metrics['records'] += size
+        metrics['last_batch_size'] = size
+        metrics['max_batch_size'] = max(metrics['max_batch_size'], size)
+        metrics['commit_ms_total'] += elapsed_ms
+        metrics['commit_ms_last'] = round(elapsed_ms, 2)
+        metrics['commit_ms_max'] = round(max(metrics['commit_ms_max'], elapsed_ms), 2)
+
+    def _insert_batch(self, connection, batch):
+        """INSERT multi-fila del lote y del estado actual de feeders en una transacción; devuelve [(id local, id remoto)]"""
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        connection.start_transaction()
+        try:
+            cursor.executemany(
+                HISTORY_INSERT_QUERY,
+                [history_insert_values(record, key) for _, key, record in batch]
+            )
+            # Un INSERT multi-fila solo reporta un lastrowid: se recuperan los IDs por llave única
+            keys = [key for _, key, _ in batch]
+            cursor.execute(
+                "SELECT idempotency_key, id FROM historial_cambio_material_imd "
+                f"WHERE idempotency_key IN ({', '.join(['%s'] * len(keys))})",
+                keys
+            )
+            remote_ids = dict(cursor.fetchall())
+            cursor.executemany(
+                FEEDER_STATE_UPSERT_QUERY,
+                [feeder_state_values(record, remote_ids.get(key)) for _, key, record in batch]
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+        self._record_batch(len(batch), (time.perf_counter() - started) * 1000)
+        return [(local_id, remote_ids.get(key)) for local_id, key, _ in batch]
+
+    def _insert_batch_recovering(self, connection, batch):
+        """Inserta el lote; si la tabla no existe (error 1146) la recrea una vez y reintenta"""
+        try:
+            return self._insert_batch(connection, batch)
+        except mysql_connector.ProgrammingError as db_error:
+            if db_error.errno != ER_NO_SUCH_TABLE:
+                raise
+            logger.info("Tabla de historial o de estado de feeders no existe, creándola...")
+            tables = ['historial_cambio_material_imd', 'imd_feeder_current_state']
+            for name in tables:
+                invalidate_schema_migration(name)
+            run_schema_migrations(tables)
+            return self._insert_batch(connection, batch)
+
+    def _insert_one_by_one(self, connection, batch):
+        """Aísla el registro con datos inválidos cuando el lote completo fue rechazado"""
+        synced = []
+        cursor = connection.cursor()
+        for local_id, idempotency_key, record in batch:
+            # Historial y estado actual juntos: la conexión del pool está en autocommit
+            connection.start_transaction()
+            try:
+                cursor.execute(HISTORY_INSERT_QUERY, history_insert_values(record, idempotency_key))
+                remote_id = cursor.lastrowid
+                cursor.execute(FEEDER_STATE_UPSERT_QUERY, feeder_state_values(record, remote_id))
+                connection.commit()
+            except (mysql_connector.DataError, mysql_connector.IntegrityError) as data_error:
+                # Errores de datos no se corrigen reintentando: se apartan para no bloquear la cola
+                logger.error(f"Registro local {local_id} rechazado por MySQL: {data_error}")
+                connection.rollback()
+                self.mark_failed(local_id, data_error, permanent=True)
+                continue
+            except Exception:
+                connection.rollback()
+                raise
+            synced.append((local_id, remote_id))
+        cursor.close()
+        return synced
+
+    def drain(self):
+        """Envía los pendientes en orden; devuelve False si hubo una falla transitoria"""
+        batch = self.pending(self.config['max_batch_size'])
+        if not batch:
+            return True
+
+        connection = get_db_connection()
+        if not connection:
+            self.last_error = 'Error de conexión a base de datos'
+            return False
+
+        try:
+            try:
+                synced = self._insert_batch_recovering(connection, batch)
+            except (mysql_connector.DataError, mysql_connector.IntegrityError) as data_error:
+                logger.warning(f"Lote de historial rechazado ({data_error}); reintentando registro por registro")
+                synced = self._insert_one_by_one(connection, batch)
+            self.mark_synced(synced)
+            logger.info(f"{len(synced)} registros de historial sincronizados")
+            by_local_id = {local_id: (key, record) for local_id, key, record in batch}
+            self._notify('synced', [(*by_local_id[local_id], remote_id) for local_id, remote_id in synced])
+        except mysql_connector.Error as db_error:
+            logger.error(f"Error MySQL sincronizando historial: {db_error}")
+            self.last_error = str(db_error)
+            self.mark_failed(batch[0][0], db_error)
+            connection.invalidate()
+            return False
+        finally:
+            connection.close()
+
+        self.last_sync_at = datetime.now().isoformat()
+        self.last_error = None
+        return True
+
+    def _linger(self):
+        """Espera hasta max_linger para juntar un lote completo antes de enviarlo"""
+        deadline = time.monotonic() + self.config['max_linger']
+        while not self._stop_event.is_set() and self.pending_count() < self.config['max_batch_size']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wake_event.wait(remaining)
+            self._wake_event.clear()
+
+    def _worker_loop(self):
+        delay = self.config['drain_interval']
+        while not self._stop_event.is_set():
+            self._wake_event.wait(delay)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self._linger()
+                ok = self.drain()
+            except Exception as e:
+                logger.error(f"Error en el hilo de sincronización de historial: {e}")
+                self.last_error = str(e)
+                ok = False
+
+            if ok:
+                self._consecutive_failures = 0
+                delay = self.config['drain_interval']
+                if self.pending(1):
+                    self._wake_event.set()  # Quedan pendientes: seguir sin esperar
+                else:
+                    self.purge_synced()
+            else:
+                # Reintento con espera exponencial acotada
+                self._consecutive_failures += 1
+                delay = min(
+                    self.config['max_backoff'],
+                    self.config['drain_interval'] * (2 ** self._consecutive_failures)
+                )
+
+    def start(self):
+        self.open()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._worker_loop, daemon=True, name="HistorySpoolWorker")
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Detiene el envío; con timeout espera a que termine el lote en curso"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if timeout and self._thread is not None:
+            self._thread.join(timeout)
+
+
+history_spool = HistorySpool(ProductionConfig.HISTORY_SPOOL_CONFIG)
+
+# =====================================================================================
+# TRAZABILIDAD DE LOTES (lote de proveedor -> intervalos por línea y feeder)
+# =====================================================================================
+
+TraceEvent = collections.namedtuple(
+    'TraceEvent', 'key lot line position part persona created_at remote_id'
+)
+
+
+class LotTraceIndex:
+    """Índice invertido en memoria de los cambios guardados por esta estación, incluso los aún no sincronizados"""
+
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self._events = collections.OrderedDict()         # llave -> TraceEvent, en orden de llegada
+        self._by_lot = collections.defaultdict(set)       # lote -> llaves
+        self._by_position = collections.defaultdict(set)  # (línea, posición) -> llaves
+        self._lock = threading.Lock()
+
+    def on_history(self, event, items):
+        """Listener de history_spool: agrega los cambios nuevos y registra su id en MySQL al sincronizarse"""
+        with self._lock:
+            for key, record, remote_id in items:
+                lot = (record.get('numero_de_lote_proveedor') or '').strip()
+                if not lot:
+                    continue
+                self._add(TraceEvent(
+                    key, lot.upper(), record['line'], record['posicion_de_feeder'], record['numero_de_parte'],
+                    record.get('persona'), datetime.fromisoformat(record['created_at']), remote_id
+                ))
+
+    def _add(self, trace_event):
+        self._events.pop(trace_event.key, None)
+        self._events[trace_event.key] = trace_event
+        self._by_lot[trace_event.lot].add(trace_event.key)
+        self._by_position[(trace_event.line, trace_event.position)].add(trace_event.key)
+        while len(self._events) > self.max_events:
+            _, oldest = self._events.popitem(last=False)
+            self._discard(self._by_lot, oldest.lot, oldest.key)
+            self._discard(self._by_position, (oldest.line, oldest.position), oldest.key)
+
+    @staticmethod
+    def _discard(index, bucket, key):
+        keys = index.get(bucket)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[bucket]
+
+    def events_for_lot(self, lot):
+        with self._lock:
+            return [self._events[key] for key in self._by_lot.get(lot.strip().upper(), ())]
+
+    def next_change(self, line, position, after, exclude_key=None):
+        """Primer cambio conocido en memoria en (línea, posición) posterior a `after`"""
+        with self._lock:
+            later = [
+                self._events[key].created_at for key in self._by_position.get((line, position), ())
+                if key != exclude_key and self._events[key].created_at > after
+            ]
+        return min(later) if later else None
+
+    def stats(self):
+        with self._lock:
+            return {'events': len(self._events), 'lots': len(self._by_lot)}
+
+
+lot_trace_index = LotTraceIndex(ProductionConfig.TRACE_CONFIG['memory_events'])
+history_spool.add_listener(lot_trace_index.on_history)
+
+# Cada cambio del lote con el momento en que se cambió de nuevo esa posición (fin del intervalo)
+LOT_TRACE_QUERY = """
+SELECT /*+ MAX_EXECUTION_TIME({budget}) */
+    h.id, h.idempotency_key, h.line, h.posicion_de_feeder, h.numero_de_parte, h.persona, h.created_at,
+    (SELECT n.created_at FROM historial_cambio_material_imd n
+     WHERE n.line = h.line AND n.posicion_de_feeder = h.posicion_de_feeder AND n.created_at > h.created_at
+     ORDER BY n.created_at LIMIT 1) AS removed_at
+FROM historial_cambio_material_imd h
+WHERE h.numero_de_lote_proveedor = %s
+ORDER BY h.created_at, h.id
+LIMIT %s
+"""
+
+
+def as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def query_lot_events(lot):
+    """[(TraceEvent, removed_at)] del lote según MySQL; usa idx_lote_proveedor y idx_line_position_created"""
+    config = ProductionConfig.TRACE_CONFIG
+    connection = get_db_connection()
+    if not connection:
+        raise DatabaseUnavailableError('Error de conexión a base de datos')
+    with connection:
+        cursor = connection.cursor(buffered=True)
+        cursor.execute(
+            LOT_TRACE_QUERY.format(budget=int(config['max_execution_ms'])), (lot, config['max_events'])
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    return [
+        (TraceEvent(key or f"db:{record_id}", lot.upper(), line, position, part, persona,
+                    as_datetime(created_at), record_id), as_datetime(removed_at))
+        for record_id, key, line, position, part, persona, created_at, removed_at in rows
+    ]
+
+
+def build_placement_intervals(events):
+    """Agrupa [(TraceEvent, removed_at)] en intervalos por (línea, posición); recargas del mismo lote se unen"""
+    by_position = collections.defaultdict(list)
+    for trace_event, removed_at in events:
+        by_position[(trace_event.line, trace_event.position)].append((trace_event, removed_at))
+
+    placements = []
+    for (line, position), position_events in by_position.items():
+        position_events.sort(key=lambda item: item[0].created_at)
+        current = None
+        for trace_event, removed_at in position_events:
+            if current is not None and current['removed_at'] == trace_event.created_at:
+                # El siguiente cambio en la posición fue el mismo lote: el intervalo continúa
+                current['removed_at'] = removed_at
+                current['changes'] += 1
+                current['personas'].add(trace_event.persona)
+                continue
+            current = {
+                'line': line,
+                'posicion_de_feeder': position,
+                'numero_de_parte': trace_event.part,
+                'loaded_at': trace_event.created_at,
+                'removed_at': removed_at,
+                'changes': 1,
+                'personas': {trace_event.persona},
+            }
+            placements.append(current)
+
+    placements.sort(key=lambda placement: placement['loaded_at'])
+    for placement in placements:
+        placement['loaded_at'] = placement['loaded_at'].isoformat(sep=' ')
+        placement['removed_at'] = placement['removed_at'].isoformat(sep=' ') if placement['removed_at'] else None
+        placement['personas'] = sorted(persona for persona in placement['personas'] if persona)
+    return placements
+
+
+def trace_lot(lot):
+    """Intervalos de colocación del lote; combina MySQL con los cambios locales aún no sincronizados"""
+    complete = True
+    try:
+        events = query_lot_events(lot)
+    except (DatabaseUnavailableError, mysql_connector.Error) as e:
+        logger.warning(f"Trazabilidad del lote {lot} solo con cambios locales: {e}")
+        events, complete = [], False
+
+    known_keys = {trace_event.key for trace_event, _ in events}
+    known_ids = {trace_event.remote_id for trace_event, _ in events}
+    local_only = [
+        trace_event for trace_event in lot_trace_index.events_for_lot(lot)
+        if trace_event.key not in known_keys and trace_event.remote_id not in known_ids
+    ]
+    events.extend((trace_event, None) for trace_event in local_only)
+
+    # Un cambio local más reciente en la misma posición también cierra el intervalo
+    resolved = []
+    for trace_event, removed_at in events:
+        local_next = lot_trace_index.next_change(
+            trace_event.line, trace_event.position, trace_event.created_at, exclude_key=trace_event.key
+        )
+        if local_next is not None and (removed_at is None or local_next < removed_at):
+            removed_at = local_next
+        resolved.append((trace_event, removed_at))
+
+    return {
+        'lot': lot,
+        'complete': complete,
+        'events': len(resolved),
+        'unsynced_events': len(local_only),
+        'truncated': len(events) - len(local_only) >= ProductionConfig.TRACE_CONFIG['max_events'],
+        'placements': build_placement_intervals(resolved),
+    }
+
+# =====================================================================================
+# ESTADO ACTUAL DE FEEDERS (qué está cargado en cada posición de una línea)
+# =====================================================================================
+
+FEEDER_STATE_FIELDS = FEEDER_STATE_COLUMNS[1:]
+
+
+def feeder_position_sort_key(position):
+    """AXIAL_2 antes que AXIAL_10: orden natural por máquina y número de feeder"""
+    machine, _, feeder = position.partition('_')
+    return (machine, int(feeder) if feeder.isdigit() else float('inf'), feeder)
+
+
+def feeder_state_entry(key, record, remote_id):
+    """Entrada de estado de una posición a partir de un registro de la cola local"""
+    return {
+        'key': key,
+        'posicion_de_feeder': record['posicion_de_feeder'],
+        'history_id': remote_id,
+        'numero_de_parte': record['numero_de_parte'],
+        'numero_de_lote_proveedor': record.get('numero_de_lote_proveedor'),
+        'qr_almacen': record.get('qr_almacen'),
+        'polaridad': record.get('polaridad'),
+        'persona': record.get('persona'),
+        'changed_at': datetime.fromisoformat(record['created_at']),
+        'synced': remote_id is not None,
+    }
+
+
+class FeederStateStore:
+    """Copia en memoria de imd_feeder_current_state por línea, con los cambios locales aún no sincronizados encima"""
+
+    def __init__(self, config):
+        self.config = config
+        self._lines = {}       # línea -> {posición: entrada}
+        self._loaded_at = {}   # línea -> datetime de la última lectura correcta de MySQL
+        self._checked = {}     # línea -> (time.monotonic(), origen) del último intento de lectura
+        self._lock = threading.Lock()
+
+    def _apply(self, line, entry):
+        """Gana el cambio más reciente de la posición, igual que FEEDER_STATE_UPSERT_QUERY"""
+        positions = self._lines.setdefault(line, {})
+        current = positions.get(entry['posicion_de_feeder'])
+        if current is None or entry['changed_at'] >= current['changed_at']:
+            positions[entry['posicion_de_feeder']] = entry
+
+    def on_history(self, event, items):
+        """Listener de history_spool: el cambio se ve de inmediato y se marca sincronizado al llegar a MySQL"""
+        with self._lock:
+            for key, record, remote_id in items:
+                if not record.get('line') or not record.get('posicion_de_feeder'):
+                    continue
+                if event == 'synced':
+                    current = self._lines.get(record['line'], {}).get(record['posicion_de_feeder'])
+                    if current is not None and current['key'] == key:
+                        current['history_id'], current['synced'] = remote_id, True
+                        continue
+                self._apply(record['line'], feeder_state_entry(key, record, remote_id))
+
+    def _query_line(self, line):
+        connection = get_db_connection()
+        if not connection:
+            raise DatabaseUnavailableError('Error de conexión a base de datos')
+        with connection:
+            cursor = connection.cursor(buffered=True)
+            cursor.execute(
+                f"SELECT {', '.join(FEEDER_STATE_FIELDS)} FROM imd_feeder_current_state WHERE line = %s", (line,)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    def load_line(self, line):
+        """Relee la línea de MySQL (PRIMARY KEY line, posición) y conserva los cambios locales más recientes"""
+        rows = self._query_line(line)
+        pending = [
+            (key, record) for _, key, record in history_spool.pending(self.config['pending_overlay_limit'])
+            if record.get('line') == line and record.get('posicion_de_feeder')
+        ]
+        with self._lock:
+            previous = self._lines.get(line, {})
+            self._lines[line] = {}
+            for row in rows:
+                entry = dict(zip(FEEDER_STATE_FIELDS, row))
+                entry.update(key=None, changed_at=as_datetime(entry['changed_at']), synced=True)
+                self._apply(line, entry)
+            for entry in previous.values():
+                if not entry['synced']:
+                    self._apply(line, entry)
+            for key, record in pending:
+                self._apply(line, feeder_state_entry(key, record, None))
+            self._loaded_at[line] = datetime.now()
+
+    def line_state(self, line):
+        """Posiciones de la línea; relee MySQL cada refresh_interval y sirve lo local si no hay conexión"""
+        checked = self._checked.get(line)
+        if checked is None or time.monotonic() - checked[0] >= self.config['refresh_interval']:
+            source = 'mysql'
+            try:
+                self.load_line(line)
+            except (DatabaseUnavailableError, mysql_connector.Error) as e:
+                # Sin conexión tampoco se reintenta en cada petición: espera al siguiente intervalo
+                logger.warning(f"Estado de la línea {line} solo con datos locales: {e}")
+                source = 'local'
+            self._checked[line] = checked = (time.monotonic(), source)
+        with self._lock:
+            positions = sorted(
+                self._lines.get(line, {}).values(),
+                key=lambda entry: feeder_position_sort_key(entry['posicion_de_feeder'])
+            )
+            loaded_at = self._loaded_at.get(line)
+            return {
+                'line': line,
+                'source': checked[1],
+                'loaded_at': loaded_at.isoformat(sep=' ', timespec='seconds') if loaded_at else None,
+                'positions': [feeder_state_to_dict(entry) for entry in positions],
+            }
+
+
+def feeder_state_to_dict(entry):
+    return {
+        **{field: format_history_value(entry[field]) for field in FEEDER_STATE_FIELDS},
+        'synced': entry['synced'],
+    }
+
+
+feeder_state = FeederStateStore(ProductionConfig.FEEDER_STATE_CONFIG)
+history_spool.add_listener(feeder_state.on_history)
+
+# =====================================================================================
+# EVENTOS EN VIVO (/api/events: conexión a MySQL, caché de feeders, historial y cola local)
+# =====================================================================================
+
+class EventSubscription:
+    def __init__(self, line, queue_size):
+        self.line = line
+        self.queue = queue.Queue(queue_size)
+
+
+class EventBroker:
+    """Difunde cada evento, serializado una sola vez, a las colas acotadas de los clientes conectados"""
+
+    def __init__(self, config):
+        self.config = config
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.counters = {'published': 0, 'rejected_clients': 0, 'overflowed_clients': 0}
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    def subscribe(self, line=None):
+        """Nueva suscripción (solo eventos de historial de `line`, o de todas); None si se alcanzó max_clients"""
+        with self._lock:
+            if len(self._subscribers) >= self.config['max_clients']:
+                self.counters['rejected_clients'] += 1
+                return None
+            subscription = EventSubscription(line, self.config['queue_size'])
+            self._subscribers.add(subscription)
+            return subscription
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event, data, line=None):
+        """Encola el evento para los clientes interesados; nunca bloquea a quien publica"""
+        with self._lock:
+            subscribers = [
+                subscription for subscription in self._subscribers
+                if line is None or subscription.line is None or subscription.line == line
+            ]
+            if not subscribers:
+                return
+            self.counters['published'] += 1
+        frame = self.format_event(event, data)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(frame)
+            except queue.Full:
+                # Cliente lento: se desconecta y al reconectarse recibe un snapshot completo
+                self.counters['overflowed_clients'] += 1
+                self._close(subscription)
+
+    def _close(self, subscription):
+        self.unsubscribe(subscription)
+        while True:
+            try:
+                subscription.queue.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    subscription.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def close(self):
+        """Termina todos los flujos abiertos (cierre del servidor)"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            self._close(subscription)
+
+    def stream(self, subscription, snapshot):
+        """Generador SSE: snapshot inicial, eventos y keep-alive hasta max_stream_seconds"""
+        config = self.config
+        deadline = time.monotonic() + config['max_stream_seconds']
+        try:
+            yield f"retry: {int(config['retry_ms'])}\n\n"
+            yield self.format_event('snapshot', snapshot)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = subscription.queue.get(timeout=min(config['heartbeat_interval'], remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._subscribers), **self.counters}
+
+
+event_broker = EventBroker(ProductionConfig.EVENTS_CONFIG)
+
+
+def events_snapshot():
+    """Estado completo al conectarse: el cliente no necesita consultar /api/health"""
+    return {
+        'startup': {'db': startup_state['db']},
+        'feeder_cache': feeder_cache.stats(),
+        'spool': {'pending': history_spool.status()['pending']},
+    }
+
+
+def publish_history_events(event, items):
+    """Listener de history_spool: cambios por línea (solo a quien observa esa línea) y profundidad de la cola"""
+    if not event_broker.has_subscribers():
+        return
+    by_line = collections.defaultdict(list)
+    for key, record, remote_id in items:
+        if record.get('line') and record.get('posicion_de_feeder'):
+            by_line[record['line']].append(feeder_state_to_dict(feeder_state_entry(key, record, remote_id)))
+    for line, changes in by_line.items():
+        event_broker.publish('history', {'event': event, 'line': line, 'changes': changes}, line=line)
+    event_broker.publish('spool', {'pending': history_spool.pending_count()})
+
+
+history_spool.add_listener(publish_history_events)
+feeder_cache.add_listener(lambda stats: event_broker.publish('feeder_cache', stats))
+
+# =====================================================================================
+# PÁGINA PRINCIPAL Y RECURSOS ESTÁTICOS (generados una vez y servidos desde memoria)
+# =====================================================================================
+
+class PrecompressedAsset:
+    """Contenido en memoria con ETag fuerte y variantes precomprimidas (gzip y, si está disponible, brotli)"""
+
+    def __init__(self, body, mimetype, cache_control, compress=True):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {'identity': body}
+        if compress:
+            self.variants['gzip'] = gzip.compress(body, compresslevel=9)
+            try:
+                import brotli  # Dependencia opcional
+            except ImportError:
+                brotli = None
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body)
+
+    def response(self, cache_control=None):
+        headers = {
+            'ETag': f'"{self.etag}"',
+            'Cache-Control': cache_control or self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if request.if_none_match and self.etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        body = self.variants['identity']
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and encoding in request.accept_encodings:
+                body = self.variants[encoding]
+                headers['Content-Encoding'] = encoding
+                break
+        return Response(body, mimetype=self.mimetype, headers=headers)
+
+
+_static_assets = {}
+_static_assets_lock = threading.RLock()
+
+
+def get_static_asset(name, builder):
+    """Construye el recurso en el primer uso y lo reutiliza en adelante"""
+    asset = _static_assets.get(name)
+    if asset is None:
+        with _static_assets_lock:
+            asset = _static_assets.get(name)
+            if asset is None:
+                asset = builder()
+                _static_assets[name] = asset
+    return asset
+
+
+# Recursos estáticos empaquetados con la aplicación (también en imd_app.spec)
+STATIC_DIR = os.path.join(
+    getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'static'
+)
+STATIC_EXTENSIONS = ('.css', '.js', '.png', '.svg', '.ico', '.woff', '.woff2')
+STATIC_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+# Respaldo en CDN mientras la copia local de Bootstrap no esté en static/vendor (ver fetch_vendor_assets.py)
+VENDOR_CDN_FALLBACKS = {
+    'vendor/bootstrap/bootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+        'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW+ALEwIH'
+    ),
+    'vendor/bootstrap/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+        'sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz'
+    ),
+}
+
+# Nombre con huella de contenido: css/app.css -> css/app.<hash>.css
+HASHED_NAME_PATTERN = re.compile(r'^(?P<base>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[A-Za-z0-9]+)$')
+ASSET_TAG_PATTERN = re.compile(r'\{\{(url|stylesheet|script):([^}]+)\}\}')
+
+
+def build_static_manifest():
+    """Lee static/ una vez y prepara cada archivo con su ETag y variantes comprimidas"""
+    manifest = {}
+    for root, _, files in os.walk(STATIC_DIR):
+        for file_name in files:
+            if not file_name.endswith(STATIC_EXTENSIONS):
+                continue
+            full_path = os.path.join(root, file_name)
+            logical = os.path.relpath(full_path, STATIC_DIR).replace(os.sep, '/')
+            with open(full_path, 'rb') as asset_file:
+                body = asset_file.read()
+            mimetype = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+            if mimetype.startswith('text/') or mimetype in ('application/javascript', 'image/svg+xml'):
+                mimetype = f'{mimetype}; charset=utf-8' if mimetype.startswith('text/') else mimetype
+                asset = PrecompressedAsset(body, mimetype, STATIC_IMMUTABLE_CACHE)
+            else:
+                asset = PrecompressedAsset(body, mimetype, STATIC_IMMUTABLE_CACHE, compress=False)
+            manifest[logical] = asset
+    return manifest
+
+
+def static_url(logical):
+    """URL versionada por contenido de un recurso de static/"""
+    asset = get_static_asset('manifest', build_static_manifest).get(logical)
+    if asset is None:
+        return None
+    base, ext = os.path.splitext(logical)
+    return f"/assets/{base}.{asset.etag[:12]}{ext}"
+
+
+def render_asset_tag(kind, logical):
+    url = static_url(logical)
+    integrity = ''
+    if url is None:
+        if logical not in VENDOR_CDN_FALLBACKS:
+            logger.error(f"Recurso estático no encontrado: {logical}")
+            return ''
+        url, sri = VENDOR_CDN_FALLBACKS[logical]
+        integrity = f' integrity="{sri}" crossorigin="anonymous"'
+    if kind == 'stylesheet':
+        return f'<link href="{url}" rel="stylesheet"{integrity}>'
+    if kind == 'script':
+        return f'<script src="{url}"{integrity}></script>'
+    return url
+
+
+def render_index_html():
+    """Sustituye las etiquetas {{tipo:ruta}} de INDEX_HTML por URLs versionadas"""
+    return ASSET_TAG_PATTERN.sub(lambda match: render_asset_tag(match.group(1), match.group(2).strip()), INDEX_HTML)
+
+
+# HTML embebido: estilos, scripts e imágenes viven en static/ y se referencian con {{tipo:ruta}}
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+  <meta charset="UTF-8" />
+  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+  <title>IMD Material Control - Desktop App</title>
+  <!-- Bootstrap 5 -->
+  {{stylesheet:vendor/bootstrap/bootstrap.min.css}}
+  
+  <!-- Estilos de la aplicación -->
+  {{stylesheet:css/app.css}}
+</head>
+<body class="app-bg">
+  <!-- Navbar Principal -->
+  <header class="mb-4">
+    <div class="container-fluid">
+    <nav class="navbar navbar-expand-lg navbar-dark bg-dark py-3 fixed-top">
+        <div class="container-fluid d-flex align-items-center">
+          <!-- Logo -->
+          <div class="navbar-brand me-4">
+            <img src="{{url:img/logo.png}}" 
+                 alt="IMD Logo" 
+                 height="50" 
+                 class="me-3">
+          </div>
+          
+          <!-- Título Centrado -->
+          <div class="flex-grow-1 text-center">
+            <h1 class="navbar-text mb-0 fw-bold" style="font-size: 1.5rem; color: white;">
+              Control de cambios de material IMD
+            </h1>
+          </div>
+          
+          <!-- Estado de los datos de feeders (en línea / réplica local) -->
+          <span class="badge bg-secondary me-3" id="data-status-badge">Conectando...</span>
+          <span class="badge bg-warning text-dark me-3 d-none" id="sync-status-badge" role="status"></span>
+          
+          <!-- Selector de Línea -->
+          <div class="navbar-nav ms-auto">
+            <select class="form-select bg-secondary text-white" id="line-selector" style="min-width: 150px;">
+              <option value="">Seleccione línea...</option>
+              <option value="PANA_A">PANA_A</option>
+              <option value="PANA_B">PANA_B</option>
+              <option value="PANA_C">PANA_C</option>
+              <option value="PANA_D">PANA_D</option>
+            </select>
+          </div>
+        </div>
+      </nav>
+    </div>
   </header>
     <!-- Cambiado a container-fluid para ancho completo -->
     <main class="container-fluid pb-4 px-4 pt-5">
@@ -669,6 +2737,33 @@ h1,h2,h3,h4,h5,h6 { color: #fff; font-family: var(--font-base); font-weight:600;
         </div>
       </div>
     </div>
+    <!-- Ocupación actual de la línea: qué parte y lote tiene cada feeder -->
+    <div class="row g-4 px-4 mt-1">
+      <div class="col-12 px-4">
+        <div class="card card-dark line-state-card">
+          <div class="card-header d-flex justify-content-between align-items-center py-2">
+            <h2 class="h6 fw-semibold mb-0">Ocupación de la línea</h2>
+            <span class="badge bg-secondary" id="line-state-badge" role="status">Seleccione una línea</span>
+          </div>
+          <div class="card-body">
+            <div class="row g-4">
+              <div class="col-12 col-lg-6">
+                <table class="table table-dark table-sm line-state-table mb-0" aria-label="Feeders AXIAL">
+                  <thead><tr><th>Feeder</th><th>Parte</th><th>Lote</th><th>Desde</th></tr></thead>
+                  <tbody id="axial-line-state"></tbody>
+                </table>
+              </div>
+              <div class="col-12 col-lg-6">
+                <table class="table table-dark table-sm line-state-table mb-0" aria-label="Feeders RADIAL">
+                  <thead><tr><th>Feeder</th><th>Parte</th><th>Lote</th><th>Desde</th></tr></thead>
+                  <tbody id="radial-line-state"></tbody>
+                </table>
+              </div>
+            </div>
+          </div>
+        </div>
+      </div>
+    </div>
   </main>
 
   <!-- Modal para errores y mensajes -->
@@ -690,981 +2785,901 @@ h1,h2,h3,h4,h5,h6 { color: #fff; font-family: var(--font-base); font-weight:600;
   </div>
 
   <!-- Bootstrap JS -->
-  <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js" integrity="sha384-YvpcrYf0tY3lHB60NNkmXc5s9fDVZLESaAA55NDzOxhy9GkcIdslK1eN7N6jIeHz" crossorigin="anonymous"></script>
+  {{script:vendor/bootstrap/bootstrap.bundle.min.js}}
   
-  <!-- JavaScript Embebido con URL dinámica -->
-  <script>
-// app.js - Lógica para el control de cambios de material IMD con URL dinámica
-const API_BASE_URL = window.location.origin + '/api';
-
-// Variables globales para cada máquina
-let selectedLine = ''; // Variable global para la línea seleccionada
-
-const machineStates = {
-    axial: {
-        machine: 'AXIAL',
-        qrAlmacen: '',
-        qrProveedor: '',
-        loteProveedor: '',
-        feeder: '',
-        polaridad: '',
-        persona: '',
-        partNumber: '',
-        spec: '',
-        dbPolarity: '',
-        expectedFeeder: '',
-        expectedPolarity: '',
-        feederValid: false,
-        polarityValid: false,
-        allDataReady: false
-    },
-    radial: {
-        machine: 'RADIAL',
-        qrAlmacen: '',
-        qrProveedor: '',
-        loteProveedor: '',
-        feeder: '',
-        polaridad: '',
-        persona: '',
-        partNumber: '',
-        spec: '',
-        dbPolarity: '',
-        expectedFeeder: '',
-        expectedPolarity: '',
-        feederValid: false,
-        polarityValid: false,
-        allDataReady: false
-    }
-};
+  <!-- JavaScript de la aplicación -->
+  {{script:js/app.js}}
+</body>
+</html>"""
 
-function updateDateTimeDisplay() {
-    const datetimeElement = document.getElementById('current-datetime');
-    if (!datetimeElement) {
-        return;
-    }
 
-    const now = new Date();
-    const dateFormatter = new Intl.DateTimeFormat('es-MX', {
-        day: '2-digit',
-        month: '2-digit',
-        year: 'numeric'
-    });
-    const timeFormatter = new Intl.DateTimeFormat('es-MX', {
-        hour: '2-digit',
-        minute: '2-digit',
-        second: '2-digit',
-        hour12: false
-    });
-
-    const formattedDate = dateFormatter.format(now);
-    const formattedTime = timeFormatter.format(now);
-    datetimeElement.textContent = `${formattedDate} | ${formattedTime}`;
-}
+def build_index_asset():
+    return PrecompressedAsset(render_index_html().encode('utf-8'), 'text/html; charset=utf-8', 'no-cache')
 
-// Función para mostrar modal con mensaje
-function showModal(title, message, isError = false, autoClose = false) {
-    const modal = new bootstrap.Modal(document.getElementById('messageModal'));
-    const titleElement = document.getElementById('messageModalLabel');
-    const bodyElement = document.getElementById('messageModalBody');
-    const closeButton = document.querySelector('#messageModal .btn-close');
-    const footerButton = document.querySelector('#messageModal .modal-footer .btn');
-    
-    titleElement.textContent = title;
-    bodyElement.innerHTML = message;
-    
-    // Cambiar color según el tipo de mensaje
-    const modalContent = document.querySelector('#messageModal .modal-content');
-    if (isError) {
-        modalContent.style.borderColor = '#dc3545';
-        titleElement.style.color = '#ff6b6b';
-    } else {
-        modalContent.style.borderColor = '#28a745';
-        titleElement.style.color = '#51cf66';
-    }
-    
-    // Controlar visibilidad de botones según autoClose
-    if (autoClose) {
-        closeButton.style.display = 'none';
-        footerButton.style.display = 'none';
-    } else {
-        closeButton.style.display = 'block';
-        footerButton.style.display = 'block';
-    }
-    
-    modal.show();
-    
-    // Auto cerrar después de 2 segundos si autoClose es true
-    if (autoClose) {
-        setTimeout(() => {
-            modal.hide();
-        }, 2000);
-    }
-}
 
-// Función para extraer número de parte del QR almacén
-function extractPartNumber(qrAlmacen) {
-    if (!qrAlmacen) return null;
-    
-    // Buscar el primer separador y tomar todo lo anterior
-    const separators = [',', "'", '_', '-'];
-    for (const sep of separators) {
-        const index = qrAlmacen.indexOf(sep);
-        if (index !== -1) {
-            return qrAlmacen.substring(0, index);
-        }
-    }
-    
-    // Si no hay separadores, retornar el string completo
-    return qrAlmacen;
-}
+# Ruta principal que sirve la aplicación
+@app.route('/')
+def index():
+    try:
+        return get_static_asset('index', build_index_asset).response()
+    except Exception as e:
+        return f"Error cargando la aplicación: {e}", 500
 
-// Función para hacer peticiones a la API
-async function apiRequest(endpoint, data = null) {
-    try {
-        const options = {
-            method: data ? 'POST' : 'GET',
-            headers: {
-                'Content-Type': 'application/json',
-            }
-        };
-        
-        if (data) {
-            options.body = JSON.stringify(data);
-        }
-        
-        const response = await fetch(`${API_BASE_URL}${endpoint}`, options);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        return await response.json();
-    } catch (error) {
-        console.error('Error en API request:', error);
-        throw error;
-    }
-}
+# Recursos estáticos con nombre versionado (caché inmutable)
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    match = HASHED_NAME_PATTERN.match(filename)
+    logical = f"{match.group('base')}{match.group('ext')}" if match else filename
+    asset = get_static_asset('manifest', build_static_manifest).get(logical)
+    if asset is None:
+        return "Recurso no encontrado", 404
+    if match and match.group('hash') == asset.etag[:12]:
+        return asset.response()
+    # Nombre sin huella o de una versión anterior: servir el contenido actual sin caché larga
+    return asset.response(cache_control='no-cache')
+
+# API Health check
+@app.route('/api/health')
+def health_check():
+    return jsonify({
+        'status': 'OK',
+        'message': 'Servidor IMD funcionando correctamente',
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': db_pool.stats(),
+        'feeder_cache': feeder_cache.stats(),
+        'feeder_lookup': feeder_lookup_state,
+        'schema': schema_state,
+        'startup': startup_state
+    })
+
+
+@app.route('/api/qr-grammars')
+def qr_grammars_endpoint():
+    """Definición compartida de las gramáticas QR para la interfaz"""
+    return jsonify({
+        'success': True,
+        'version': qr_grammars_state['version'],
+        'grammars': qr_grammars_for_js()
+    })
+
+
+def collect_component_metrics():
+    """Caché de feeders, pool de conexiones y cola local, leídos al momento de exportar"""
+    cache = feeder_cache.stats()
+    pools = db_pool.stats()
+    spool = history_spool.status()
+    return [
+        ('imd_feeder_cache_lookups_total', 'counter', 'Búsquedas en la caché de feeders por resultado',
+         [((('result', 'hit'),), cache['hits']), ((('result', 'miss'),), cache['misses'])]),
+        ('imd_feeder_cache_hit_ratio', 'gauge', 'Proporción de aciertos de la caché de feeders',
+         [((), cache['hit_ratio'] or 0)]),
+        ('imd_feeder_cache_entries', 'gauge', 'Registros en la caché de feeders',
+         [((), cache['entries'])]),
+        ('imd_feeder_cache_db_lookups_total', 'counter', 'Consultas a MySQL por fallos de caché',
+         [((), cache['db_lookups'])]),
+        ('imd_db_pool_connections', 'gauge', 'Conexiones del pool por perfil y estado',
+         [((('profile', pool['profile']), ('state', state)), pool[state]) for pool in pools for state in ('in_use', 'idle')]),
+        ('imd_db_pool_timeouts_total', 'counter', 'Esperas agotadas por conexión del pool por perfil',
+         [((('profile', pool['profile']),), pool['timeouts']) for pool in pools]),
+        ('imd_history_spool_records', 'gauge', 'Registros de la cola local de historial por estado',
+         [((('status', status),), spool[status]) for status in ('pending', 'synced', 'rejected')]),
+        ('imd_event_stream_clients', 'gauge', 'Clientes conectados a /api/events',
+         [((), event_broker.stats()['clients'])]),
+    ]
+
+
+metrics.register_collector(collect_component_metrics)
+
+
+@app.route('/api/metrics')
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/startup/first-paint', methods=['POST'])
+def startup_first_paint():
+    """La interfaz avisa su primer pintado; se registra el tiempo total de arranque una sola vez"""
+    if startup_state['first_paint_ms'] is None:
+        data = request.get_json(silent=True) or {}
+        startup_state['first_paint_ms'] = elapsed_since_start_ms()
+        logger.info(
+            f"Arranque: servidor {startup_state['server_ready_ms']} ms, "
+            f"primer pintado {startup_state['first_paint_ms']} ms "
+            f"(página {data.get('page_ms')} ms), base de datos {startup_state['db']}"
+        )
+    return jsonify({'success': True, 'startup': startup_state})
 
-// Función para buscar información de parte
-async function searchPart(machineType, qrAlmacen) {
-    const state = machineStates[machineType];
+# =====================================================================================
+# GRAMÁTICAS DE QR (número de parte, lote y cantidad en una sola pasada)
+# =====================================================================================
 
-    if (!selectedLine) {
-        showModal('Error', 'Debe seleccionar una línea de producción', true);
-        return;
-    }
+# Patrones sin anclas y solo con sintaxis común a Python y JavaScript: se sirven a la
+# interfaz en /api/qr-grammars. Grupos con nombre: part (obligatorio), lot y qty.
+QRGrammar = collections.namedtuple('QRGrammar', 'name pattern description marker regex')
+QRParse = collections.namedtuple('QRParse', 'grammar part lot qty')
 
-    try {
-        // Extraer número de parte
-        const partNumber = extractPartNumber(qrAlmacen);
-        if (!partNumber) {
-            showModal('Error', 'No se pudo extraer el número de parte del QR almacén', true);
-            return;
-        }
+QR_PARSE_CACHE_SIZE = 4096
+QR_NAMED_GROUP = re.compile(r"\(\?P<(\w+)>")
 
-        // Restablecer estado dependiente de feeder y polaridad antes de la búsqueda
-        Object.assign(state, {
-            partNumber: '',
-            spec: '',
-            dbPolarity: '',
-            expectedFeeder: '',
-            expectedPolarity: '',
-            feeder: '',
-            polaridad: '',
-            feederValid: false,
-            polarityValid: false,
-            allDataReady: false
-        });
-
-        const specInput = document.getElementById(`${machineType}-spec`);
-        if (specInput) {
-            specInput.value = '';
-            specInput.style.backgroundColor = '';
-        }
+# En orden de prioridad; equivale al recorrido heredado de separadores [',', "'", '_', '-']:
+# el primer separador presente en el QR decide y la parte es todo lo anterior a él.
+# marker: texto que debe aparecer en el QR para intentar la gramática (filtro barato previo al regex)
+DEFAULT_QR_GRAMMARS = [
+    ('coma', r"(?P<part>[^,]*),(?P<lot>[^,]*)(?:,(?P<qty>\d+))?.*", 'PARTE,LOTE,CANTIDAD', ','),
+    ('apostrofe', r"(?P<part>[^']*)'(?P<lot>[^']*)(?:'(?P<qty>\d+))?.*", "PARTE'LOTE'CANTIDAD", "'"),
+    ('guion_bajo', r"(?P<part>[^_]*)_(?P<lot>[^_]*)(?:_(?P<qty>\d+))?.*", 'PARTE_LOTE_CANTIDAD', '_'),
+    ('guion', r"(?P<part>[^-]*)-(?P<lot>[^-]*)(?:-(?P<qty>\d+))?.*", 'PARTE-LOTE-CANTIDAD', '-'),
+    ('simple', r"(?P<part>.*)", 'Solo número de parte', None),
+]
 
-        const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
-        if (polarityDisplayDiv) {
-            polarityDisplayDiv.innerHTML = '';
-        }
+qr_grammars = []
+_qr_grammars_lock = threading.Lock()
+qr_grammars_state = {'version': 0}
 
-        const resultDisplayDiv = document.getElementById(`${machineType}-resultado-display`);
-        if (resultDisplayDiv) {
-            resultDisplayDiv.innerHTML = '';
-        }
 
-        const feederInput = document.getElementById(`${machineType}-feeder`);
-        if (feederInput) {
-            feederInput.value = '';
-            feederInput.style.backgroundColor = '';
-            feederInput.classList.remove('validation-error');
-        }
+def compile_qr_grammar(name, pattern, description='', marker=None):
+    regex = re.compile(pattern, re.DOTALL)
+    if 'part' not in regex.groupindex:
+        raise ValueError(f"La gramática QR '{name}' no define el grupo 'part'")
+    return QRGrammar(name, pattern, description, marker, regex)
 
-        const polarityInput = document.getElementById(`${machineType}-polaridad`);
-        if (polarityInput) {
-            polarityInput.value = '';
-            polarityInput.style.backgroundColor = '';
-            polarityInput.classList.remove('validation-error');
-        }
 
-        // Buscar en base de datos
-        const result = await apiRequest('/search-part', {
-            qr_almacen: qrAlmacen,
-            machine: state.machine,
-            line: selectedLine
-        });
-        
-        if (result.success) {
-            // Actualizar estado
-            state.partNumber = result.part_number;
-            state.spec = result.data.spec;
-            state.dbPolarity = result.data.polarity;
-
-            // Actualizar UI - Spec
-            const specInput = document.getElementById(`${machineType}-spec`);
-            if (specInput) {
-                specInput.value = result.data.spec;
-                specInput.style.backgroundColor = '#1a472a'; // Verde oscuro
-            }
+def register_qr_grammar(name, pattern, description='', marker=None, position=None):
+    """Agrega (o reemplaza) una gramática; position=None la agrega antes de 'simple'"""
+    grammar = compile_qr_grammar(name, pattern, description, marker)
+    with _qr_grammars_lock:
+        grammars = [g for g in qr_grammars if g.name != name]
+        if position is None:
+            position = next((i for i, g in enumerate(grammars) if g.name == 'simple'), len(grammars))
+        grammars.insert(position, grammar)
+        qr_grammars[:] = grammars
+        qr_grammars_state['version'] += 1
+    _parse_qr_cached.cache_clear()
+    return grammar
 
-            console.log(`Datos encontrados para ${state.machine}:`, result.data);
-        } else {
-            showModal('Error', `No se encontraron datos para el número de parte: ${partNumber}`, true);
-        }
-        
-    } catch (error) {
-        showModal('Error', 'Error conectando con el servidor. Verifique que el servidor esté ejecutándose.', true);
-        console.error('Error buscando parte:', error);
-    }
-}
 
-// Función para validar feeder
-async function validateFeeder(machineType, feederScanned) {
-    const state = machineStates[machineType];
-    
-    if (!state.partNumber) {
-        showModal('Error', 'Primero debe escanear el QR almacén', true);
-        return;
-    }
-    
-    if (!selectedLine) {
-        showModal('Error', 'Debe seleccionar una línea de producción', true);
-        return;
-    }
-    
-    try {
-        const result = await apiRequest('/validate-feeder', {
-            part_number: state.partNumber,
-            feeder_scanned: feederScanned,
-            machine: state.machine,
-            line: selectedLine
-        });
-        
-        if (result.success) {
-            state.feederValid = result.is_valid;
-
-            // Actualizar color del input según validación
-            const feederInput = document.getElementById(`${machineType}-feeder`);
-            if (feederInput) {
-                if (result.is_valid) {
-                    feederInput.style.backgroundColor = '#1a472a'; // Verde oscuro
-                    feederInput.classList.remove('validation-error');
-                } else {
-                    feederInput.style.backgroundColor = '#7f1d1d'; // Rojo oscuro
-                    feederInput.classList.add('validation-error');
-                }
-            }
+@functools.lru_cache(maxsize=QR_PARSE_CACHE_SIZE)
+def _parse_qr_cached(qr):
+    for grammar in qr_grammars:
+        if grammar.marker is not None and grammar.marker not in qr:
+            continue
+        match = grammar.regex.fullmatch(qr)
+        if match:
+            fields = match.groupdict()
+            lot, qty = fields.get('lot'), fields.get('qty')
+            return QRParse(grammar.name, (fields['part'] or '').strip(), (lot or '').strip() or None, int(qty) if qty else None)
+    return QRParse(None, qr.strip(), None, None)
 
-            // Actualizar bloque de resultado
-            updateResultDisplay(machineType);
 
-            if (typeof result.expected_polarity !== 'undefined') {
-                state.expectedFeeder = result.expected_feeder || '';
-                state.expectedPolarity = result.expected_polarity || '';
-                updatePolarityDisplay(machineType, state.expectedPolarity);
-            }
+def parse_qr(qr):
+    """Número de parte, lote y cantidad del QR según la primera gramática que coincide"""
+    return _parse_qr_cached(qr or '')
 
-            console.log(`Validación feeder ${state.machine} (línea ${selectedLine}):`, result.is_valid ? 'OK' : 'NG');
-        } else {
-            state.feederValid = false;
-            state.expectedFeeder = '';
-            state.expectedPolarity = '';
-            const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
-            if (polarityDisplayDiv) {
-                polarityDisplayDiv.innerHTML = '';
-            }
-            const resultDisplayDiv = document.getElementById(`${machineType}-resultado-display`);
-            if (resultDisplayDiv) {
-                resultDisplayDiv.innerHTML = '';
-            }
-            showModal('Error', 'Error validando feeder', true);
-        }
 
-    } catch (error) {
-        state.feederValid = false;
-        state.expectedFeeder = '';
-        state.expectedPolarity = '';
-        const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
-        if (polarityDisplayDiv) {
-            polarityDisplayDiv.innerHTML = '';
+def qr_grammars_for_js():
+    """Gramáticas con la sintaxis de grupos con nombre de JavaScript ((?<x>) en lugar de (?P<x>))"""
+    return [
+        {
+            'name': grammar.name,
+            'pattern': QR_NAMED_GROUP.sub(r"(?<\1>", grammar.pattern),
+            'description': grammar.description,
+            'marker': grammar.marker,
         }
-        const resultDisplayDiv = document.getElementById(`${machineType}-resultado-display`);
-        if (resultDisplayDiv) {
-            resultDisplayDiv.innerHTML = '';
-        }
-        showModal('Error', 'Error conectando con el servidor para validar feeder', true);
-        console.error('Error validando feeder:', error);
-    }
-}
+        for grammar in list(qr_grammars)
+    ]
 
-// Función para validar polaridad
-async function validatePolarity(machineType, polarityScanned) {
-    const state = machineStates[machineType];
-    
-    if (!state.partNumber) {
-        showModal('Error', 'Primero debe escanear el QR almacén', true);
-        return;
-    }
-    
-    if (!selectedLine) {
-        showModal('Error', 'Debe seleccionar una línea de producción', true);
-        return;
-    }
-    
-    try {
-        const result = await apiRequest('/validate-polarity', {
-            part_number: state.partNumber,
-            polarity_scanned: polarityScanned,
-            machine: state.machine,
-            line: selectedLine
-        });
-        
-        if (result.success) {
-            state.polarityValid = result.is_valid;
-            
-            // Actualizar color de la polaridad en el display del lado derecho
-            updatePolarityDisplayColor(machineType, result.is_valid);
-            
-            // Actualizar color del input según validación
-            const polarityInput = document.getElementById(`${machineType}-polaridad`);
-            if (polarityInput) {
-                if (result.is_valid) {
-                    polarityInput.style.backgroundColor = '#1a472a'; // Verde oscuro
-                    polarityInput.classList.remove('validation-error');
-                } else {
-                    polarityInput.style.backgroundColor = '#7f1d1d'; // Rojo oscuro
-                    polarityInput.classList.add('validation-error');
-                }
-            }
-            
-            // Actualizar color del resultado según validación de polaridad
-            updateResultDisplay(machineType, true);
-            
-            console.log(`Validación polaridad ${state.machine} (línea ${selectedLine}):`, result.is_valid ? 'OK' : 'NG');
-        } else {
-            showModal('Error', 'Error validando polaridad', true);
-        }
-        
-    } catch (error) {
-        showModal('Error', 'Error conectando con el servidor para validar polaridad', true);
-        console.error('Error validando polaridad:', error);
-    }
-}
 
-// Función para actualizar el color del display de polaridad
-function updatePolarityDisplayColor(machineType, isValid) {
-    const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
-    if (polarityDisplayDiv) {
-        const currentText = polarityDisplayDiv.querySelector('h1')?.textContent || '';
-        if (currentText && currentText !== 'N/A') {
-            const color = isValid ? '#22c55e' : '#ef4444'; // Verde si es válido, rojo si no
-            polarityDisplayDiv.innerHTML = `<h1 style="color: ${color}; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${currentText}</h1>`;
-            console.log(`Color de polaridad actualizado para ${machineType}: ${isValid ? 'verde (válida)' : 'rojo (inválida)'}`);
-        }
-    }
-}
+for _grammar in DEFAULT_QR_GRAMMARS:
+    qr_grammars.append(compile_qr_grammar(*_grammar))
+
+
+# Función para extraer número de parte del QR almacén
+def extract_part_number(qr_almacen):
+    """Número de parte según la primera gramática QR que coincide"""
+    return parse_qr(qr_almacen).part
 
-// Función para actualizar el display de polaridad con el valor esperado
-function updatePolarityDisplay(machineType, expectedPolarity) {
-    const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
-    if (polarityDisplayDiv) {
-        polarityDisplayDiv.innerHTML = `<h1 style="color: white; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${expectedPolarity || 'N/A'}</h1>`;
-        console.log(`Polaridad esperada mostrada para ${machineType}: ${expectedPolarity}`);
+
+def part_data_from_row(row):
+    """Datos de parte en el formato que espera la UI"""
+    return {
+        'numero_de_parte': row['no_part'],
+        'spec': row['spec'],
+        # Se mantiene posicion_de_feeder como machine + '_' + feeder para compatibilidad con la UI
+        'posicion_de_feeder': (
+            f"{row['machine']}_{row['feeder']}"
+            if row['machine'] is not None and row['feeder'] is not None else None
+        ),
+        'polarity': row['polarity']
     }
-}
 
-// Función para actualizar el display de resultado
-function updateResultDisplay(machineType, includePolarityValidation = false) {
-    const state = machineStates[machineType];
-    const resultElement = document.getElementById(`${machineType}-resultado-display`);
-    
-    if (!resultElement) return;
-    
-    let resultText = '';
-    let resultColor = '';
-    
-    // Determinar resultado basado en validación de feeder
-    if (state.feederValid) {
-        resultText = 'OK';
-        resultColor = '#22c55e'; // Verde
-    } else {
-        resultText = 'NG';
-        resultColor = '#ef4444'; // Rojo
+
+def evaluate_feeder(row, feeder_scanned):
+    """Compara el feeder escaneado contra el esperado"""
+    expected_feeder = str(row['feeder'])  # feeder puro en DB
+    return {
+        'is_valid': expected_feeder.upper() == feeder_scanned.upper(),
+        'expected_feeder': expected_feeder,
+        'scanned_feeder': feeder_scanned,
+        'expected_polarity': row['polarity']
     }
-    
-    // Si se incluye validación de polaridad, ajustar color
-    if (includePolarityValidation) {
-        if (!state.polarityValid) {
-            resultText = 'NG';
-            resultColor = '#ef4444'; // Rojo si la polaridad no es válida
-        }
+
+
+def evaluate_polarity(row, polarity_scanned):
+    """Compara la polaridad escaneada contra la esperada (sin polaridad en BD siempre es válida)"""
+    expected_polarity = row['polarity']
+    if expected_polarity is None:
+        is_valid = True
+    else:
+        is_valid = str(expected_polarity).upper() == polarity_scanned.upper()
+    return {
+        'is_valid': is_valid,
+        'expected_polarity': expected_polarity,
+        'scanned_polarity': polarity_scanned
     }
-    
-    resultElement.innerHTML = `<h1 style="color: ${resultColor}; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${resultText}</h1>`;
-}
 
-// Función para verificar si todos los datos están listos
-function checkAllDataReady(machineType) {
-    const state = machineStates[machineType];
-    
-    state.allDataReady = (
-        state.qrAlmacen &&
-        state.qrProveedor &&
-        state.loteProveedor &&
-        state.feeder &&
-        state.polaridad &&
-        state.persona &&
-        state.partNumber
-    );
-    
-    return state.allDataReady;
-}
+# API para buscar información de parte
+@app.route('/api/search-part', methods=['POST'])
+def search_part():
+    try:
+        data = request.get_json()
+        qr_almacen = data.get('qr_almacen', '').strip()
+        machine = data.get('machine', '').strip()
+        line = data.get('line', '').strip()
 
-// Función para guardar en historial
-async function saveToHistory(machineType) {
-    const state = machineStates[machineType];
+        if not qr_almacen:
+            return jsonify({'success': False, 'error': 'QR almacén requerido'})
 
-    if (!selectedLine) {
-        showModal('Error', 'Debe seleccionar una línea de producción', true);
-        return;
-    }
+        if not line:
+            return jsonify({'success': False, 'error': 'Línea de producción requerida'})
 
-    // Verificar si hay errores
-    if (!state.feederValid || !state.polarityValid) {
-        let errorMessage = 'Se encontraron los siguientes errores:<br><br>';
+        # Extraer número de parte (y lote/cantidad) del QR almacén
+        qr = parse_qr(qr_almacen)
+        part_number = qr.part
+
+        # Buscar en caché / base de datos
+        result = lookup_feeder_location(part_number, machine, line)
+
+        if result:
+            return jsonify({
+                'success': True,
+                'part_number': part_number,
+                'qr': {'grammar': qr.grammar, 'lot': qr.lot, 'qty': qr.qty},
+                'data': part_data_from_row(result)
+            })
+        else:
+            return jsonify({'success': False, 'error': 'Número de parte no encontrado'})
+            
+    except DatabaseUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error en search-part: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+# API para validar feeder
+@app.route('/api/validate-feeder', methods=['POST'])
+def validate_feeder():
+    try:
+        data = request.get_json()
+        part_number = data.get('part_number', '').strip()
+        feeder_scanned = data.get('feeder_scanned', '').strip()
+        machine = data.get('machine', '').strip()
+        line = data.get('line', '').strip()
+        machine_norm = machine.upper()
+        line_norm = line.upper()
         
-        if (!state.feederValid) {
-            errorMessage += '• El feeder escaneado no coincide con el esperado<br>';
-        }
+        if not all([part_number, feeder_scanned, machine, line]):
+            return jsonify({'success': False, 'error': 'Datos incompletos (part_number, feeder_scanned, machine, line requeridos)'})
         
-        if (!state.polarityValid) {
-            errorMessage += '• La polaridad escaneada no coincide con la esperada<br>';
-        }
+        # Buscar feeder esperado considerando máquina y línea
+        result = lookup_feeder_location(part_number, machine_norm, line_norm)
         
-        showModal('Errores de Validación', errorMessage, true);
-        return;
-    }
-    
-    // Verificar que todos los campos estén completos
-    if (!checkAllDataReady(machineType)) {
-        showModal('Error', 'Todos los campos deben estar completos antes de guardar', true);
-        return;
-    }
-    
-    try {
-        const historyData = {
-            posicion_de_feeder: `${state.machine}_${state.feeder}`,
-            qr_almacen: state.qrAlmacen,
-            numero_de_parte: state.partNumber,
-            spec: state.spec,
-            qr_de_proveedor: state.qrProveedor,
-            numero_de_lote_proveedor: state.loteProveedor,
-            polaridad: state.polaridad,
-            persona: state.persona,
-            line: selectedLine
-        };
+        if result:
+            return jsonify({'success': True, **evaluate_feeder(result, feeder_scanned)})
+        else:
+            return jsonify({'success': False, 'error': 'Configuración de feeder no encontrada'})
+            
+    except DatabaseUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error en validate-feeder: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+# API para validar polaridad
+@app.route('/api/validate-polarity', methods=['POST'])
+def validate_polarity():
+    try:
+        data = request.get_json()
+        part_number = data.get('part_number', '').strip()
+        polarity_scanned = data.get('polarity_scanned', '').strip()
+        machine = data.get('machine', '').strip()
+        line = data.get('line', '').strip()
+        machine_norm = machine.upper()
+        line_norm = line.upper()
         
-        const result = await apiRequest('/save-history', historyData);
+        if not all([part_number, polarity_scanned, machine, line]):
+            return jsonify({'success': False, 'error': 'Datos incompletos (part_number, polarity_scanned, machine, line requeridos)'})
         
-        if (result.success) {
-            showModal('Éxito', '✅ Cambio de material registrado exitosamente', false, true);
-            
-            // Limpiar formulario
-            clearMachineForm(machineType);
-        } else {
-            showModal('Error', 'Error guardando el registro', true);
-        }
+        # Buscar polaridad esperada
+        result = lookup_feeder_location(part_number, machine_norm, line_norm)
         
-    } catch (error) {
-        showModal('Error', 'Error conectando con el servidor para guardar', true);
-        console.error('Error guardando historial:', error);
-    }
-}
+        if result:
+            return jsonify({'success': True, **evaluate_polarity(result, polarity_scanned)})
+        else:
+            return jsonify({'success': False, 'error': 'Configuración de polaridad no encontrada'})
+            
+    except DatabaseUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error en validate-polarity: {e}")
+        return jsonify({'success': False, 'error': str(e)})
 
-// Función para limpiar formulario
-function clearMachineForm(machineType) {
-    const state = machineStates[machineType];
-    
-    console.log(`Limpiando formulario para máquina ${machineType.toUpperCase()}`);
-
-    // Resetear estado
-    Object.assign(state, {
-        qrAlmacen: '',
-        qrProveedor: '',
-        loteProveedor: '',
-        feeder: '',
-        polaridad: '',
-        persona: '',
-        partNumber: '',
-        spec: '',
-        dbPolarity: '',
-        expectedFeeder: '',
-        expectedPolarity: '',
-        feederValid: false,
-        polarityValid: false,
-        allDataReady: false
-    });
-    
-    // Limpiar inputs
-    const inputs = [
-        'qr-almacen', 'qr-proveedor', 'lote-proveedor', 
-        'feeder', 'polaridad', 'persona', 'spec'
-    ];
-    
-    inputs.forEach(inputName => {
-        const input = document.getElementById(`${machineType}-${inputName}`);
-        if (input) {
-            input.value = '';
-            input.style.backgroundColor = ''; // Resetear color
-            input.classList.remove('validation-error'); // Remover clase de error
-            console.log(`Input limpiado: ${machineType}-${inputName}`);
-        }
-    });
-
-    // Limpiar displays de visualización
-    const polarityDisplay = document.getElementById(`${machineType}-polaridad-display`);
-    if (polarityDisplay) {
-        polarityDisplay.innerHTML = '';
-        console.log(`Display de polaridad limpiado: ${machineType}-polaridad-display`);
-    } else {
-        console.warn(`No se encontró elemento: ${machineType}-polaridad-display`);
-    }
+def build_change_validation(part_number, machine, line, feeder_scanned='', polarity_scanned=''):
+    """Datos de parte y veredictos de feeder/polaridad a partir de una sola búsqueda"""
+    result = lookup_feeder_location(part_number, machine, line)
+    if not result:
+        return {'success': False, 'part_number': part_number, 'error': 'Número de parte no encontrado'}
 
-    const resultDisplay = document.getElementById(`${machineType}-resultado-display`);
-    if (resultDisplay) {
-        resultDisplay.innerHTML = '';
-        console.log(`Display de resultado limpiado: ${machineType}-resultado-display`);
-    } else {
-        console.warn(`No se encontró elemento: ${machineType}-resultado-display`);
+    return {
+        'success': True,
+        'part_number': part_number,
+        'data': part_data_from_row(result),
+        'feeder': evaluate_feeder(result, feeder_scanned) if feeder_scanned else None,
+        'polarity': evaluate_polarity(result, polarity_scanned) if polarity_scanned else None
     }
 
-    console.log(`Formulario ${machineType.toUpperCase()} completamente limpiado`);
-}
+# API combinada: una sola búsqueda devuelve datos de parte y validaciones de feeder/polaridad
+@app.route('/api/validate-change', methods=['POST'])
+def validate_change():
+    try:
+        data = request.get_json()
+        qr_almacen = data.get('qr_almacen', '').strip()
+        part_number = data.get('part_number', '').strip()
+        feeder_scanned = data.get('feeder_scanned', '').strip()
+        polarity_scanned = data.get('polarity_scanned', '').strip()
+        machine = data.get('machine', '').strip()
+        line = data.get('line', '').strip()
 
-// Función para limpiar todos los estados de máquina
-function clearAllMachineStates() {
-    console.log('Limpiando todos los estados de máquina por cambio de línea');
-    clearMachineForm('axial');
-    clearMachineForm('radial');
-}
+        if not (qr_almacen or part_number):
+            return jsonify({'success': False, 'error': 'QR almacén requerido'})
 
-// Event listeners para inputs
-function setupEventListeners() {
-    ['axial', 'radial'].forEach(machineType => {
-        const state = machineStates[machineType];
-        
-        // QR Almacén - Trigger búsqueda cuando se termine de escribir
-        const qrAlmacenInput = document.getElementById(`${machineType}-qr-almacen`);
-        qrAlmacenInput.addEventListener('input', function(e) {
-            state.qrAlmacen = e.target.value;
-        });
-        qrAlmacenInput.addEventListener('blur', function(e) {
-            if (e.target.value.length > 5) { // Búsqueda cuando hay suficientes caracteres
-                searchPart(machineType, e.target.value);
-            }
-        });
-        
-        // QR Proveedor
-        document.getElementById(`${machineType}-qr-proveedor`).addEventListener('input', function(e) {
-            state.qrProveedor = e.target.value;
-        });
-        
-        // Lote Proveedor
-        document.getElementById(`${machineType}-lote-proveedor`).addEventListener('input', function(e) {
-            state.loteProveedor = e.target.value;
-        });
-        
-        // Feeder - Trigger validación cuando se termine de escribir
-        const feederInput = document.getElementById(`${machineType}-feeder`);
-        feederInput.addEventListener('input', function(e) {
-            state.feeder = e.target.value;
-        });
-        feederInput.addEventListener('blur', function(e) {
-            if (e.target.value && state.partNumber) {
-                validateFeeder(machineType, e.target.value);
-            }
-        });
+        if not line:
+            return jsonify({'success': False, 'error': 'Línea de producción requerida'})
+
+        if not part_number:
+            part_number = extract_part_number(qr_almacen)
+
+        return jsonify(build_change_validation(part_number, machine, line, feeder_scanned, polarity_scanned))
+
+    except DatabaseUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error en validate-change: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
+# Consulta de solo lectura cacheable: misma respuesta que validate-change, con ETag por versión de la caché
+@app.route('/api/parts/<machine>/<line>/<path:part_number>')
+def get_part(machine, line, part_number):
+    etag = feeder_cache.etag()
+    if etag is not None and request.if_none_match.contains(etag):
+        # Mismo contenido que ya tiene el cliente: no se consulta caché ni base de datos
+        metrics.inc('imd_not_modified_total', (('route', current_route()),))
+        response = Response(status=304)
+    else:
+        try:
+            response = jsonify(build_change_validation(
+                part_number.strip(), machine.strip(), line.strip(),
+                request.args.get('feeder', '').strip(), request.args.get('polarity', '').strip()
+            ))
+        except DatabaseUnavailableError as e:
+            return jsonify({'success': False, 'error': str(e)})
+        except Exception as e:
+            logger.error(f"Error en parts: {e}")
+            return jsonify({'success': False, 'error': str(e)})
+    if etag is None:
+        response.headers['Cache-Control'] = 'no-store'
+    else:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"private, max-age={ProductionConfig.FEEDER_CACHE_CONFIG['client_max_age']}"
+    return response
+
+HISTORY_REQUIRED_FIELDS = (
+    'posicion_de_feeder', 'qr_almacen', 'numero_de_parte',
+    'qr_de_proveedor', 'numero_de_lote_proveedor', 'polaridad', 'persona', 'line'
+)
+
+
+# Igual que la columna idempotency_key VARCHAR(64); una llave más larga haría que MySQL rechace el registro
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def validate_idempotency_key(key):
+    """Mensaje de error si la llave enviada por el cliente no es válida; None si es válida o no se envió"""
+    if key is None or key == '':
+        return None
+    if not isinstance(key, str) or not IDEMPOTENCY_KEY_PATTERN.fullmatch(key):
+        return 'idempotency_key inválida: hasta 64 caracteres A-Z, a-z, 0-9, "_" o "-"'
+    return None
+
+
+def validate_history_payload(data):
+    """Devuelve el mensaje de error del primer campo requerido faltante, o None"""
+    if not isinstance(data, dict):
+        return 'Datos inválidos'
+    for field in HISTORY_REQUIRED_FIELDS:
+        if not str(data.get(field) or '').strip():
+            return f'Campo requerido: {field}'
+    return None
+
+
+def history_record_from_payload(data):
+    """Registro para la cola local con la fecha/hora del momento en que se recibió"""
+    record = {field: data.get(field, '') for field in HISTORY_FIELDS}
+    record['created_at'] = datetime.now().isoformat(sep=' ')
+    return record
+
+
+# API para guardar en historial
+@app.route('/api/save-history', methods=['POST'])
+def save_history():
+    try:
+        data = request.get_json()
+        logger.debug("Datos recibidos para save-history", extra={'payload': data})
         
-        // Polaridad - Trigger validación cuando se termine de escribir
-        const polaridadInput = document.getElementById(`${machineType}-polaridad`);
-        polaridadInput.addEventListener('input', function(e) {
-            state.polaridad = e.target.value;
-        });
-        polaridadInput.addEventListener('blur', function(e) {
-            if (e.target.value && state.partNumber) {
-                validatePolarity(machineType, e.target.value);
-            }
-        });
+        # Validar datos requeridos
+        error_msg = validate_history_payload(data)
+        if error_msg:
+            logger.warning(f"save-history rechazado: {error_msg}")
+            return jsonify({'success': False, 'error': error_msg})
+
+        # Una llave inválida se rechaza aquí: en la cola terminaría como registro rechazado por MySQL
+        key_error = validate_idempotency_key(data.get('idempotency_key'))
+        if key_error:
+            logger.warning(f"save-history rechazado: {key_error}")
+            return jsonify({'success': False, 'error': key_error}), 400
         
-        // Persona
-        document.getElementById(`${machineType}-persona`).addEventListener('input', function(e) {
-            state.persona = e.target.value;
-        });
+        # Guardar en la cola local; el hilo de sincronización lo envía a la base de datos
+        local_id, idempotency_key, duplicate = history_spool.enqueue(
+            history_record_from_payload(data), data.get('idempotency_key')
+        )
+        logger.debug("Registro guardado en cola local", extra={'record_id': local_id, 'duplicate': duplicate})
+
+        return jsonify({
+            'success': True,
+            'record_id': local_id,
+            'idempotency_key': idempotency_key,
+            'sync_status': 'duplicate' if duplicate else 'pending',
+            'message': 'Registro guardado exitosamente'
+        })
         
-        // Botón CAMBIAR
-        document.getElementById(`${machineType}-cambiar`).addEventListener('click', function() {
-            saveToHistory(machineType);
-        });
-    });
-}
+    except Exception as e:
+        logger.exception(f"Error general en save-history: {e}")
+        return jsonify({'success': False, 'error': str(e)})
 
-// Inicializar cuando el DOM esté listo
-document.addEventListener('DOMContentLoaded', function() {
-    console.log('Aplicación IMD Control iniciada');
-    setupEventListeners();
+# API para guardar varios cambios de historial en una sola petición
+@app.route('/api/save-history/batch', methods=['POST'])
+def save_history_batch():
+    try:
+        data = request.get_json()
+        records = data.get('records') if isinstance(data, dict) else None
+        if not isinstance(records, list) or not records:
+            return jsonify({'success': False, 'error': 'Lista de registros requerida'})
 
-    updateDateTimeDisplay();
-    setInterval(updateDateTimeDisplay, 1000);
+        max_records = ProductionConfig.HISTORY_SPOOL_CONFIG['max_request_records']
+        if len(records) > max_records:
+            return jsonify({'success': False, 'error': f'Máximo {max_records} registros por petición'})
 
-    // Event listener para el selector de línea
-    const lineSelector = document.getElementById('line-selector');
-    if (lineSelector) {
-        lineSelector.addEventListener('change', function(e) {
-            selectedLine = e.target.value;
-            console.log(`Línea seleccionada: ${selectedLine}`);
-            
-            // Limpiar estados si se cambia la línea
-            if (selectedLine) {
-                clearAllMachineStates();
+        # Llaves inválidas son un error del cliente: se rechaza la petición completa antes de encolar
+        for index, payload in enumerate(records):
+            key_error = validate_idempotency_key(payload.get('idempotency_key') if isinstance(payload, dict) else None)
+            if key_error:
+                return jsonify({'success': False, 'error': f'Registro {index}: {key_error}'}), 400
+
+        results = [None] * len(records)
+        items, positions = [], []
+        for index, payload in enumerate(records):
+            error_msg = validate_history_payload(payload)
+            if error_msg:
+                results[index] = {'index': index, 'success': False, 'error': error_msg}
+                continue
+            items.append((history_record_from_payload(payload), payload.get('idempotency_key')))
+            positions.append(index)
+
+        for index, (local_id, idempotency_key, duplicate) in zip(positions, history_spool.enqueue_many(items)):
+            results[index] = {
+                'index': index,
+                'success': True,
+                'record_id': local_id,
+                'idempotency_key': idempotency_key,
+                'sync_status': 'duplicate' if duplicate else 'pending'
             }
-        });
-    }
-    
-    // Verificar conexión con el servidor usando la URL dinámica
-    fetch(`${API_BASE_URL}/health`)
-        .then(response => response.json())
-        .then(data => {
-            console.log('Servidor conectado:', data);
+
+        logger.info(f"Lote de historial: {len(items)}/{len(records)} registros guardados en cola local")
+        return jsonify({
+            'success': all(result['success'] for result in results),
+            'accepted': len(items),
+            'results': results
         })
-        .catch(error => {
-            console.error('Error conectando con servidor:', error);
-            showModal('Error de Conexión', 
-                'No se pudo conectar con el servidor. Verifique que esté ejecutándose.', 
-                true);
-        });
-});
-  </script>
-</body>
-</html>"""
-        logo_placeholder = "IMD_LOGO_PLACEHOLDER"
-        if logo_placeholder in html_content:
-            logo_data_uri = ''
-            logo_path = os.path.join(os.path.dirname(__file__), 'ImagenLogo1.png')
-            try:
-                with open(logo_path, 'rb') as logo_file:
-                    encoded_logo = base64.b64encode(logo_file.read()).decode('utf-8')
-                    logo_data_uri = f"data:image/png;base64,{encoded_logo}"
-            except FileNotFoundError:
-                logger.error('Archivo de logo ImagenLogo1.png no encontrado')
-            except Exception as logo_error:
-                logger.error(f'Error cargando logo ImagenLogo1.png: {logo_error}')
-
-            if logo_data_uri:
-                html_content = html_content.replace(logo_placeholder, logo_data_uri)
-            else:
-                html_content = html_content.replace(logo_placeholder, '')
 
-        return html_content
     except Exception as e:
-        return f"Error cargando la aplicación: {e}", 500
+        logger.error(f"Error general en save-history/batch: {e}")
+        return jsonify({'success': False, 'error': str(e)})
 
-# API Health check
-@app.route('/api/health')
-def health_check():
-    return jsonify({
-        'status': 'OK',
-        'message': 'Servidor IMD funcionando correctamente',
-        'timestamp': datetime.now().isoformat()
-    })
+# API para consultar el avance de sincronización del historial
+@app.route('/api/save-history/status')
+def save_history_status():
+    record_id = request.args.get('record_id', type=int)
+    if record_id is not None:
+        record = history_spool.record_status(record_id)
+        if not record:
+            return jsonify({'success': False, 'error': 'Registro local no encontrado'})
+        return jsonify({'success': True, 'record': record})
+    return jsonify({'success': True, 'spool': history_spool.status()})
 
-# API para buscar información de parte
-@app.route('/api/search-part', methods=['POST'])
-def search_part():
+# =====================================================================================
+# CONSULTA DE HISTORIAL (paginación por llave sobre created_at, id)
+# =====================================================================================
+
+HISTORY_SELECT_COLUMNS = (
+    'id', 'fecha', 'hora', 'line', 'posicion_de_feeder', 'qr_almacen', 'numero_de_parte', 'spec',
+    'qr_de_proveedor', 'numero_de_lote_proveedor', 'polaridad', 'persona', 'created_at'
+)
+
+# Filtro de la petición -> columna con igualdad exacta (line, numero_de_parte con índice propio)
+HISTORY_FILTERS = {
+    'line': 'line',
+    'part': 'numero_de_parte',
+    'lot': 'numero_de_lote_proveedor',
+    'persona': 'persona',
+}
+
+ER_QUERY_TIMEOUT = 3024   # MAX_EXECUTION_TIME agotado
+ER_QUERY_INTERRUPTED = 1317
+
+
+class HistoryQueryError(ValueError):
+    """Parámetros inválidos en la consulta de historial"""
+
+
+def encode_history_cursor(created_at, record_id):
+    raw = f"{created_at.isoformat(sep=' ')}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_history_cursor(token):
     try:
-        data = request.get_json()
-        qr_almacen = data.get('qr_almacen', '').strip()
-        machine = data.get('machine', '').strip()
-        line = data.get('line', '').strip()
+        created_at, record_id = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, UnicodeError) as e:
+        raise HistoryQueryError('Cursor de paginación inválido') from e
+
+
+def parse_history_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError as e:
+        raise HistoryQueryError(f'{name} debe tener formato AAAA-MM-DD') from e
+
+
+def history_filter_clauses(args):
+    """Condiciones WHERE y parámetros de los filtros comunes a consulta y exportación"""
+    clauses, params = [], []
+    for name, column in HISTORY_FILTERS.items():
+        value = (args.get(name) or '').strip()
+        if value:
+            clauses.append(f"{column} = %s")
+            params.append(value)
+
+    # Rango de fechas sobre created_at: mismo índice que el orden de la paginación
+    date_from = (args.get('date_from') or '').strip()
+    date_to = (args.get('date_to') or '').strip()
+    if date_from:
+        clauses.append("created_at >= %s")
+        params.append(parse_history_date(date_from, 'date_from'))
+    if date_to:
+        clauses.append("created_at < %s")
+        params.append(parse_history_date(date_to, 'date_to') + timedelta(days=1))
+    if date_from and date_to and params[-2] >= params[-1]:
+        raise HistoryQueryError('date_from debe ser anterior o igual a date_to')
+    return clauses, params
+
 
-        if not qr_almacen:
-            return jsonify({'success': False, 'error': 'QR almacén requerido'})
+def build_history_query(args):
+    """Consulta parametrizada y tamaño de página a partir de los argumentos de /api/history"""
+    config = ProductionConfig.HISTORY_QUERY_CONFIG
+    try:
+        page_size = int(args.get('limit') or config['default_page_size'])
+    except ValueError as e:
+        raise HistoryQueryError('limit debe ser un número entero') from e
+    page_size = max(1, min(page_size, config['max_page_size']))
 
-        if not line:
-            return jsonify({'success': False, 'error': 'Línea de producción requerida'})
+    clauses, params = history_filter_clauses(args)
+    cursor_token = (args.get('cursor') or '').strip()
+    if cursor_token:
+        created_at, record_id = decode_history_cursor(cursor_token)
+        # Forma expandida de (created_at, id) < (%s, %s): MySQL la resuelve como rango sobre el índice
+        clauses.append("(created_at < %s OR (created_at = %s AND id < %s))")
+        params.extend((created_at, created_at, record_id))
 
-        # Extraer número de parte del QR almacén
-        separators = [',', "'", '_', '-']
-        part_number = qr_almacen
-        for sep in separators:
-            if sep in qr_almacen:
-                part_number = qr_almacen.split(sep)[0]
-                break
-        # Normalizar valores para comparación
-        part_number = part_number.strip()
-        machine_norm = machine.strip().upper()
-        line_norm = line.strip().upper()
+    query = (
+        f"SELECT /*+ MAX_EXECUTION_TIME({int(config['max_execution_ms'])}) */ "
+        f"{', '.join(HISTORY_SELECT_COLUMNS)} FROM historial_cambio_material_imd"
+        + (f" WHERE {' AND '.join(clauses)}" if clauses else '')
+        + " ORDER BY created_at DESC, id DESC LIMIT %s"
+    )
+    # Una fila extra indica si existe una página siguiente
+    params.append(page_size + 1)
+    return query, tuple(params), page_size
 
-        # Buscar en base de datos
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'error': 'Error de conexión a base de datos'})
 
+def format_history_value(value):
+    """Valor de una columna de historial como texto/JSON (TIME llega como timedelta)"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, timedelta):
+        total = int(value.total_seconds())
+        return f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}"
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def history_row_to_dict(row):
+    """Fila de HISTORY_SELECT_COLUMNS serializable"""
+    return {column: format_history_value(value) for column, value in zip(HISTORY_SELECT_COLUMNS, row)}
+
+
+def query_history_page(args):
+    """Una página del historial, del más reciente al más antiguo"""
+    query, params, page_size = build_history_query(args)
+    connection = get_db_connection()
+    if not connection:
+        raise DatabaseUnavailableError('Error de conexión a base de datos')
+    with connection:
         cursor = connection.cursor(buffered=True)
-        # no_part: número de parte, machine: máquina, feeder: posición (sin prefijo)
-        # Construimos posicion_de_feeder como machine + '_' + feeder para mantener compatibilidad con la UI
-        query = """
-        SELECT no_part, spec, CONCAT(machine, '_', feeder) AS posicion_de_feeder, polarity
-        FROM imd_feeders_location_data
-        WHERE UPPER(no_part) = UPPER(%s) AND UPPER(machine) = %s AND UPPER(line) = %s
-        LIMIT 1
-        """
-        cursor.execute(query, (part_number, machine_norm, line_norm))
-        result = cursor.fetchone()
-        
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
         cursor.close()
-        connection.close()
-        
-        if result:
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more:
+        last = dict(zip(HISTORY_SELECT_COLUMNS, rows[-1]))
+        created_at = last['created_at']
+        if not isinstance(created_at, datetime):
+            created_at = datetime.fromisoformat(str(created_at))
+        next_cursor = encode_history_cursor(created_at, last['id'])
+    return {
+        'records': [history_row_to_dict(row) for row in rows],
+        'page_size': page_size,
+        'next_cursor': next_cursor,
+    }
+
+
+# API para consultar el historial con filtros y paginación por llave
+@app.route('/api/history')
+def history_query():
+    try:
+        return jsonify({'success': True, **query_history_page(request.args)})
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except DatabaseUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except mysql_connector.Error as db_error:
+        if db_error.errno in (ER_QUERY_TIMEOUT, ER_QUERY_INTERRUPTED):
+            budget = ProductionConfig.HISTORY_QUERY_CONFIG['max_execution_ms']
+            logger.warning(f"Consulta de historial cancelada por presupuesto ({budget} ms): {dict(request.args)}")
             return jsonify({
-                'success': True,
-                'part_number': part_number,
-                'data': {
-                    'numero_de_parte': result[0],
-                    'spec': result[1],
-                    'posicion_de_feeder': result[2],
-                    'polarity': result[3]
-                }
+                'success': False,
+                'error': f'La consulta excedió {budget} ms; agregue filtros o acote el rango de fechas'
             })
-        else:
-            return jsonify({'success': False, 'error': 'Número de parte no encontrado'})
-            
+        logger.error(f"Error MySQL en history: {db_error}")
+        return jsonify({'success': False, 'error': str(db_error)})
     except Exception as e:
-        print(f"[ERROR] Error en search-part: {e}")
+        logger.error(f"Error en history: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
-# API para validar feeder
-@app.route('/api/validate-feeder', methods=['POST'])
-def validate_feeder():
+# Exportación: se transmite mientras se lee, sin cargar el resultado completo en memoria
+HISTORY_EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),  # Flask agrega charset=utf-8
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+_export_slots = threading.BoundedSemaphore(ProductionConfig.HISTORY_QUERY_CONFIG['max_concurrent_exports'])
+
+
+class HistoryExport:
+    """Consulta de exportación abierta con un cursor sin búfer; se recorre en bloques de fetchmany"""
+
+    def __init__(self, args, export_format):
+        self.format = export_format
+        self.rows_sent = 0
+        self.completed = False
+        self._closed = False
+        clauses, params = history_filter_clauses(args)
+        # Sin MAX_EXECUTION_TIME: con un cursor sin búfer la consulta dura lo que dura la transmisión
+        query = (
+            f"SELECT {', '.join(HISTORY_SELECT_COLUMNS)} FROM historial_cambio_material_imd"
+            + (f" WHERE {' AND '.join(clauses)}" if clauses else '')
+            + " ORDER BY created_at, id"
+        )
+        self.connection = get_db_connection()
+        if not self.connection:
+            raise DatabaseUnavailableError('Error de conexión a base de datos')
+        try:
+            self.cursor = self.connection.cursor(buffered=False)
+            self.cursor.execute(
+                "SET SESSION net_write_timeout = %s",
+                (ProductionConfig.HISTORY_QUERY_CONFIG['export_net_write_timeout'],)
+            )
+            self.cursor.execute(query, tuple(params))
+        except Exception:
+            # Puede haber quedado con net_write_timeout modificado: no regresa al pool
+            self.connection.invalidate()
+            raise
+
+    def chunks(self):
+        chunk_size = ProductionConfig.HISTORY_QUERY_CONFIG['export_chunk_size']
+        while True:
+            rows = self.cursor.fetchmany(chunk_size)
+            if not rows:
+                self.completed = True
+                return
+            self.rows_sent += len(rows)
+            yield rows
+
+    def close(self):
+        """Una exportación interrumpida deja filas sin leer: la conexión se descarta en vez de volver al pool"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.completed:
+                self.cursor.close()
+                self._release_connection()
+            else:
+                self.connection.invalidate()
+        finally:
+            _export_slots.release()
+        logger.info(
+            f"Exportación {self.format.upper()} de historial: {self.rows_sent} filas"
+            f"{'' if self.completed else ' (interrumpida)'}"
+        )
+
+    def _release_connection(self):
+        """Restaura net_write_timeout de la sesión antes de regresar la conexión al pool"""
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+            cursor.close()
+        except mysql_connector.Error as db_error:
+            logger.warning(f"No se pudo restaurar la sesión tras exportar; se descarta la conexión: {db_error}")
+            self.connection.invalidate()
+            return
+        self.connection.close()
+
+
+def stream_history_csv(export):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HISTORY_SELECT_COLUMNS)
+    yield '\ufeff' + buffer.getvalue()  # BOM para que Excel detecte UTF-8
+    for rows in export.chunks():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([format_history_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+    export.close()
+
+
+def stream_history_xlsx(export):
+    """Libro en modo write_only (filas directo a disco); se transmite al terminar porque XLSX es un ZIP"""
+    with tempfile.TemporaryFile() as output:
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('historial')
+        sheet.append(HISTORY_SELECT_COLUMNS)
+        for rows in export.chunks():
+            for row in rows:
+                sheet.append(row)
+        workbook.save(output)
+        export.close()  # La conexión vuelve al pool antes de enviar el archivo
+        output.seek(0)
+        while True:
+            block = output.read(64 * 1024)
+            if not block:
+                return
+            yield block
+
+
+# API para exportar historial (mismos filtros que /api/history) en CSV o XLSX
+@app.route('/api/history/export')
+def history_export():
+    export_format = (request.args.get('format') or 'csv').lower()
+    if export_format not in HISTORY_EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Formato no soportado: {export_format} (csv o xlsx)"})
+    if export_format == 'xlsx':
+        try:
+            openpyxl.load()
+        except ImportError:
+            return jsonify({'success': False, 'error': 'La exportación XLSX requiere openpyxl instalado'})
+
+    if not _export_slots.acquire(blocking=False):
+        return jsonify({'success': False, 'error': 'Ya hay una exportación en curso; intente más tarde'})
     try:
-        data = request.get_json()
-        part_number = data.get('part_number', '').strip()
-        feeder_scanned = data.get('feeder_scanned', '').strip()
-        machine = data.get('machine', '').strip()
-        line = data.get('line', '').strip()
-        machine_norm = machine.upper()
-        line_norm = line.upper()
-        
-        if not all([part_number, feeder_scanned, machine, line]):
-            return jsonify({'success': False, 'error': 'Datos incompletos (part_number, feeder_scanned, machine, line requeridos)'})
-        
-        # Buscar feeder esperado considerando máquina y línea
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'error': 'Error de conexión a base de datos'})
-        
-        cursor = connection.cursor(buffered=True)
-        # Buscar en la tabla considerando máquina, línea y número de parte
-        query = """
-        SELECT feeder, polarity
-        FROM imd_feeders_location_data
-        WHERE UPPER(no_part) = UPPER(%s) AND UPPER(machine) = %s AND UPPER(line) = %s
-        LIMIT 1
-        """
-        cursor.execute(query, (part_number, machine_norm, line_norm))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        if result:
-            expected_feeder = str(result[0])  # feeder puro en DB
-            expected_polarity = result[1]     # polaridad esperada
-            is_valid = expected_feeder.upper() == feeder_scanned.upper()
-            return jsonify({
-                'success': True,
-                'is_valid': is_valid,
-                'expected_feeder': expected_feeder,
-                'scanned_feeder': feeder_scanned,
-                'expected_polarity': expected_polarity
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Configuración de feeder no encontrada'})
-            
+        export = HistoryExport(request.args, export_format)
+    except (HistoryQueryError, DatabaseUnavailableError) as e:
+        _export_slots.release()
+        return jsonify({'success': False, 'error': str(e)})
     except Exception as e:
-        print(f"[ERROR] Error en validate-feeder: {e}")
+        _export_slots.release()
+        logger.error(f"Error en history/export: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
-# API para validar polaridad
-@app.route('/api/validate-polarity', methods=['POST'])
-def validate_polarity():
+    mimetype, extension = HISTORY_EXPORT_FORMATS[export_format]
+    stream = stream_history_csv if export_format == 'csv' else stream_history_xlsx
+    filename = f"historial_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    response = Response(
+        stream(export),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'}
+    )
+    # También si el cliente se desconecta antes de terminar (o antes de empezar) la transmisión
+    response.call_on_close(export.close)
+    return response
+
+# API de trazabilidad: dónde y cuándo estuvo cargado un lote de proveedor
+@app.route('/api/trace/lot/<path:lot>')
+def trace_lot_endpoint(lot):
+    lot = lot.strip()
+    if not lot:
+        return jsonify({'success': False, 'error': 'Lote requerido'})
     try:
-        data = request.get_json()
-        part_number = data.get('part_number', '').strip()
-        polarity_scanned = data.get('polarity_scanned', '').strip()
-        machine = data.get('machine', '').strip()
-        line = data.get('line', '').strip()
-        machine_norm = machine.upper()
-        line_norm = line.upper()
-        
-        if not all([part_number, polarity_scanned, machine, line]):
-            return jsonify({'success': False, 'error': 'Datos incompletos (part_number, polarity_scanned, machine, line requeridos)'})
-        
-        # Buscar polaridad esperada
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'error': 'Error de conexión a base de datos'})
-        
-        cursor = connection.cursor(buffered=True)
-        query = """
-        SELECT polarity
-        FROM imd_feeders_location_data
-        WHERE UPPER(no_part) = UPPER(%s) AND UPPER(machine) = %s AND UPPER(line) = %s
-        LIMIT 1
-        """
-        cursor.execute(query, (part_number, machine_norm, line_norm))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        if result:
-            expected_polarity = result[0]
-            if expected_polarity is None:
-                is_valid = True
-            else:
-                is_valid = str(expected_polarity).upper() == polarity_scanned.upper()
-            return jsonify({
-                'success': True,
-                'is_valid': is_valid,
-                'expected_polarity': expected_polarity,
-                'scanned_polarity': polarity_scanned
-            })
-        else:
-            return jsonify({'success': False, 'error': 'Configuración de polaridad no encontrada'})
-            
+        return jsonify({'success': True, **trace_lot(lot)})
     except Exception as e:
-        print(f"[ERROR] Error en validate-polarity: {e}")
+        logger.error(f"Error en trace/lot: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
-# API para guardar en historial
-@app.route('/api/save-history', methods=['POST'])
-def save_history():
+# API de estado actual: qué parte y lote tiene cada posición de la línea (una lectura por llave primaria)
+@app.route('/api/lines/<line>/state')
+def line_state_endpoint(line):
+    line = line.strip()
+    if not line:
+        return jsonify({'success': False, 'error': 'Línea requerida'})
     try:
-        data = request.get_json()
-        print(f"[INFO] Datos recibidos para save-history: {data}")
-        
-        # Validar datos requeridos
-        required_fields = [
-            'posicion_de_feeder', 'qr_almacen', 'numero_de_parte',
-            'qr_de_proveedor', 'numero_de_lote_proveedor', 'polaridad', 'persona', 'line'
-        ]
-        
-        for field in required_fields:
-            if not data.get(field, '').strip():
-                error_msg = f'Campo requerido: {field}'
-                print(f"[ERROR] {error_msg}")
-                return jsonify({'success': False, 'error': error_msg})
-        
-        # Guardar en base de datos
-        connection = get_db_connection()
-        if not connection:
-            error_msg = 'Error de conexión a base de datos'
-            print(f"[ERROR] {error_msg}")
-            return jsonify({'success': False, 'error': error_msg})
-        
-        try:
-            cursor = connection.cursor()
-            
-            # Verificar si la tabla existe primero
-            check_table_query = """
-            SELECT COUNT(*) FROM information_schema.tables 
-            WHERE table_schema = %s AND table_name = 'historial_cambio_material_imd'
-            """
-            cursor.execute(check_table_query, (connection.database,))
-            table_exists = cursor.fetchone()[0] > 0
-            
-            if not table_exists:
-                print("[INFO] Tabla historial_cambio_material_imd no existe, creándola...")
-                create_history_table()
-            
-            # Insertar datos
-            insert_query = """
-            INSERT INTO historial_cambio_material_imd 
-            (fecha, hora, line, posicion_de_feeder, qr_almacen, numero_de_parte, spec, qr_de_proveedor, 
-             numero_de_lote_proveedor, polaridad, persona, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            # Obtener fecha y hora actuales
-            now = datetime.now()
-            fecha_actual = now.date()
-            hora_actual = now.time()
-            
-            values = (
-                fecha_actual,
-                hora_actual,
-                data['line'],
-                data['posicion_de_feeder'],
-                data['qr_almacen'],
-                data['numero_de_parte'],
-                data.get('spec', ''),
-                data['qr_de_proveedor'],
-                data['numero_de_lote_proveedor'],
-                data['polaridad'],
-                data['persona'],
-                now
-            )
-            
-            print(f"[INFO] Ejecutando insert con valores: {values}")
-            cursor.execute(insert_query, values)
-            connection.commit()
-            
-            record_id = cursor.lastrowid
-            print(f"[SUCCESS] Registro guardado con ID: {record_id}")
-            
-            cursor.close()
-            connection.close()
-            
-            return jsonify({
-                'success': True,
-                'record_id': record_id,
-                'message': 'Registro guardado exitosamente'
-            })
-            
-        except mysql.connector.Error as db_error:
-            print(f"[ERROR] Error MySQL en save-history: {db_error}")
-            print(f"[ERROR] MySQL Error Code: {db_error.errno}")
-            print(f"[ERROR] MySQL Error Message: {db_error.msg}")
-            connection.rollback()
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'error': f'Error de base de datos: {db_error.msg}'})
-        
+        state = feeder_state.line_state(line)
+        position = request.args.get('position', '').strip()
+        if position:
+            state['positions'] = [entry for entry in state['positions'] if entry['posicion_de_feeder'] == position]
+        return jsonify({'success': True, **state})
     except Exception as e:
-        print(f"[ERROR] Error general en save-history: {e}")
-        import traceback
-        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        logger.error(f"Error en lines/state: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+# Canal de eventos en vivo (server-sent events); ?line= limita los cambios de historial a esa línea
+@app.route('/api/events')
+def events_endpoint():
+    line = request.args.get('line', '').strip() or None
+    subscription = event_broker.subscribe(line)
+    if subscription is None:
+        # Sin hilos disponibles para otro flujo: el navegador vuelve a consultar /api/health
+        return Response(
+            'Demasiados clientes de eventos', status=503, mimetype='text/plain',
+            headers={'Retry-After': str(ProductionConfig.EVENTS_CONFIG['max_stream_seconds'])}
+        )
+    try:
+        snapshot = events_snapshot()
+    except Exception:
+        event_broker.unsubscribe(subscription)
+        raise
+    response = Response(
+        event_broker.stream(subscription, snapshot),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # También si la conexión se cierra antes de empezar a transmitir
+    response.call_on_close(lambda: event_broker.unsubscribe(subscription))
+    return response
+
 def find_free_port():
     """Encuentra un puerto libre para Flask con verificación mejorada"""
     # Intentar varios puertos en rango común
@@ -1676,10 +3691,10 @@ def find_free_port():
                 s.bind(('127.0.0.1', port))
                 s.listen(1)
                 actual_port = s.getsockname()[1]
-                print(f"[SUCCESS] Puerto {actual_port} disponible")
+                logger.info(f"Puerto {actual_port} disponible")
                 return actual_port
         except OSError:
-            print(f"[WARNING] Puerto {port} ocupado, probando siguiente...")
+            logger.warning(f"Puerto {port} ocupado, probando siguiente...")
             continue
     
     # Si no hay puertos preferidos disponibles, usar puerto aleatorio
@@ -1688,32 +3703,176 @@ def find_free_port():
             s.bind(('127.0.0.1', 0))
             s.listen(1)
             port = s.getsockname()[1]
-            print(f"[SUCCESS] Puerto aleatorio {port} asignado")
+            logger.info(f"Puerto aleatorio {port} asignado")
             return port
     except Exception as e:
-        print(f"[ERROR] Error encontrando puerto libre: {e}")
         logger.error(f"Error encontrando puerto libre: {e}")
         return 5000  # Puerto por defecto como último recurso
 
-def start_flask_server(port):
+# =====================================================================================
+# SERVIDOR WSGI
+# =====================================================================================
+
+class WaitressServer:
+    """Servidor de producción con hilos fijos, límite de conexiones y keep-alive"""
+
+    name = 'waitress'
+
+    def __init__(self, host, port, config):
+        from waitress.server import create_server
+        self._server = create_server(
+            app,
+            host=host,
+            port=port,
+            threads=config['threads'],
+            connection_limit=config['connection_limit'],
+            channel_timeout=config['channel_timeout'],
+            backlog=config['backlog'],
+            ident=ProductionConfig.APP_NAME,
+        )
+        self._closing = False
+
+    def serve_forever(self):
+        try:
+            self._server.run()
+        except OSError:
+            # close() desde otro hilo puede cerrar el socket que select() estaba esperando
+            if not self._closing:
+                raise
+
+    def shutdown(self):
+        # Solo API pública: espera las peticiones en curso y deja de escuchar. run() termina cuando
+        # los clientes cierran sus conexiones keep-alive; run_headless no espera más de shutdown_timeout
+        self._closing = True
+        self._server.task_dispatcher.shutdown()
+        self._server.close()
+
+
+class WerkzeugServer:
+    """Respaldo sin dependencias extra: un hilo por conexión, con keep-alive HTTP/1.1"""
+
+    name = 'werkzeug'
+
+    def __init__(self, host, port, config):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class KeepAliveRequestHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            timeout = config['channel_timeout']
+
+        self._server = make_server(host, port, app, threaded=True, request_handler=KeepAliveRequestHandler)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+
+def create_wsgi_server(host, port, config=None):
+    """Crea y enlaza el servidor indicado en SERVER_CONFIG['backend']"""
+    config = config or ProductionConfig.SERVER_CONFIG
+    if config.get('backend') == 'waitress':
+        try:
+            return WaitressServer(host, port, config)
+        except ImportError:
+            logger.warning("waitress no está instalado; usando el servidor de Werkzeug")
+    return WerkzeugServer(host, port, config)
+
+
+# =====================================================================================
+# ARRANQUE POR ETAPAS
+# =====================================================================================
+
+# La ventana se abre en cuanto el servidor escucha; la base de datos se conecta en segundo plano
+startup_state = {
+    'server_backend': None,
+    'server_ready_ms': None,
+    'db': 'pending',          # 'pending', 'connected' u 'offline'
+    'db_ready_ms': None,
+    'first_paint_ms': None,
+    'error': None,
+}
+server_ready = threading.Event()
+http_server = None
+_startup_stop = threading.Event()
+
+
+def set_db_status(status):
+    """Actualiza startup_state['db'] y avisa a los clientes de /api/events solo si cambió"""
+    if startup_state['db'] == status:
+        return
+    startup_state['db'] = status
+    event_broker.publish('db', {'db': status})
+
+
+def note_db_reachable(reachable):
+    """Cambios de conectividad después del arranque (antes, la etapa de base de datos decide el estado)"""
+    if startup_state['db_ready_ms'] is not None:
+        set_db_status('connected' if reachable else 'offline')
+
+
+def elapsed_since_start_ms():
+    return round((time.time() - PROCESS_STARTED_AT) * 1000)
+
+
+def connect_database_stage():
+    """Prueba la conexión, ejecuta migraciones y carga la caché; True si MySQL respondió"""
+    test_connection = get_db_connection()
+    if test_connection is None:
+        return False
+    test_connection.close()
+    # Migraciones de esquema (tabla de historial, índices); se ejecutan una sola vez
+    run_schema_migrations()
+    if ProductionConfig.FEEDER_CACHE_CONFIG['enabled']:
+        feeder_cache.load()
+    startup_state['db_ready_ms'] = elapsed_since_start_ms()
+    set_db_status('connected')
+    logger.info(f"Base de datos lista a los {startup_state['db_ready_ms']} ms del arranque")
+    return True
+
+
+def background_startup():
+    """Etapa de datos: réplica local primero, luego MySQL con reintentos hasta que responda"""
+    if ProductionConfig.FEEDER_CACHE_CONFIG['enabled']:
+        # Las validaciones funcionan con la réplica mientras MySQL responde
+        feeder_cache.load_from_replica()
+
+    logger.info("Verificando conexión a base de datos...")
+    retry_interval = ProductionConfig.STARTUP_CONFIG['db_retry_interval']
+    while not _startup_stop.is_set():
+        try:
+            if connect_database_stage():
+                break
+        except Exception as e:
+            logger.error(f"Error en la etapa de base de datos: {e}")
+        if startup_state['db'] == 'pending':
+            # Modo sin conexión: validaciones desde la réplica local e historial en la cola local
+            set_db_status('offline')
+            logger.warning("No se pudo conectar a la base de datos al iniciar; modo sin conexión")
+        if _startup_stop.wait(retry_interval):
+            return
+
+    if ProductionConfig.FEEDER_CACHE_CONFIG['enabled']:
+        feeder_cache.start_refresher()
+
+
+def start_background_startup():
+    thread = threading.Thread(target=background_startup, daemon=True, name="StartupDatabaseThread")
+    thread.start()
+    return thread
+
+
+def start_flask_server(port, host=None):
     """Inicia el servidor Flask en un thread separado con manejo robusto de errores"""
+    global http_server
+    host = host or ProductionConfig.FLASK_HOST
     try:
         logger.info(f"Iniciando servidor Flask en puerto {port}...")
-        print(f"[INFO] Iniciando servidor Flask en puerto {port}...")
         
-        # Verificar conexión a base de datos antes de iniciar servidor
-        print("[INFO] Verificando conexión a base de datos...")
-        test_connection = get_db_connection()
-        if test_connection:
-            test_connection.close()
-            print("[SUCCESS] Conexión a base de datos verificada")
-        else:
-            print("[ERROR] No se pudo conectar a la base de datos")
-            logger.error("No se pudo conectar a la base de datos al iniciar")
-            return
-        
-        # Crear tabla de historial si no existe
-        create_history_table()
+        # La cola local acepta registros aunque la base de datos no responda
+        history_spool.start()
+        metrics_logger.start()
         
         # Configurar Flask para modo de producción
         app.config['DEBUG'] = False
@@ -1725,72 +3884,40 @@ def start_flask_server(port):
         werkzeug_logger = flask_logging.getLogger('werkzeug')
         werkzeug_logger.setLevel(flask_logging.ERROR)
         
-        # Ejecutar servidor Flask con configuración robusta
-        logger.info(f"Servidor Flask iniciado en http://{ProductionConfig.FLASK_HOST}:{port}")
-        print(f"[SUCCESS] Servidor Flask listo en http://{ProductionConfig.FLASK_HOST}:{port}")
+        # El servidor abre el socket al crearse: en ese momento ya se puede abrir la ventana
+        http_server = create_wsgi_server(host, port)
         
-        app.run(
-            host=ProductionConfig.FLASK_HOST, 
-            port=port, 
-            debug=False, 
-            use_reloader=False, 
-            threaded=True,
-            processes=1
-        )
+        startup_state['server_backend'] = http_server.name
+        startup_state['server_ready_ms'] = elapsed_since_start_ms()
+        logger.info(f"Servidor Flask ({http_server.name}) iniciado en http://{host}:{port} "
+                    f"({startup_state['server_ready_ms']} ms)")
+        server_ready.set()
+        
+        http_server.serve_forever()
         
     except Exception as e:
         error_msg = f"Error crítico iniciando servidor Flask: {e}"
-        logger.error(error_msg)
-        print(f"[ERROR] {error_msg}")
-        import traceback
-        traceback.print_exc()
+        startup_state['error'] = str(e)
+        server_ready.set()  # Despierta a quien espera para que reporte el error
+        logger.exception(error_msg)
         raise
 
-def wait_for_flask_server(url, max_attempts=30, delay=1):
-    """Espera a que el servidor Flask esté disponible con verificación robusta"""
-    import requests
-    
-    print(f"[INFO] Esperando que el servidor Flask esté disponible en {url}...")
-    
-    for attempt in range(max_attempts):
-        try:
-            # Verificar endpoint de salud
-            health_url = f"{url}/api/health"
-            response = requests.get(health_url, timeout=3)
-            
-            if response.status_code == 200:
-                logger.info(f"Servidor Flask disponible en intento {attempt + 1}")
-                print(f"[SUCCESS] Servidor Flask respondiendo correctamente")
-                
-                # Verificar también conexión a base de datos
-                try:
-                    test_db_url = f"{url}/api/health"
-                    db_response = requests.get(test_db_url, timeout=3)
-                    if db_response.status_code == 200:
-                        print("[SUCCESS] Servidor y base de datos funcionando correctamente")
-                        return True
-                except:
-                    pass
-                
-                return True
-                
-        except requests.exceptions.RequestException as e:
-            if attempt < 5:  # Solo mostrar errores en los primeros intentos
-                print(f"[INFO] Esperando servidor... intento {attempt + 1}/{max_attempts}")
-            pass
-        except Exception as e:
-            if attempt < 5:
-                print(f"[WARNING] Error verificando servidor: {e}")
-            pass
-        
-        time.sleep(delay)
+def wait_for_flask_server(timeout=None):
+    """Espera la señal del servidor (sin sondear /api/health); True si quedó escuchando"""
+    if timeout is None:
+        timeout = ProductionConfig.STARTUP_CONFIG['server_timeout']
+    logger.info("Esperando que el servidor Flask esté disponible...")
     
-    print(f"[ERROR] Servidor Flask no disponible después de {max_attempts} intentos")
-    logger.error(f"Servidor Flask no disponible después de {max_attempts} intentos")
-    return False
+    if not server_ready.wait(timeout):
+        logger.error(f"Servidor Flask no disponible después de {timeout} s")
+        return False
+    if startup_state['error']:
+        logger.error(f"El servidor Flask falló al iniciar: {startup_state['error']}")
+        return False
+    return True
 
-def main():
-    """Función principal de la aplicación"""
+def run_desktop():
+    """Modo escritorio: servidor local en un puerto libre y ventana de pywebview"""
     try:
         logger.info(f"Iniciando {ProductionConfig.APP_NAME} v{ProductionConfig.APP_VERSION}...")
         logger.info(f"PC: {socket.gethostname()}")
@@ -1809,9 +3936,15 @@ def main():
         )
         flask_thread.start()
         
-        # Esperar a que Flask se inicie con verificación de salud
+        # Conexión a base de datos, migraciones y caché en paralelo con el servidor y la ventana
+        start_background_startup()
+        
+        # webview es la importación más pesada; se carga mientras el servidor arranca
+        import webview
+        
+        # Esperar a que Flask escuche; la ventana no espera a la base de datos
         logger.info("Esperando que el servidor Flask se inicie...")
-        if not wait_for_flask_server(flask_url):
+        if not wait_for_flask_server():
             logger.error("El servidor Flask no pudo iniciarse correctamente")
             return
         
@@ -1881,12 +4014,89 @@ def main():
                 raise
         
     except Exception as e:
-        logger.error(f"Error iniciando la aplicación: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Error iniciando la aplicación: {e}")
         sys.exit(1)
     finally:
-        logger.info("Aplicación finalizando...")
+        stop_services()
+
+
+shutdown_requested = threading.Event()
+
+
+def request_shutdown(signum=None, frame=None):
+    """Manejador de SIGTERM/SIGINT: solo marca la solicitud, el hilo principal hace el cierre"""
+    shutdown_requested.set()
+
+
+def stop_services(timeout=None):
+    """Detiene los hilos de fondo y cierra las conexiones del pool"""
+    _startup_stop.set()
+    event_broker.close()
+    metrics_logger.stop()
+    history_spool.stop(timeout)
+    feeder_cache.stop()
+    db_pool.close_all()
+    logger.info("Aplicación finalizando...")
+
+
+def run_headless(host=None, port=None):
+    """Modo servidor: solo el backend en una dirección fija, para que varias estaciones abran la URL"""
+    config = ProductionConfig.HEADLESS_CONFIG
+    host = host or config['host']
+    port = port or config['port']
+    try:
+        logger.info(f"Iniciando {ProductionConfig.APP_NAME} v{ProductionConfig.APP_VERSION} en modo servidor...")
+        
+        for signum in (signal.SIGTERM, signal.SIGINT, getattr(signal, 'SIGBREAK', None)):
+            if signum is not None:
+                signal.signal(signum, request_shutdown)
+        
+        server_thread = threading.Thread(
+            target=start_flask_server,
+            args=(port, host),
+            daemon=True,
+            name="FlaskServerThread"
+        )
+        server_thread.start()
+        start_background_startup()
+        
+        if not wait_for_flask_server():
+            logger.error("El servidor Flask no pudo iniciarse correctamente")
+            return 1
+        
+        logger.info(f"Modo servidor escuchando en {host}:{port}; abra http://{socket.gethostname()}:{port} en cada estación")
+        
+        # Espera con intervalo para que las señales se atiendan también en Windows
+        while not shutdown_requested.wait(1):
+            if not server_thread.is_alive():
+                logger.error("El servidor Flask se detuvo inesperadamente")
+                return 1
+        
+        logger.info("Señal de cierre recibida; deteniendo servidor")
+        # Los flujos de /api/events terminan antes de esperar a las peticiones en curso
+        event_broker.close()
+        http_server.shutdown()
+        server_thread.join(config['shutdown_timeout'])
+        return 0
+    finally:
+        stop_services(config['shutdown_timeout'])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=f"{ProductionConfig.APP_NAME} v{ProductionConfig.APP_VERSION}")
+    parser.add_argument('--headless', '--serve', dest='headless', action='store_true',
+                        help='Solo el servidor (sin ventana) para que las estaciones abran la URL')
+    parser.add_argument('--host', help=f"Dirección de escucha en modo servidor (por defecto {ProductionConfig.HEADLESS_CONFIG['host']})")
+    parser.add_argument('--port', type=int, help=f"Puerto en modo servidor (por defecto {ProductionConfig.HEADLESS_CONFIG['port']})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Función principal de la aplicación"""
+    args = parse_args(argv)
+    if args.headless:
+        sys.exit(run_headless(args.host, args.port))
+    run_desktop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,1116 @@
+// app.js - Lógica para el control de cambios de material IMD con URL dinámica
+const API_BASE_URL = window.location.origin + '/api';
+
+// Variables globales para cada máquina
+let selectedLine = ''; // Variable global para la línea seleccionada
+
+const machineStates = {
+    axial: {
+        machine: 'AXIAL',
+        qrAlmacen: '',
+        qrProveedor: '',
+        loteProveedor: '',
+        feeder: '',
+        polaridad: '',
+        persona: '',
+        partNumber: '',
+        spec: '',
+        dbPolarity: '',
+        expectedFeeder: '',
+        expectedPolarity: '',
+        feederValid: false,
+        polarityValid: false,
+        allDataReady: false,
+        saveKey: ''
+    },
+    radial: {
+        machine: 'RADIAL',
+        qrAlmacen: '',
+        qrProveedor: '',
+        loteProveedor: '',
+        feeder: '',
+        polaridad: '',
+        persona: '',
+        partNumber: '',
+        spec: '',
+        dbPolarity: '',
+        expectedFeeder: '',
+        expectedPolarity: '',
+        feederValid: false,
+        polarityValid: false,
+        allDataReady: false,
+        saveKey: ''
+    }
+};
+
+function updateDateTimeDisplay() {
+    const datetimeElement = document.getElementById('current-datetime');
+    if (!datetimeElement) {
+        return;
+    }
+
+    const now = new Date();
+    const dateFormatter = new Intl.DateTimeFormat('es-MX', {
+        day: '2-digit',
+        month: '2-digit',
+        year: 'numeric'
+    });
+    const timeFormatter = new Intl.DateTimeFormat('es-MX', {
+        hour: '2-digit',
+        minute: '2-digit',
+        second: '2-digit',
+        hour12: false
+    });
+
+    const formattedDate = dateFormatter.format(now);
+    const formattedTime = timeFormatter.format(now);
+    datetimeElement.textContent = `${formattedDate} | ${formattedTime}`;
+}
+
+// Función para mostrar modal con mensaje
+function showModal(title, message, isError = false, autoClose = false) {
+    const modal = new bootstrap.Modal(document.getElementById('messageModal'));
+    const titleElement = document.getElementById('messageModalLabel');
+    const bodyElement = document.getElementById('messageModalBody');
+    const closeButton = document.querySelector('#messageModal .btn-close');
+    const footerButton = document.querySelector('#messageModal .modal-footer .btn');
+    
+    titleElement.textContent = title;
+    bodyElement.innerHTML = message;
+    
+    // Cambiar color según el tipo de mensaje
+    const modalContent = document.querySelector('#messageModal .modal-content');
+    if (isError) {
+        modalContent.style.borderColor = '#dc3545';
+        titleElement.style.color = '#ff6b6b';
+    } else {
+        modalContent.style.borderColor = '#28a745';
+        titleElement.style.color = '#51cf66';
+    }
+    
+    // Controlar visibilidad de botones según autoClose
+    if (autoClose) {
+        closeButton.style.display = 'none';
+        footerButton.style.display = 'none';
+    } else {
+        closeButton.style.display = 'block';
+        footerButton.style.display = 'block';
+    }
+    
+    modal.show();
+    
+    // Auto cerrar después de 2 segundos si autoClose es true
+    if (autoClose) {
+        setTimeout(() => {
+            modal.hide();
+        }, 2000);
+    }
+}
+
+// Función para extraer número de parte del QR almacén
+// Gramáticas QR compartidas con el servidor (/api/qr-grammars); mismo orden de prioridad
+let qrGrammars = null;
+
+function loadQrGrammars() {
+    return fetch(`${API_BASE_URL}/qr-grammars`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                qrGrammars = data.grammars.map(grammar => ({
+                    name: grammar.name,
+                    marker: grammar.marker,
+                    regex: new RegExp(`^(?:${grammar.pattern})$`, 's')
+                }));
+            }
+        })
+        .catch(error => console.warn('No se pudieron cargar las gramáticas QR:', error));
+}
+
+function parseQr(qrAlmacen) {
+    for (const grammar of qrGrammars || []) {
+        if (grammar.marker && !qrAlmacen.includes(grammar.marker)) continue;
+        const match = grammar.regex.exec(qrAlmacen);
+        if (match) {
+            const groups = match.groups || {};
+            return {
+                grammar: grammar.name,
+                part: (groups.part || '').trim(),
+                lot: (groups.lot || '').trim() || null,
+                qty: groups.qty ? parseInt(groups.qty, 10) : null
+            };
+        }
+    }
+    return null;
+}
+
+function extractPartNumber(qrAlmacen) {
+    if (!qrAlmacen) return null;
+
+    const parsed = parseQr(qrAlmacen);
+    if (parsed) return parsed.part;
+
+    // Respaldo mientras cargan las gramáticas: tomar todo lo anterior al primer separador
+    const separators = [',', "'", '_', '-'];
+    for (const sep of separators) {
+        const index = qrAlmacen.indexOf(sep);
+        if (index !== -1) {
+            return qrAlmacen.substring(0, index).trim();
+        }
+    }
+    
+    return qrAlmacen.trim();
+}
+
+// Respuestas GET con ETag ya recibidas: endpoint -> { etag, expires, body }
+const apiMemo = new Map();
+const API_MEMO_LIMIT = 200;
+
+function memoizeResponse(endpoint, response, body) {
+    const etag = response.headers.get('ETag');
+    if (!etag) {
+        apiMemo.delete(endpoint);
+        return;
+    }
+    const maxAge = /max-age=(\d+)/.exec(response.headers.get('Cache-Control') || '');
+    apiMemo.delete(endpoint);
+    apiMemo.set(endpoint, { etag, expires: Date.now() + (maxAge ? Number(maxAge[1]) * 1000 : 0), body });
+    if (apiMemo.size > API_MEMO_LIMIT) {
+        apiMemo.delete(apiMemo.keys().next().value);
+    }
+}
+
+// GET idénticos en curso: endpoint -> { controller, waiters, promise }
+const apiInflight = new Map();
+
+function abortError() {
+    return new DOMException('Petición cancelada', 'AbortError');
+}
+
+// GET con memoización: dentro de max-age se responde localmente, después se revalida con If-None-Match
+async function fetchGet(endpoint, signal) {
+    const options = { method: 'GET', headers: { 'Content-Type': 'application/json' }, signal };
+    const memo = apiMemo.get(endpoint);
+    if (memo) {
+        options.headers['If-None-Match'] = memo.etag;
+        options.cache = 'no-store';
+    }
+
+    const response = await fetch(`${API_BASE_URL}${endpoint}`, options);
+
+    if (memo && response.status === 304) {
+        memoizeResponse(endpoint, response, memo.body);
+        return memo.body;
+    }
+
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const body = await response.json();
+    memoizeResponse(endpoint, response, body);
+    return body;
+}
+
+// Une al llamador con el GET idéntico en curso; la red solo se cancela cuando nadie más lo espera
+function joinSharedGet(endpoint, signal) {
+    if (signal && signal.aborted) {
+        return Promise.reject(abortError());
+    }
+    let entry = apiInflight.get(endpoint);
+    if (!entry) {
+        const controller = new AbortController();
+        entry = { controller, waiters: 0, promise: null };
+        const created = entry;
+        entry.promise = fetchGet(endpoint, controller.signal).finally(() => {
+            if (apiInflight.get(endpoint) === created) {
+                apiInflight.delete(endpoint);
+            }
+        });
+        apiInflight.set(endpoint, entry);
+    }
+    entry.waiters += 1;
+    if (!signal) {
+        return entry.promise;
+    }
+
+    const shared = entry;
+    return new Promise((resolve, reject) => {
+        const onAbort = () => {
+            shared.waiters -= 1;
+            if (shared.waiters === 0) {
+                if (apiInflight.get(endpoint) === shared) {
+                    apiInflight.delete(endpoint);
+                }
+                shared.controller.abort();
+            }
+            reject(abortError());
+        };
+        signal.addEventListener('abort', onAbort, { once: true });
+        shared.promise.then(resolve, reject).finally(() => signal.removeEventListener('abort', onAbort));
+    });
+}
+
+// Función para hacer peticiones a la API
+async function apiRequest(endpoint, data = null, { signal } = {}) {
+    try {
+        if (!data) {
+            const memo = apiMemo.get(endpoint);
+            if (memo && Date.now() < memo.expires) {
+                return memo.body;
+            }
+            return await joinSharedGet(endpoint, signal);
+        }
+
+        const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data),
+            signal
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        return await response.json();
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Error en API request:', error);
+        }
+        throw error;
+    }
+}
+
+// Peticiones de escaneo en curso por máquina: un escaneo nuevo cancela la respuesta anterior
+const scanControllers = { axial: {}, radial: {} };
+
+// Un QR nuevo invalida también las validaciones de feeder y polaridad de la parte anterior
+const SCAN_SUPERSEDES = {
+    search: ['search', 'feeder', 'polarity'],
+    feeder: ['feeder'],
+    polarity: ['polarity']
+};
+
+function beginScanRequest(machineType, kind) {
+    const controllers = scanControllers[machineType];
+    SCAN_SUPERSEDES[kind].forEach(previous => {
+        if (controllers[previous]) {
+            controllers[previous].abort();
+            delete controllers[previous];
+        }
+    });
+    const controller = new AbortController();
+    controllers[kind] = controller;
+    return controller.signal;
+}
+
+function isAbortError(error) {
+    return error && error.name === 'AbortError';
+}
+
+// Función para buscar información de parte
+async function searchPart(machineType, qrAlmacen) {
+    const state = machineStates[machineType];
+
+    if (!selectedLine) {
+        showModal('Error', 'Debe seleccionar una línea de producción', true);
+        return;
+    }
+
+    const signal = beginScanRequest(machineType, 'search');
+
+    try {
+        // Extraer número de parte
+        const partNumber = extractPartNumber(qrAlmacen);
+        if (!partNumber) {
+            showModal('Error', 'No se pudo extraer el número de parte del QR almacén', true);
+            return;
+        }
+
+        // Restablecer estado dependiente de feeder y polaridad antes de la búsqueda
+        Object.assign(state, {
+            partNumber: '',
+            spec: '',
+            dbPolarity: '',
+            expectedFeeder: '',
+            expectedPolarity: '',
+            feeder: '',
+            polaridad: '',
+            feederValid: false,
+            polarityValid: false,
+            allDataReady: false
+        });
+
+        const specInput = document.getElementById(`${machineType}-spec`);
+        if (specInput) {
+            specInput.value = '';
+            specInput.style.backgroundColor = '';
+        }
+
+        const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
+        if (polarityDisplayDiv) {
+            polarityDisplayDiv.innerHTML = '';
+        }
+
+        const resultDisplayDiv = document.getElementById(`${machineType}-resultado-display`);
+        if (resultDisplayDiv) {
+            resultDisplayDiv.innerHTML = '';
+        }
+
+        const feederInput = document.getElementById(`${machineType}-feeder`);
+        if (feederInput) {
+            feederInput.value = '';
+            feederInput.style.backgroundColor = '';
+            feederInput.classList.remove('validation-error');
+        }
+
+        const polarityInput = document.getElementById(`${machineType}-polaridad`);
+        if (polarityInput) {
+            polarityInput.value = '';
+            polarityInput.style.backgroundColor = '';
+            polarityInput.classList.remove('validation-error');
+        }
+
+        // Buscar en base de datos
+        const result = await apiRequest(partsEndpoint(state.machine, selectedLine, partNumber), null, { signal });
+        
+        if (result.success) {
+            // Actualizar estado
+            state.partNumber = result.part_number;
+            state.spec = result.data.spec;
+            state.dbPolarity = result.data.polarity;
+
+            // Actualizar UI - Spec
+            const specInput = document.getElementById(`${machineType}-spec`);
+            if (specInput) {
+                specInput.value = result.data.spec;
+                specInput.style.backgroundColor = '#1a472a'; // Verde oscuro
+            }
+
+            console.log(`Datos encontrados para ${state.machine}:`, result.data);
+        } else {
+            showModal('Error', `No se encontraron datos para el número de parte: ${partNumber}`, true);
+        }
+        
+    } catch (error) {
+        if (isAbortError(error)) return; // Llegó un escaneo más reciente
+        showModal('Error', 'Error conectando con el servidor. Verifique que el servidor esté ejecutándose.', true);
+        console.error('Error buscando parte:', error);
+    }
+}
+
+// Función para armar la URL cacheable de /api/parts con los valores escaneados
+function partsEndpoint(machine, line, partNumber, scans = {}) {
+    const path = [machine, line, partNumber].map(encodeURIComponent).join('/');
+    const query = new URLSearchParams();
+    if (scans.feeder) query.set('feeder', scans.feeder);
+    if (scans.polarity) query.set('polarity', scans.polarity);
+    const queryString = query.toString();
+    return `/parts/${path}${queryString ? `?${queryString}` : ''}`;
+}
+
+// Función para pedir la validación combinada: una sola búsqueda devuelve parte, feeder y polaridad
+async function requestChangeValidation(machineType, kind, scans = {}) {
+    const state = machineStates[machineType];
+    const signal = beginScanRequest(machineType, kind);
+    return apiRequest(partsEndpoint(state.machine, selectedLine, state.partNumber, {
+        feeder: state.feeder,
+        polarity: state.polaridad,
+        ...scans
+    }), null, { signal });
+}
+
+// Función para aplicar el veredicto de feeder en estado y UI
+function applyFeederVerdict(machineType, verdict) {
+    const state = machineStates[machineType];
+    state.feederValid = verdict.is_valid;
+
+    // Actualizar color del input según validación
+    const feederInput = document.getElementById(`${machineType}-feeder`);
+    if (feederInput) {
+        if (verdict.is_valid) {
+            feederInput.style.backgroundColor = '#1a472a'; // Verde oscuro
+            feederInput.classList.remove('validation-error');
+        } else {
+            feederInput.style.backgroundColor = '#7f1d1d'; // Rojo oscuro
+            feederInput.classList.add('validation-error');
+        }
+    }
+
+    // Actualizar bloque de resultado
+    updateResultDisplay(machineType);
+
+    state.expectedFeeder = verdict.expected_feeder || '';
+    state.expectedPolarity = verdict.expected_polarity || '';
+    updatePolarityDisplay(machineType, state.expectedPolarity);
+}
+
+// Función para limpiar el veredicto de feeder cuando la validación falla
+function clearFeederVerdict(machineType) {
+    const state = machineStates[machineType];
+    state.feederValid = false;
+    state.expectedFeeder = '';
+    state.expectedPolarity = '';
+    const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
+    if (polarityDisplayDiv) {
+        polarityDisplayDiv.innerHTML = '';
+    }
+    const resultDisplayDiv = document.getElementById(`${machineType}-resultado-display`);
+    if (resultDisplayDiv) {
+        resultDisplayDiv.innerHTML = '';
+    }
+}
+
+// Función para aplicar el veredicto de polaridad en estado y UI
+function applyPolarityVerdict(machineType, verdict) {
+    const state = machineStates[machineType];
+    state.polarityValid = verdict.is_valid;
+
+    // Actualizar color de la polaridad en el display del lado derecho
+    updatePolarityDisplayColor(machineType, verdict.is_valid);
+
+    // Actualizar color del input según validación
+    const polarityInput = document.getElementById(`${machineType}-polaridad`);
+    if (polarityInput) {
+        if (verdict.is_valid) {
+            polarityInput.style.backgroundColor = '#1a472a'; // Verde oscuro
+            polarityInput.classList.remove('validation-error');
+        } else {
+            polarityInput.style.backgroundColor = '#7f1d1d'; // Rojo oscuro
+            polarityInput.classList.add('validation-error');
+        }
+    }
+
+    // Actualizar color del resultado según validación de polaridad
+    updateResultDisplay(machineType, true);
+}
+
+// Función para aplicar todos los veredictos devueltos por /validate-change
+function applyChangeValidation(machineType, result) {
+    if (result.feeder) {
+        applyFeederVerdict(machineType, result.feeder);
+    }
+    if (result.polarity) {
+        applyPolarityVerdict(machineType, result.polarity);
+    }
+}
+
+// Función para validar feeder
+async function validateFeeder(machineType, feederScanned) {
+    const state = machineStates[machineType];
+    
+    if (!state.partNumber) {
+        showModal('Error', 'Primero debe escanear el QR almacén', true);
+        return;
+    }
+    
+    if (!selectedLine) {
+        showModal('Error', 'Debe seleccionar una línea de producción', true);
+        return;
+    }
+    
+    try {
+        const result = await requestChangeValidation(machineType, 'feeder', { feeder: feederScanned });
+        
+        if (result.success && result.feeder) {
+            applyChangeValidation(machineType, result);
+            console.log(`Validación feeder ${state.machine} (línea ${selectedLine}):`, result.feeder.is_valid ? 'OK' : 'NG');
+        } else {
+            clearFeederVerdict(machineType);
+            showModal('Error', 'Error validando feeder', true);
+        }
+
+    } catch (error) {
+        if (isAbortError(error)) return;
+        clearFeederVerdict(machineType);
+        showModal('Error', 'Error conectando con el servidor para validar feeder', true);
+        console.error('Error validando feeder:', error);
+    }
+}
+
+// Función para validar polaridad
+async function validatePolarity(machineType, polarityScanned) {
+    const state = machineStates[machineType];
+    
+    if (!state.partNumber) {
+        showModal('Error', 'Primero debe escanear el QR almacén', true);
+        return;
+    }
+    
+    if (!selectedLine) {
+        showModal('Error', 'Debe seleccionar una línea de producción', true);
+        return;
+    }
+    
+    try {
+        const result = await requestChangeValidation(machineType, 'polarity', { polarity: polarityScanned });
+        
+        if (result.success && result.polarity) {
+            applyChangeValidation(machineType, result);
+            console.log(`Validación polaridad ${state.machine} (línea ${selectedLine}):`, result.polarity.is_valid ? 'OK' : 'NG');
+        } else {
+            showModal('Error', 'Error validando polaridad', true);
+        }
+        
+    } catch (error) {
+        if (isAbortError(error)) return;
+        showModal('Error', 'Error conectando con el servidor para validar polaridad', true);
+        console.error('Error validando polaridad:', error);
+    }
+}
+
+// Función para actualizar el color del display de polaridad
+function updatePolarityDisplayColor(machineType, isValid) {
+    const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
+    if (polarityDisplayDiv) {
+        const currentText = polarityDisplayDiv.querySelector('h1')?.textContent || '';
+        if (currentText && currentText !== 'N/A') {
+            const color = isValid ? '#22c55e' : '#ef4444'; // Verde si es válido, rojo si no
+            polarityDisplayDiv.innerHTML = `<h1 style="color: ${color}; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${currentText}</h1>`;
+            console.log(`Color de polaridad actualizado para ${machineType}: ${isValid ? 'verde (válida)' : 'rojo (inválida)'}`);
+        }
+    }
+}
+
+// Función para actualizar el display de polaridad con el valor esperado
+function updatePolarityDisplay(machineType, expectedPolarity) {
+    const polarityDisplayDiv = document.getElementById(`${machineType}-polaridad-display`);
+    if (polarityDisplayDiv) {
+        polarityDisplayDiv.innerHTML = `<h1 style="color: white; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${expectedPolarity || 'N/A'}</h1>`;
+        console.log(`Polaridad esperada mostrada para ${machineType}: ${expectedPolarity}`);
+    }
+}
+
+// Función para actualizar el display de resultado
+function updateResultDisplay(machineType, includePolarityValidation = false) {
+    const state = machineStates[machineType];
+    const resultElement = document.getElementById(`${machineType}-resultado-display`);
+    
+    if (!resultElement) return;
+    
+    let resultText = '';
+    let resultColor = '';
+    
+    // Determinar resultado basado en validación de feeder
+    if (state.feederValid) {
+        resultText = 'OK';
+        resultColor = '#22c55e'; // Verde
+    } else {
+        resultText = 'NG';
+        resultColor = '#ef4444'; // Rojo
+    }
+    
+    // Si se incluye validación de polaridad, ajustar color
+    if (includePolarityValidation) {
+        if (!state.polarityValid) {
+            resultText = 'NG';
+            resultColor = '#ef4444'; // Rojo si la polaridad no es válida
+        }
+    }
+    
+    resultElement.innerHTML = `<h1 style="color: ${resultColor}; margin: 0; text-align: center; line-height: 1.2; padding: 20px 0;">${resultText}</h1>`;
+}
+
+// Función para verificar si todos los datos están listos
+function checkAllDataReady(machineType) {
+    const state = machineStates[machineType];
+    
+    state.allDataReady = (
+        state.qrAlmacen &&
+        state.qrProveedor &&
+        state.loteProveedor &&
+        state.feeder &&
+        state.polaridad &&
+        state.persona &&
+        state.partNumber
+    );
+    
+    return state.allDataReady;
+}
+
+// Función para guardar en historial
+async function saveToHistory(machineType) {
+    const state = machineStates[machineType];
+
+    if (!selectedLine) {
+        showModal('Error', 'Debe seleccionar una línea de producción', true);
+        return;
+    }
+
+    // Verificar si hay errores
+    if (!state.feederValid || !state.polarityValid) {
+        let errorMessage = 'Se encontraron los siguientes errores:<br><br>';
+        
+        if (!state.feederValid) {
+            errorMessage += '• El feeder escaneado no coincide con el esperado<br>';
+        }
+        
+        if (!state.polarityValid) {
+            errorMessage += '• La polaridad escaneada no coincide con la esperada<br>';
+        }
+        
+        showModal('Errores de Validación', errorMessage, true);
+        return;
+    }
+    
+    // Verificar que todos los campos estén completos
+    if (!checkAllDataReady(machineType)) {
+        showModal('Error', 'Todos los campos deben estar completos antes de guardar', true);
+        return;
+    }
+    
+    // Llave de idempotencia: reintentar el mismo cambio no genera registros duplicados
+    if (!state.saveKey) {
+        state.saveKey = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID().replace(/-/g, '')
+            : `${Date.now().toString(16)}${Math.random().toString(16).slice(2)}`;
+    }
+    
+    try {
+        const historyData = {
+            idempotency_key: state.saveKey,
+            posicion_de_feeder: `${state.machine}_${state.feeder}`,
+            qr_almacen: state.qrAlmacen,
+            numero_de_parte: state.partNumber,
+            spec: state.spec,
+            qr_de_proveedor: state.qrProveedor,
+            numero_de_lote_proveedor: state.loteProveedor,
+            polaridad: state.polaridad,
+            persona: state.persona,
+            line: selectedLine
+        };
+        
+        const result = await apiRequest('/save-history', historyData);
+        
+        if (result.success) {
+            showModal('Éxito', '✅ Cambio de material registrado exitosamente', false, true);
+            
+            // Limpiar formulario
+            clearMachineForm(machineType);
+            loadLineState();
+        } else {
+            showModal('Error', 'Error guardando el registro', true);
+        }
+        
+    } catch (error) {
+        showModal('Error', 'Error conectando con el servidor para guardar', true);
+        console.error('Error guardando historial:', error);
+    }
+}
+
+// Ocupación de la línea: una fila por feeder con la última parte y lote cargados
+const LINE_STATE_REFRESH_MS = 15000;
+let lineStateController = null;
+let lineState = null;
+
+// Cambios recibidos por /api/events: gana el más reciente de cada posición, igual que en el servidor
+function applyLineChanges(line, changes) {
+    if (!lineState || lineState.line !== line) return;
+    const positions = new Map(lineState.positions.map(entry => [entry.posicion_de_feeder, entry]));
+    changes.forEach(change => {
+        const current = positions.get(change.posicion_de_feeder);
+        if (!current || change.changed_at >= current.changed_at) {
+            positions.set(change.posicion_de_feeder, change);
+        }
+    });
+    lineState.positions = [...positions.values()].sort(compareFeederPositions);
+    renderLineState(lineState);
+}
+
+function compareFeederPositions(a, b) {
+    const [machineA, feederA] = a.posicion_de_feeder.split('_');
+    const [machineB, feederB] = b.posicion_de_feeder.split('_');
+    return machineA.localeCompare(machineB) || (Number(feederA) - Number(feederB)) || feederA.localeCompare(feederB);
+}
+
+function renderLineState(state) {
+    lineState = state;
+    const badge = document.getElementById('line-state-badge');
+    const positions = (state && state.positions) || [];
+    ['axial', 'radial'].forEach(machineType => {
+        const body = document.getElementById(`${machineType}-line-state`);
+        if (!body) return;
+        const prefix = `${machineStates[machineType].machine}_`;
+        body.replaceChildren(...positions
+            .filter(entry => entry.posicion_de_feeder.startsWith(prefix))
+            .map(entry => {
+                const row = document.createElement('tr');
+                if (!entry.synced) {
+                    row.className = 'pending-sync';
+                    row.title = 'Pendiente de sincronizar con la base de datos';
+                }
+                [
+                    entry.posicion_de_feeder.slice(prefix.length),
+                    entry.numero_de_parte,
+                    entry.numero_de_lote_proveedor || '—',
+                    (entry.changed_at || '').slice(5, 16)
+                ].forEach(text => {
+                    const cell = document.createElement('td');
+                    cell.textContent = text;
+                    row.appendChild(cell);
+                });
+                return row;
+            }));
+    });
+    if (!badge) return;
+    if (!state) {
+        badge.className = 'badge bg-secondary';
+        badge.textContent = 'Seleccione una línea';
+    } else if (state.source === 'local') {
+        badge.className = 'badge bg-warning text-dark';
+        badge.textContent = 'Sin conexión · cambios locales';
+    } else {
+        badge.className = 'badge bg-success';
+        badge.textContent = `${positions.length} feeders`;
+    }
+}
+
+async function loadLineState() {
+    if (lineStateController) lineStateController.abort();
+    if (!selectedLine) {
+        renderLineState(null);
+        return;
+    }
+    const line = selectedLine;
+    const controller = lineStateController = new AbortController();
+    try {
+        const result = await apiRequest(`/lines/${encodeURIComponent(line)}/state`, null, { signal: controller.signal });
+        if (result.success && line === selectedLine) renderLineState(result);
+    } catch (error) {
+        if (!isAbortError(error)) console.error('Error cargando ocupación de la línea:', error);
+    }
+}
+
+// Función para limpiar formulario
+function clearMachineForm(machineType) {
+    const state = machineStates[machineType];
+    
+    console.log(`Limpiando formulario para máquina ${machineType.toUpperCase()}`);
+
+    // Resetear estado
+    Object.assign(state, {
+        qrAlmacen: '',
+        qrProveedor: '',
+        loteProveedor: '',
+        feeder: '',
+        polaridad: '',
+        persona: '',
+        partNumber: '',
+        spec: '',
+        dbPolarity: '',
+        expectedFeeder: '',
+        expectedPolarity: '',
+        feederValid: false,
+        polarityValid: false,
+        allDataReady: false,
+        saveKey: ''
+    });
+    
+    // Limpiar inputs
+    const inputs = [
+        'qr-almacen', 'qr-proveedor', 'lote-proveedor', 
+        'feeder', 'polaridad', 'persona', 'spec'
+    ];
+    
+    inputs.forEach(inputName => {
+        const input = document.getElementById(`${machineType}-${inputName}`);
+        if (input) {
+            input.value = '';
+            input.style.backgroundColor = ''; // Resetear color
+            input.classList.remove('validation-error'); // Remover clase de error
+            console.log(`Input limpiado: ${machineType}-${inputName}`);
+        }
+    });
+
+    // Limpiar displays de visualización
+    const polarityDisplay = document.getElementById(`${machineType}-polaridad-display`);
+    if (polarityDisplay) {
+        polarityDisplay.innerHTML = '';
+        console.log(`Display de polaridad limpiado: ${machineType}-polaridad-display`);
+    } else {
+        console.warn(`No se encontró elemento: ${machineType}-polaridad-display`);
+    }
+
+    const resultDisplay = document.getElementById(`${machineType}-resultado-display`);
+    if (resultDisplay) {
+        resultDisplay.innerHTML = '';
+        console.log(`Display de resultado limpiado: ${machineType}-resultado-display`);
+    } else {
+        console.warn(`No se encontró elemento: ${machineType}-resultado-display`);
+    }
+
+    console.log(`Formulario ${machineType.toUpperCase()} completamente limpiado`);
+}
+
+// Función para limpiar todos los estados de máquina
+function clearAllMachineStates() {
+    console.log('Limpiando todos los estados de máquina por cambio de línea');
+    clearMachineForm('axial');
+    clearMachineForm('radial');
+}
+
+// Detección de escaneo completo: Enter (sufijo del escáner), pausa tras una ráfaga de escáner o blur
+const SCAN_CONFIG = {
+    burstMs: 50,      // Entre caracteres de un escáner; al teclear a mano el intervalo es mayor
+    idleMs: 150,      // Pausa tras una ráfaga que se considera fin del escaneo
+    minQrLength: 6
+};
+
+function onScanComplete(input, callback) {
+    let lastInputAt = 0;
+    let burst = false;
+    let idleTimer = null;
+    let lastScanned = null;  // Evita repetir el mismo valor (p. ej. Enter seguido de blur)
+
+    const complete = () => {
+        clearTimeout(idleTimer);
+        const value = input.value.trim();
+        if (value === lastScanned) return;
+        lastScanned = value;
+        callback(value);
+    };
+
+    input.addEventListener('input', function() {
+        const now = performance.now();
+        burst = now - lastInputAt < SCAN_CONFIG.burstMs;
+        lastInputAt = now;
+        lastScanned = null;
+        clearTimeout(idleTimer);
+        if (burst) {
+            idleTimer = setTimeout(complete, SCAN_CONFIG.idleMs);
+        }
+    });
+    input.addEventListener('keydown', function(e) {
+        if (e.key === 'Enter') {
+            e.preventDefault();
+            complete();
+        }
+    });
+    input.addEventListener('blur', complete);
+}
+
+// Event listeners para inputs
+function setupEventListeners() {
+    ['axial', 'radial'].forEach(machineType => {
+        const state = machineStates[machineType];
+        
+        // QR Almacén - Trigger búsqueda cuando se termine de escribir
+        const qrAlmacenInput = document.getElementById(`${machineType}-qr-almacen`);
+        qrAlmacenInput.addEventListener('input', function(e) {
+            state.qrAlmacen = e.target.value;
+        });
+        onScanComplete(qrAlmacenInput, function(value) {
+            if (value.length >= SCAN_CONFIG.minQrLength) { // Búsqueda cuando hay suficientes caracteres
+                searchPart(machineType, value);
+            }
+        });
+        
+        // QR Proveedor
+        document.getElementById(`${machineType}-qr-proveedor`).addEventListener('input', function(e) {
+            state.qrProveedor = e.target.value;
+        });
+        
+        // Lote Proveedor
+        document.getElementById(`${machineType}-lote-proveedor`).addEventListener('input', function(e) {
+            state.loteProveedor = e.target.value;
+        });
+        
+        // Feeder - Trigger validación cuando se termine de escribir
+        const feederInput = document.getElementById(`${machineType}-feeder`);
+        feederInput.addEventListener('input', function(e) {
+            state.feeder = e.target.value;
+        });
+        onScanComplete(feederInput, function(value) {
+            if (value && state.partNumber) {
+                validateFeeder(machineType, value);
+            }
+        });
+        
+        // Polaridad - Trigger validación cuando se termine de escribir
+        const polaridadInput = document.getElementById(`${machineType}-polaridad`);
+        polaridadInput.addEventListener('input', function(e) {
+            state.polaridad = e.target.value;
+        });
+        onScanComplete(polaridadInput, function(value) {
+            if (value && state.partNumber) {
+                validatePolarity(machineType, value);
+            }
+        });
+        
+        // Persona
+        document.getElementById(`${machineType}-persona`).addEventListener('input', function(e) {
+            state.persona = e.target.value;
+        });
+        
+        // Botón CAMBIAR
+        document.getElementById(`${machineType}-cambiar`).addEventListener('click', function() {
+            saveToHistory(machineType);
+        });
+    });
+}
+
+// Función para mostrar si los datos vienen de la base de datos o de la réplica local
+function updateDataStatus(health) {
+    const badge = document.getElementById('data-status-badge');
+    if (!badge) return;
+
+    const cache = (health && health.feeder_cache) || {};
+    const startup = (health && health.startup) || {};
+    const ageMinutes = cache.age_seconds != null ? Math.round(cache.age_seconds / 60) : null;
+
+    if (startup.db === 'pending' && cache.source !== 'database') {
+        badge.className = 'badge bg-secondary me-3';
+        badge.textContent = 'Conectando a la base de datos...';
+    } else if (cache.source === 'database') {
+        badge.className = 'badge bg-success me-3';
+        badge.textContent = 'Datos en línea';
+    } else if (cache.source === 'replica') {
+        badge.className = 'badge bg-warning text-dark me-3';
+        badge.textContent = ageMinutes != null
+            ? `Sin conexión · réplica de hace ${ageMinutes} min`
+            : 'Sin conexión · réplica local';
+    } else {
+        badge.className = 'badge bg-danger me-3';
+        badge.textContent = 'Sin datos de feeders';
+    }
+}
+
+// Función para consultar el estado del servidor y de los datos
+function refreshDataStatus() {
+    return fetch(`${API_BASE_URL}/health`)
+        .then(response => response.json())
+        .then(data => {
+            updateDataStatus(data);
+            return data;
+        });
+}
+
+// Cambios pendientes de llegar a la base de datos (cola local del servidor)
+function updateSyncStatus(pending) {
+    const badge = document.getElementById('sync-status-badge');
+    if (!badge) return;
+    badge.classList.toggle('d-none', !pending);
+    badge.textContent = `${pending} por sincronizar`;
+}
+
+// Canal de eventos del servidor: base de datos, caché de feeders, historial de la línea y cola local
+const STATUS_POLL_MS = 30000;
+const EVENTS_FALLBACK_RETRY_MS = 60000;
+let eventSource = null;
+let statusPollTimer = null;
+let lastHealth = {};
+
+function connectEvents() {
+    if (!window.EventSource) {
+        startStatusPolling();
+        return;
+    }
+    if (eventSource) eventSource.close();
+    const query = selectedLine ? `?line=${encodeURIComponent(selectedLine)}` : '';
+    const source = eventSource = new EventSource(`${API_BASE_URL}/events${query}`);
+    const on = (type, handler) => source.addEventListener(type, event => handler(JSON.parse(event.data)));
+
+    on('snapshot', data => {
+        stopStatusPolling();
+        lastHealth = data;
+        updateDataStatus(lastHealth);
+        updateSyncStatus(data.spool.pending);
+        loadLineState();
+    });
+    on('db', data => {
+        lastHealth.startup = { ...lastHealth.startup, db: data.db };
+        updateDataStatus(lastHealth);
+    });
+    on('feeder_cache', data => {
+        // La versión de la caché cambió: las respuestas memorizadas ya no son válidas
+        apiMemo.clear();
+        lastHealth.feeder_cache = data;
+        updateDataStatus(lastHealth);
+    });
+    on('history', data => applyLineChanges(data.line, data.changes));
+    on('spool', data => updateSyncStatus(data.pending));
+
+    source.onerror = () => {
+        // Al cortarse el flujo el navegador reconecta solo; CLOSED significa que el servidor lo rechazó
+        if (source === eventSource && source.readyState === EventSource.CLOSED) {
+            eventSource = null;
+            startStatusPolling();
+            setTimeout(() => { if (!eventSource) connectEvents(); }, EVENTS_FALLBACK_RETRY_MS);
+        }
+    };
+}
+
+// Respaldo sin canal de eventos: consulta periódica del estado
+function startStatusPolling() {
+    if (statusPollTimer) return;
+    statusPollTimer = setInterval(() => refreshDataStatus().catch(() => updateDataStatus(null)), STATUS_POLL_MS);
+}
+
+function stopStatusPolling() {
+    clearInterval(statusPollTimer);
+    statusPollTimer = null;
+}
+
+// Avisa al servidor del primer pintado para medir el tiempo de arranque
+function reportFirstPaint() {
+    requestAnimationFrame(() => {
+        setTimeout(() => {
+            fetch(`${API_BASE_URL}/startup/first-paint`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ page_ms: Math.round(performance.now()) })
+            }).catch(() => {});
+        }, 0);
+    });
+}
+
+// Inicializar cuando el DOM esté listo
+document.addEventListener('DOMContentLoaded', function() {
+    console.log('Aplicación IMD Control iniciada');
+    setupEventListeners();
+
+    updateDateTimeDisplay();
+    setInterval(updateDateTimeDisplay, 1000);
+
+    // Event listener para el selector de línea
+    const lineSelector = document.getElementById('line-selector');
+    if (lineSelector) {
+        lineSelector.addEventListener('change', function(e) {
+            selectedLine = e.target.value;
+            console.log(`Línea seleccionada: ${selectedLine}`);
+            
+            // Limpiar estados si se cambia la línea
+            if (selectedLine) {
+                clearAllMachineStates();
+            }
+            // El canal de eventos solo envía los cambios de historial de la línea seleccionada;
+            // al reconectarse, su snapshot recarga la ocupación
+            if (eventSource) {
+                connectEvents();
+            } else {
+                loadLineState();
+            }
+        });
+    }
+    // Los cambios de esta estación llegan por eventos; los de otras estaciones (otro servidor) solo por MySQL
+    setInterval(() => { if (selectedLine) loadLineState(); }, LINE_STATE_REFRESH_MS);
+    
+    // Verificar conexión con el servidor usando la URL dinámica
+    reportFirstPaint();
+    loadQrGrammars();
+
+    refreshDataStatus()
+        .then(data => {
+            console.log('Servidor conectado:', data);
+            // Los cambios de conexión, caché y cola llegan por el canal de eventos
+            connectEvents();
+        })
+        .catch(error => {
+            console.error('Error conectando con servidor:', error);
+            showModal('Error de Conexión', 
+                'No se pudo conectar con el servidor. Verifique que esté ejecutándose.', 
+                true);
+        });
+});